@@ -0,0 +1,130 @@
+""" altfilter.py - alpha-beta altitude and vertical speed estimator with flight phases
+
+Fed one pressure (or altitude) sample at a time with its ticks_us stamp:
+
+    alt = AltitudeFilter()
+    phase = alt.update_pressure(pressure_pa, stamp_us)
+    alt.altitude_mm, alt.speed_mm_s, alt.agl_mm    # filtered, integers
+
+The filter runs in integer millimetres and mm/s with gains in 1/4096, and
+update_pressure() converts with an altitude.AltitudeTable, so an update
+costs the same every time and creates no long ints or floats. Phases:
+
+    PAD      before launch; the ground level is the filtered altitude at the
+             end of settle_ms after the first sample, then held
+    ASCENT   above launch_m over ground and climbing faster than launch_speed
+    APOGEE   falling back apogee_drop_m below the highest point
+    DESCENT  sinking faster than descent_speed
+    LANDED   in descent, slower than landed_speed for landed_ms
+
+Thresholds are in m and m/s; host/replay_altitude.py runs the filter over
+recorded logs to tune them. Holding the ground level keeps agl_mm honest
+for climbs too slow to count as a launch (e.g. a balloon); the price is
+that weather drift on a long wait on the pad (about 8 m per hPa) shows
+up in agl_mm.
+"""
+
+import time
+from altitude import AltitudeTable, SEA_LEVEL_PA
+
+PAD = 0
+ASCENT = 1
+APOGEE = 2
+DESCENT = 3
+LANDED = 4
+PHASE_NAMES = ("pad", "ascent", "apogee", "descent", "landed")
+
+_GAIN_SHIFT = 12
+_GAIN_HALF = 1 << (_GAIN_SHIFT - 1)
+
+
+class AltitudeFilter:
+    def __init__(self, alpha=0.1, beta=0.005, sea_level_pa=SEA_LEVEL_PA,
+                 launch_m=10, launch_speed=2.0, apogee_drop_m=5, descent_speed=2.0,
+                 landed_speed=0.5, landed_ms=5000, settle_ms=5000, table=None):
+        self.alpha = int(alpha * (1 << _GAIN_SHIFT))
+        self.beta = int(beta * (1 << _GAIN_SHIFT))
+        self.table = table or AltitudeTable(sea_level_pa)
+        self.launch_mm = int(launch_m * 1000)
+        self.launch_speed = int(launch_speed * 1000)
+        self.apogee_drop_mm = int(apogee_drop_m * 1000)
+        self.descent_speed = int(descent_speed * 1000)
+        self.landed_speed = int(landed_speed * 1000)
+        self.landed_ms = landed_ms
+        self.settle_ms = settle_ms
+        self.reset()
+
+    def reset(self):
+        self.phase = PAD
+        self.samples = 0
+        self.altitude_mm = 0    # filtered
+        self.speed_mm_s = 0     # filtered, up is positive
+        self.ground_mm = 0
+        self.max_mm = 0         # highest filtered altitude
+        self.apogee_mm = None
+        self.launch_us = self.apogee_us = self.landed_us = None
+        self._last_us = 0
+        self._still_ms = 0
+        self._settled_ms = 0
+
+    @property
+    def agl_mm(self):
+        """ Filtered altitude above the ground level seen on the pad. """
+        return self.altitude_mm - self.ground_mm
+
+    def update_pressure(self, pressure_pa, stamp_us):
+        """ One pressure measurement in whole Pa (an int); returns the flight phase. """
+        return self.update(self.table.mm_from_pa(pressure_pa), stamp_us)
+
+    def update(self, altitude_mm, stamp_us):
+        """ One measurement; returns the flight phase. """
+        if self.samples == 0:
+            self.altitude_mm = self.ground_mm = self.max_mm = altitude_mm
+            self._last_us = stamp_us
+            self.samples = 1
+            return self.phase
+        dt_ms = time.ticks_diff(stamp_us, self._last_us) // 1000
+        if dt_ms <= 0:
+            return self.phase
+        self._last_us = stamp_us
+        self.samples += 1
+
+        # predict, then correct by the residual (rounded: no drift from flooring)
+        x = self.altitude_mm + (self.speed_mm_s * dt_ms + 500) // 1000
+        r = altitude_mm - x
+        self.altitude_mm = x + ((self.alpha * r + _GAIN_HALF) >> _GAIN_SHIFT)
+        self.speed_mm_s += ((self.beta * 1000 // dt_ms) * r + _GAIN_HALF) >> _GAIN_SHIFT
+        x = self.altitude_mm
+        v = self.speed_mm_s
+        if x > self.max_mm:
+            self.max_mm = x
+
+        phase = self.phase
+        if phase == PAD:
+            if x - self.ground_mm > self.launch_mm and v > self.launch_speed:
+                self.phase = ASCENT
+                self.launch_us = stamp_us
+                self.max_mm = x
+            else:
+                if self._settled_ms < self.settle_ms:
+                    self._settled_ms += dt_ms
+                    self.ground_mm = x
+                if v < self.launch_speed:
+                    self.max_mm = x
+        elif phase == ASCENT:
+            if self.max_mm - x > self.apogee_drop_mm:
+                self.phase = APOGEE
+                self.apogee_mm = self.max_mm
+                self.apogee_us = stamp_us
+        elif phase == APOGEE:
+            if v < -self.descent_speed:
+                self.phase = DESCENT
+        elif phase == DESCENT:
+            if -self.landed_speed < v < self.landed_speed:
+                self._still_ms += dt_ms
+                if self._still_ms >= self.landed_ms:
+                    self.phase = LANDED
+                    self.landed_us = stamp_us
+            else:
+                self._still_ms = 0
+        return self.phase
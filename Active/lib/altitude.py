@@ -0,0 +1,65 @@
+""" altitude.py - pressure to altitude by table lookup and integer interpolation
+
+The barometric formula costs a float pow per sample. AltitudeTable computes
+it once per `1 << step_shift` Pa over the flight pressure range, at boot or
+from a frozen copy, and interpolates linearly in integer Pa:
+
+    table = AltitudeTable()                       # ~230 pow calls, ~1 KB
+    mm = table.mm(result[1])                      # Pa * 256 from read_compensated_data
+    mm = table.mm_from_pa(pressure_pa)
+
+Entries are altitudes in mm in an array('i'), so a lookup uses small ints
+only. With the default 256 Pa step the interpolation stays within a few
+cm of the formula (host/bench_altitude.py checks the bound). Outside the
+table the end segments are extended.
+
+To freeze a table, put `TABLE = <table.tobytes()>` in a module and pass
+AltitudeTable(table=TABLE) with the same range and sea level pressure.
+"""
+
+from array import array
+
+SEA_LEVEL_PA = 101325
+P_MIN_PA = 50000    # about 5.5 km
+P_MAX_PA = 108000   # below sea level, high pressure
+
+
+def pressure_to_mm(pressure_pa, sea_level_pa=SEA_LEVEL_PA):
+    """ Barometric altitude (mm) of a pressure (Pa), exact formula. """
+    return int(44330000 * (1 - (pressure_pa / sea_level_pa) ** 0.1903))
+
+
+class AltitudeTable:
+    def __init__(self, sea_level_pa=SEA_LEVEL_PA, p_min=P_MIN_PA, p_max=P_MAX_PA, step_shift=8,
+                 table=None):
+        self.sea_level_pa = sea_level_pa
+        self.p_min = p_min
+        self.step_shift = step_shift
+        step = 1 << step_shift
+        n = (p_max - p_min + step - 1) // step + 1
+        if table is None:
+            table = array("i", (pressure_to_mm(p_min + i * step, sea_level_pa) for i in range(n)))
+        elif isinstance(table, (bytes, bytearray)):
+            table = array("i", bytearray(table))  # raw int32 entries, see tobytes()
+        if len(table) != n:
+            raise ValueError("table has {} entries, the range needs {}".format(len(table), n))
+        self.table = table
+        self._last = n - 2  # index of the last segment
+
+    def tobytes(self):
+        return bytes(self.table)
+
+    def mm_from_pa(self, pressure_pa):
+        """ Altitude (mm) of a pressure in whole Pa. """
+        d = pressure_pa - self.p_min
+        i = d >> self.step_shift
+        if i < 0:
+            i = 0
+        elif i > self._last:
+            i = self._last
+        h0 = self.table[i]
+        return h0 + (((self.table[i + 1] - h0) * (d - (i << self.step_shift))) >> self.step_shift)
+
+    def mm(self, pressure_q8):
+        """ Altitude (mm) of a pressure in Pa * 256, as read_compensated_data() gives it. """
+        return self.mm_from_pa(pressure_q8 >> 8)
@@ -49,8 +49,38 @@ BME280_OSAMPLE_4 = 3
 BME280_OSAMPLE_8 = 4
 BME280_OSAMPLE_16 = 5
 
+# Power modes (ctrl_meas bits 1:0)
+BME280_SLEEP = 0
+BME280_FORCED = 1
+BME280_NORMAL = 3
+
+# Normal mode standby time between conversions in ms (config bits 7:5)
+BME280_STANDBY_0_5 = 0
+BME280_STANDBY_62_5 = 1
+BME280_STANDBY_125 = 2
+BME280_STANDBY_250 = 3
+BME280_STANDBY_500 = 4
+BME280_STANDBY_1000 = 5
+BME280_STANDBY_10 = 6
+BME280_STANDBY_20 = 7
+
+# IIR filter coefficient (config bits 4:2)
+BME280_IIR_OFF = 0
+BME280_IIR_2 = 1
+BME280_IIR_4 = 2
+BME280_IIR_8 = 3
+BME280_IIR_16 = 4
+
+# Pressure compensation: the datasheet's 64-bit integer formula, its 32-bit
+# integer one (Pa resolution, no long ints on 32-bit ports) or floating point
+# with the calibration folded into precomputed coefficients
+BME280_COMPENSATION_INT64 = 0
+BME280_COMPENSATION_INT32 = 1
+BME280_COMPENSATION_FLOAT = 2
+
 BME280_REGISTER_CONTROL_HUM = 0xF2
 BME280_REGISTER_CONTROL = 0xF4
+BME280_REGISTER_CONFIG = 0xF5
 
 
 class BME280:
@@ -59,6 +89,7 @@ class BME280:
                  mode=BME280_OSAMPLE_1,
                  address=BME280_I2CADDR,
                  i2c=None,
+                 compensation=BME280_COMPENSATION_INT64,
                  **kwargs):
         # Check that mode is valid.
         if mode not in [BME280_OSAMPLE_1, BME280_OSAMPLE_2, BME280_OSAMPLE_4,
@@ -67,6 +98,10 @@ class BME280:
                 'Unexpected mode value {0}. Set mode to one of '
                 'BME280_ULTRALOWPOWER, BME280_STANDARD, BME280_HIGHRES, or '
                 'BME280_ULTRAHIGHRES'.format(mode))
+        if compensation not in (BME280_COMPENSATION_INT64, BME280_COMPENSATION_INT32,
+                                BME280_COMPENSATION_FLOAT):
+            raise ValueError(
+                'Unexpected compensation value {0}'.format(compensation))
         self._mode = mode
         self.address = address
         if i2c is None:
@@ -94,32 +129,98 @@ class BME280:
                              bytearray([0x3F]))
         self.t_fine = 0
 
+        P1, P2, P3, P4, P5, P6, P7, P8, P9 = (
+            self.dig_P1, self.dig_P2, self.dig_P3, self.dig_P4, self.dig_P5,
+            self.dig_P6, self.dig_P7, self.dig_P8, self.dig_P9)
+        # the datasheet's double precision formula with the constant factors
+        # multiplied out, see _pressure_float
+        self._pressure_coeffs = (
+            P6 / 131072, P5 / 2, P4 * 65536.0,
+            P1 * P3 / 9007199254740992, P1 * P2 / 17179869184, float(P1),
+            P9 / 34359738368, 1 + P8 / 524288, P7 / 16)
+        self._pressure = (self._pressure_int64, self._pressure_int32,
+                          self._pressure_float)[compensation]
+
         # temporary data holders which stay allocated
         self._l1_barray = bytearray(1)
         self._l8_barray = bytearray(8)
         self._l3_resultarray = array("i", [0, 0, 0])
 
-    def read_raw_data(self, result):
-        """ Reads the raw (uncompensated) data from the sensor.
+        # conversion time in us (maximum, all three measurements)
+        measure_us = 1250 + 2300 * (1 << self._mode)
+        measure_us = measure_us + 2300 * (1 << self._mode) + 575
+        self.measure_us = measure_us + 2300 * (1 << self._mode) + 575
+        self._power = BME280_FORCED
+        self._pending = False  # forced conversion started, not collected yet
+        self._ready_at = time.ticks_us()
+
+    def _write_reg(self, register, value):
+        self._l1_barray[0] = value
+        self.i2c.writeto_mem(self.address, register, self._l1_barray)
+
+    def _configure(self, power, standby, iir):
+        if standby not in range(8) or iir not in range(5):
+            raise ValueError(
+                'Unexpected standby {0} or IIR filter {1} value'.format(standby, iir))
+        # config writes may be ignored outside sleep mode
+        self._write_reg(BME280_REGISTER_CONTROL,
+                        self._mode << 5 | self._mode << 2 | BME280_SLEEP)
+        self._write_reg(BME280_REGISTER_CONFIG, standby << 5 | iir << 2)
+        self._power = power
+        self._pending = False
+        if power == BME280_NORMAL:
+            self._write_reg(BME280_REGISTER_CONTROL_HUM, self._mode)
+            self._write_reg(BME280_REGISTER_CONTROL,
+                            self._mode << 5 | self._mode << 2 | BME280_NORMAL)
+            # the data registers hold a sample once the first conversion is done
+            self._ready_at = time.ticks_add(time.ticks_us(), self.measure_us)
+
+    def set_normal_mode(self, standby=BME280_STANDBY_0_5, iir=BME280_IIR_OFF):
+        """ Lets the sensor convert on its own, one sample every measure_us
+            plus the standby time. Reading the latest sample is then a single
+            burst read.
+
+            Args:
+                standby: one of the BME280_STANDBY_* values
+                iir: one of the BME280_IIR_* filter coefficients
+        """
+        self._configure(BME280_NORMAL, standby, iir)
+
+    def set_forced_mode(self, iir=BME280_IIR_OFF):
+        """ Back to one conversion per read, the sensor sleeping in between
+            (the default). """
+        self._configure(BME280_FORCED, BME280_STANDBY_0_5, iir)
+
+    def start_conversion(self):
+        """ Starts a forced mode conversion and returns without waiting for
+            it. The next collect_into() or read_raw_data() picks it up.
+
+            Returns:
+                the time.ticks_us() value from which the sample can be read
+                without waiting
+        """
+        self._write_reg(BME280_REGISTER_CONTROL_HUM, self._mode)
+        self._write_reg(BME280_REGISTER_CONTROL,
+                        self._mode << 5 | self._mode << 2 | BME280_FORCED)
+        self._pending = True
+        self._ready_at = time.ticks_add(time.ticks_us(), self.measure_us)
+        return self._ready_at
+
+    def collect_into(self, result):
+        """ Reads the raw (uncompensated) data of the last conversion with
+            one burst read, first waiting for what is left of the conversion
+            time. In normal mode this is the latest sample.
 
             Args:
                 result: array of length 3 or alike where the result will be
                 stored, in temperature, pressure, humidity order
             Returns:
-                None
+                result
         """
-
-        self._l1_barray[0] = self._mode
-        self.i2c.writeto_mem(self.address, BME280_REGISTER_CONTROL_HUM,
-                             self._l1_barray)
-        self._l1_barray[0] = self._mode << 5 | self._mode << 2 | 1
-        self.i2c.writeto_mem(self.address, BME280_REGISTER_CONTROL,
-                             self._l1_barray)
-
-        sleep_time = 1250 + 2300 * (1 << self._mode)
-        sleep_time = sleep_time + 2300 * (1 << self._mode) + 575
-        sleep_time = sleep_time + 2300 * (1 << self._mode) + 575
-        time.sleep_us(sleep_time)  # Wait the required time
+        wait = time.ticks_diff(self._ready_at, time.ticks_us())
+        if wait > 0:
+            time.sleep_us(wait)
+        self._pending = False
 
         # burst readout from 0xF7 to 0xFE, recommended by datasheet
         self.i2c.readfrom_mem_into(self.address, 0xF7, self._l8_barray)
@@ -134,6 +235,22 @@ class BME280:
         result[0] = raw_temp
         result[1] = raw_press
         result[2] = raw_hum
+        return result
+
+    def read_raw_data(self, result):
+        """ Reads the raw (uncompensated) data from the sensor: the
+            conversion started by start_conversion() if there is one, the
+            latest sample in normal mode, otherwise a new forced conversion.
+
+            Args:
+                result: array of length 3 or alike where the result will be
+                stored, in temperature, pressure, humidity order
+            Returns:
+                None
+        """
+        if self._power != BME280_NORMAL and not self._pending:
+            self.start_conversion()
+        self.collect_into(result)
 
     def read_compensated_data(self, result=None):
         """ Reads the data from the sensor and returns the compensated data.
@@ -149,41 +266,43 @@ class BME280:
         """
         self.read_raw_data(self._l3_resultarray)
         raw_temp, raw_press, raw_hum = self._l3_resultarray
+        return self.compensate(raw_temp, raw_press, raw_hum, result)
+
+    def compensate(self, raw_temp, raw_press, raw_hum=None, result=None):
+        """ Compensates raw readings taken earlier, e.g. by PressureRing.
+
+            Args:
+                raw_temp, raw_press, raw_hum: raw readings as stored by
+                read_raw_data(); without raw_hum the humidity is 0
+                result: as for read_compensated_data()
+
+            Returns:
+                as read_compensated_data()
+        """
         # temperature
-        var1 = ((raw_temp >> 3) - (self.dig_T1 << 1)) * (self.dig_T2 >> 11)
+        var1 = (((raw_temp >> 3) - (self.dig_T1 << 1)) * self.dig_T2) >> 11
         var2 = (((((raw_temp >> 4) - self.dig_T1) *
                   ((raw_temp >> 4) - self.dig_T1)) >> 12) * self.dig_T3) >> 14
         self.t_fine = var1 + var2
         temp = (self.t_fine * 5 + 128) >> 8
 
         # pressure
-        var1 = self.t_fine - 128000
-        var2 = var1 * var1 * self.dig_P6
-        var2 = var2 + ((var1 * self.dig_P5) << 17)
-        var2 = var2 + (self.dig_P4 << 35)
-        var1 = (((var1 * var1 * self.dig_P3) >> 8) +
-                ((var1 * self.dig_P2) << 12))
-        var1 = (((1 << 47) + var1) * self.dig_P1) >> 33
-        if var1 == 0:
-            pressure = 0
-        else:
-            p = 1048576 - raw_press
-            p = (((p << 31) - var2) * 3125) // var1
-            var1 = (self.dig_P9 * (p >> 13) * (p >> 13)) >> 25
-            var2 = (self.dig_P8 * p) >> 19
-            pressure = ((p + var1 + var2) >> 8) + (self.dig_P7 << 4)
+        pressure = self._pressure(self.t_fine, raw_press)
 
         # humidity
-        h = self.t_fine - 76800
-        h = (((((raw_hum << 14) - (self.dig_H4 << 20) -
-                (self.dig_H5 * h)) + 16384)
-              >> 15) * (((((((h * self.dig_H6) >> 10) *
-                            (((h * self.dig_H3) >> 11) + 32768)) >> 10) +
-                          2097152) * self.dig_H2 + 8192) >> 14))
-        h = h - (((((h >> 15) * (h >> 15)) >> 7) * self.dig_H1) >> 4)
-        h = 0 if h < 0 else h
-        h = 419430400 if h > 419430400 else h
-        humidity = h >> 12
+        if raw_hum is None:
+            humidity = 0
+        else:
+            h = self.t_fine - 76800
+            h = (((((raw_hum << 14) - (self.dig_H4 << 20) -
+                    (self.dig_H5 * h)) + 16384)
+                  >> 15) * (((((((h * self.dig_H6) >> 10) *
+                                (((h * self.dig_H3) >> 11) + 32768)) >> 10) +
+                              2097152) * self.dig_H2 + 8192) >> 14))
+            h = h - (((((h >> 15) * (h >> 15)) >> 7) * self.dig_H1) >> 4)
+            h = 0 if h < 0 else h
+            h = 419430400 if h > 419430400 else h
+            humidity = h >> 12
 
         if result:
             result[0] = temp
@@ -193,6 +312,58 @@ class BME280:
 
         return array("i", (temp, pressure, humidity))
 
+    def _pressure_int64(self, t_fine, raw_press):
+        """ Pressure in Pa * 256, datasheet 64-bit integer formula. """
+        var1 = t_fine - 128000
+        var2 = var1 * var1 * self.dig_P6
+        var2 = var2 + ((var1 * self.dig_P5) << 17)
+        var2 = var2 + (self.dig_P4 << 35)
+        var1 = (((var1 * var1 * self.dig_P3) >> 8) +
+                ((var1 * self.dig_P2) << 12))
+        var1 = (((1 << 47) + var1) * self.dig_P1) >> 33
+        if var1 == 0:
+            return 0
+        p = 1048576 - raw_press
+        p = (((p << 31) - var2) * 3125) // var1
+        var1 = (self.dig_P9 * (p >> 13) * (p >> 13)) >> 25
+        var2 = (self.dig_P8 * p) >> 19
+        return ((p + var1 + var2) >> 8) + (self.dig_P7 << 4)
+
+    def _pressure_int32(self, t_fine, raw_press):
+        """ Pressure in Pa * 256 at 1 Pa resolution, datasheet 32-bit integer
+            formula. The two products that can pass 2**30, the limit of a
+            small int on 32-bit ports, are split so none does. """
+        var1 = (t_fine >> 1) - 64000
+        var2 = (((var1 >> 2) * (var1 >> 2)) >> 11) * self.dig_P6
+        var2 = var2 + ((var1 * self.dig_P5) << 1)
+        var2 = (var2 >> 2) + (self.dig_P4 << 16)
+        var1 = (((self.dig_P3 * (((var1 >> 2) * (var1 >> 2)) >> 13)) >> 3) +
+                ((self.dig_P2 * var1) >> 1)) >> 18
+        # ((32768 + var1) * dig_P1) >> 15
+        var1 = 32768 + var1
+        var1 = (var1 * (self.dig_P1 >> 8) +
+                ((var1 * (self.dig_P1 & 0xFF)) >> 8)) >> 7
+        if var1 == 0:
+            return 0
+        p = 1048576 - raw_press - (var2 >> 12)
+        # p * 6250 // var1
+        p = (p // var1) * 6250 + (p % var1) * 6250 // var1
+        var1 = (self.dig_P9 * (((p >> 3) * (p >> 3)) >> 13)) >> 12
+        var2 = ((p >> 2) * self.dig_P8) >> 13
+        return (p + ((var1 + var2 + self.dig_P7) >> 4)) << 8
+
+    def _pressure_float(self, t_fine, raw_press):
+        """ Pressure in Pa * 256, datasheet floating point formula. """
+        c = self._pressure_coeffs
+        var1 = t_fine * 0.5 - 64000.0
+        var2 = (var1 * c[0] + c[1]) * var1 + c[2]
+        var1 = (var1 * c[3] + c[4]) * var1 + c[5]
+        if var1 == 0.0:
+            return 0
+        p = (1048576 - raw_press - var2 / 4096) * 6250 / var1
+        p = (p * c[6] + c[7]) * p + c[8]
+        return int(p * 256)
+
     @property
     def values(self):
         """ human readable values """
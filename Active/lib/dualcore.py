@@ -0,0 +1,89 @@
+""" dualcore.py - slow I/O on the second core of the RP2040
+
+The sampling loop keeps core 0 to itself and only puts records into a
+recordring.RecordRing; a thread on core 1 takes them out and does the SD
+card writes and radio sends, whose time no longer adds to the sampling
+period:
+
+    ring = RecordRing(slots=64, fields=10)
+    drain = Drain(ring, handle, idle)
+    drain.start()     # core 1: handle(seq, record) per record, idle() while the ring is empty
+    ...
+    drain.stop()      # core 1 finishes the ring and exits
+
+handle() and idle() only ever run on core 1: the devices they use (SD
+card, radio) must not be touched from core 0 until stop() returned True.
+An exception in either is counted in `errors` and the thread carries on.
+"""
+
+from array import array
+import _thread
+import time
+
+
+class Drain:
+    def __init__(self, ring, handle, idle=None, idle_ms=2):
+        self.ring = ring
+        self.handle = handle
+        self.idle = idle
+        self.idle_ms = idle_ms
+        self._record = array("f", bytes(4 * ring.fields))
+        self._stopping = False
+        self.running = False    # the core 1 thread is alive
+
+        # statistics
+        self.records = 0
+        self.errors = 0
+        self.last_error = None
+        self.busy_us = 0        # time spent in handle()
+        self.max_handle_us = 0
+
+    def start(self):
+        self._stopping = False
+        self.running = True
+        _thread.start_new_thread(self._run, ())
+
+    def _run(self):
+        ring = self.ring
+        record = self._record
+        try:
+            while True:
+                seq = ring.get_into(record)
+                if seq < 0:
+                    if self._stopping:
+                        return
+                    if self.idle is not None:
+                        self._call(self.idle)
+                    time.sleep_ms(self.idle_ms)
+                    continue
+                start = time.ticks_us()
+                self._call(self.handle, seq, record)
+                elapsed = time.ticks_diff(time.ticks_us(), start)
+                self.busy_us += elapsed
+                if elapsed > self.max_handle_us:
+                    self.max_handle_us = elapsed
+                self.records += 1
+        finally:
+            self.running = False
+
+    def _call(self, func, *args):
+        try:
+            func(*args)
+        except Exception as ex:
+            self.errors += 1
+            self.last_error = ex
+
+    def stop(self, timeout_ms=5000):
+        """ Lets core 1 handle what is left in the ring, then waits for it to
+            exit. Returns False if it is still running after timeout_ms. """
+        self._stopping = True
+        start = time.ticks_ms()
+        while self.running:
+            if time.ticks_diff(time.ticks_ms(), start) >= timeout_ms:
+                return False
+            time.sleep_ms(1)
+        return True
+
+    def report(self):
+        print("core 1: {} records, {} errors, handle max {} us, busy {} ms".format(
+            self.records, self.errors, self.max_handle_us, self.busy_us // 1000))
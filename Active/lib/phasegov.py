@@ -0,0 +1,101 @@
+""" phasegov.py - sensor, SD card and radio rates by flight phase
+
+One table row per flight phase (altfilter.PAD .. LANDED) gives every
+subsystem its rate. Each column is bound to a setter, which is called with
+the column's value at once and again whenever a phase change alters it:
+
+    gov = PhaseGovernor()
+    gov.bind("pressure_hz", ring.set_rate)
+    gov.bind("co2_ms", co2_mode.set_interval)
+    gov.bind("pms", pm_duty.set_phase)
+    gov.set_phase(alt.update_pressure(pressure_pa, stamp))
+
+Columns:
+
+    pressure_hz  PressureRing sample rate (25..100)
+    log_ms       period of the logging task (one SD line and radio sample each)
+    sync_ms      SDLogger sync_ms: how much of the log a power loss may cost
+    radio_ms     period of the radio task; partial frames wait up to 1.5x that
+    beacon       radio only the newest sample every radio_ms, not every logged one
+    co2_ms       SCD4xModePolicy interval
+    pms          PMSDutyCycle schedule phase ("off": asleep)
+
+The rates follow what each phase needs: on the pad little happens and the
+SD card is rarely synced, the pressure is sampled fastest around apogee and
+in descent, and once landed the rocket waits to be found with the PMS5003
+asleep and the radio sending beacons.
+"""
+
+import time
+from altfilter import PAD, ASCENT, APOGEE, DESCENT, LANDED, PHASE_NAMES
+
+COLUMNS = ("pressure_hz", "log_ms", "sync_ms", "radio_ms", "beacon", "co2_ms", "pms")
+
+DEFAULT_TABLE = {
+    #         pressure_hz  log_ms  sync_ms  radio_ms  beacon  co2_ms  pms
+    PAD:     (25,          1000,   60000,   2000,     False,  30000,  "ground"),
+    ASCENT:  (50,          250,    5000,    1000,     False,  5000,   "ascent"),
+    APOGEE:  (100,         250,    2000,    500,      False,  5000,   "descent"),
+    DESCENT: (100,         250,    5000,    500,      False,  5000,   "descent"),
+    LANDED:  (25,          5000,   30000,   10000,    True,   60000,  "off"),
+}
+
+
+class PhaseGovernor:
+    def __init__(self, table=DEFAULT_TABLE, phase=PAD):
+        self.table = table
+        self.phase = phase
+        self._bound = []    # (column index, setter)
+        self._since = time.ticks_ms()
+
+        self.switches = 0
+        self.errors = 0     # setters that raised
+        self.last_error = None
+        self.phase_ms = [0] * len(PHASE_NAMES)  # time spent in each phase, up to the last change
+
+    def value(self, column):
+        """ The current phase's value of a column. """
+        return self.table[self.phase][COLUMNS.index(column)]
+
+    def bind(self, column, setter):
+        """ Calls setter(value) now and on every phase change that alters the column. """
+        i = COLUMNS.index(column)
+        self._bound.append((i, setter))
+        self._apply(setter, self.table[self.phase][i])
+
+    def set_phase(self, phase):
+        """ Switches to another row of the table. Returns True on a change. """
+        if phase == self.phase:
+            return False
+        now = time.ticks_ms()
+        self.phase_ms[self.phase] += time.ticks_diff(now, self._since)
+        self._since = now
+        old = self.table[self.phase]
+        new = self.table[phase]
+        self.phase = phase
+        self.switches += 1
+        for i, setter in self._bound:
+            if new[i] != old[i]:
+                self._apply(setter, new[i])
+        return True
+
+    def _apply(self, setter, value):
+        # One failing subsystem (say an I2C error) must not keep the others at the old rate
+        try:
+            setter(value)
+        except Exception as ex:
+            self.errors += 1
+            self.last_error = ex
+
+    def time_in(self, phase):
+        """ Milliseconds spent in a phase, including the current stay. """
+        ms = self.phase_ms[phase]
+        if phase == self.phase:
+            ms += time.ticks_diff(time.ticks_ms(), self._since)
+        return ms
+
+    def report(self):
+        print("phase governor: {}, {} switches, {} setter errors, time per phase {}".format(
+            PHASE_NAMES[self.phase], self.switches, self.errors,
+            " ".join("{} {} s".format(name, self.time_in(phase) // 1000)
+                     for phase, name in enumerate(PHASE_NAMES))))
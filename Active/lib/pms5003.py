@@ -27,6 +27,7 @@ import ustruct as struct
 import time
 
 import machine
+import uasyncio as asyncio
 
 
 __version__ = '0.0.7'
@@ -41,6 +42,22 @@ PMS5003_CMD_WAKEUP = b'\xe4\x00\x01'
 
 PMSA003I_I2C_ADDR = 0x12
 
+RX_BUF_SIZE = 128  # UART receive buffer of the frame parser, room for 4 data frames
+BYTE_US = 1042     # one byte on the 9600 baud 8N1 link
+
+try:
+    bytearray().find(b'')
+
+    def _find_sof(buf, start, end):
+        return buf.find(PMS5003_SOF, start, end)
+except AttributeError:
+    # MicroPython ports without bytearray.find()
+    def _find_sof(buf, start, end):
+        for i in range(start, end - 1):
+            if buf[i] == 0x42 and buf[i + 1] == 0x4d:
+                return i
+        return -1
+
 
 class ChecksumMismatchError(RuntimeError):
     pass
@@ -59,6 +76,8 @@ class SerialTimeoutError(RuntimeError):
 
 
 class PMS5003Response:
+    __slots__ = ()
+
     FRAME_LEN = None
     DATA_LEN = None
     DATA_FMT = None
@@ -74,16 +93,19 @@ class PMS5003Response:
             ))
 
     def __init__(self, raw_data, *, frame_length_bytes):
-        raw_data_len = len(raw_data)
-        self.check_data_len(raw_data_len)
+        self.check_data_len(len(raw_data))
         self.raw_data = raw_data
         self.data = struct.unpack(self.DATA_FMT, raw_data)
         self.checksum = self.data[self.CHECKSUM_IDX]
+        self._check(frame_length_bytes)
 
+    def _check(self, frame_length_bytes):
+        raw_data = self.raw_data
+        raw_data_len = len(raw_data)
         # Don't include the checksum bytes in the checksum calculation
         checksum = sum(PMS5003_SOF) + sum(raw_data[:-2])
         if frame_length_bytes is None:
-            checksum += (raw_data_len >> 256) + (raw_data_len & 0xff)
+            checksum += (raw_data_len >> 8) + (raw_data_len & 0xff)
         else:
             checksum += sum(frame_length_bytes)
         if checksum != self.checksum:
@@ -92,6 +114,8 @@ class PMS5003Response:
 
 
 class PMS5003CmdResponse(PMS5003Response):
+    __slots__ = ("raw_data", "data", "checksum")
+
     FRAME_LEN = 8
     DATA_LEN = FRAME_LEN - 4  # includes checksum
     DATA_FMT = ">BBH"
@@ -101,49 +125,101 @@ class PMS5003CmdResponse(PMS5003Response):
         super().__init__(raw_data, frame_length_bytes=frame_length_bytes)
 
 
+# Value indexes of a data frame, for PMS5003Data.value() and fill()
+PM1_0 = 0          # ug/m3, standard particle (CF=1)
+PM2_5 = 1
+PM10 = 2
+PM1_0_ATM = 3      # ug/m3, atmospheric environment
+PM2_5_ATM = 4
+PM10_ATM = 5
+COUNT_0_3 = 6      # particles > 0.3 um in 0.1 L of air
+COUNT_0_5 = 7
+COUNT_1_0 = 8
+COUNT_2_5 = 9
+COUNT_5_0 = 10
+COUNT_10 = 11
+VALUES = 12        # values in a frame, before the reserved word and checksum
+
+_PM_INDEX = {1.0: PM1_0, 2.5: PM2_5, 10: PM10}
+_PM_ATM_INDEX = {1.0: PM1_0_ATM, 2.5: PM2_5_ATM, 10: PM10_ATM, None: PM10_ATM}
+_COUNT_INDEX = {0.3: COUNT_0_3, 0.5: COUNT_0_5, 1.0: COUNT_1_0, 2.5: COUNT_2_5, 5: COUNT_5_0,
+                10: COUNT_10}
+
+
 class PMS5003Data(PMS5003Response):
+    """ A data frame. The big-endian words stay in raw_data and are decoded
+        when asked for: value(PM2_5) or fill(array('H', [0] * VALUES)). """
+    __slots__ = ("raw_data", "checksum", "received_ms")
+
     FRAME_LEN = 32
     DATA_LEN = FRAME_LEN - 4  # includes checksum
     DATA_FMT = ">HHHHHHHHHHHHHH"
     CHECKSUM_IDX = 13
 
     def __init__(self, raw_data, *, frame_length_bytes=None):
-        super().__init__(raw_data, frame_length_bytes=frame_length_bytes)
-
-    def pm_ug_per_m3(self, size, atmospheric_environment=False):
-        if atmospheric_environment:
-            if size == 1.0:
-                return self.data[3]
-            if size == 2.5:
-                return self.data[4]
-            if size in (10, None):
-                return self.data[5]
+        self.check_data_len(len(raw_data))
+        self.raw_data = raw_data
+        self.checksum = (raw_data[2 * self.CHECKSUM_IDX] << 8) | raw_data[2 * self.CHECKSUM_IDX + 1]
+        self._check(frame_length_bytes)
+        self.received_ms = time.ticks_ms()
 
-        else:
-            if size == 1.0:
-                return self.data[0]
-            if size == 2.5:
-                return self.data[1]
-            if size == 10:
-                return self.data[2]
+    @classmethod
+    def reusable(cls):
+        """ An empty frame for load(), which fills it without allocating. """
+        frame = cls.__new__(cls)
+        frame.raw_data = bytearray(cls.DATA_LEN)
+        frame.checksum = 0
+        frame.received_ms = 0
+        return frame
+
+    def load(self, buf, offset):
+        """ Copy the DATA_LEN bytes at buf[offset] (length and checksum already checked). """
+        raw = self.raw_data
+        for i in range(len(raw)):
+            raw[i] = buf[offset + i]
+        self.checksum = (raw[2 * self.CHECKSUM_IDX] << 8) | raw[2 * self.CHECKSUM_IDX + 1]
+        self.received_ms = time.ticks_ms()
+        return self
+
+    @property
+    def data(self):
+        """ All 14 words as a new tuple; value() and fill() do not allocate. """
+        return struct.unpack_from(self.DATA_FMT, self.raw_data)
+
+    def value(self, index):
+        """ The value at index (PM1_0 .. COUNT_10). """
+        raw = self.raw_data
+        return (raw[2 * index] << 8) | raw[2 * index + 1]
+
+    def fill(self, values):
+        """ Write the VALUES values into values, e.g. an array('H'). """
+        raw = self.raw_data
+        for i in range(VALUES):
+            values[i] = (raw[2 * i] << 8) | raw[2 * i + 1]
+        return values
+
+    def store(self, values):
+        """ Replace the VALUES values, e.g. with an average; the checksum is left as is. """
+        raw = self.raw_data
+        for i in range(VALUES):
+            raw[2 * i] = values[i] >> 8
+            raw[2 * i + 1] = values[i] & 0xff
+
+    def age_ms(self):
+        """ Milliseconds since the frame was received. """
+        return time.ticks_diff(time.ticks_ms(), self.received_ms)
 
-        raise ValueError("Particle size {} measurement not available.".format(size))
+    def pm_ug_per_m3(self, size, atmospheric_environment=False):
+        index = (_PM_ATM_INDEX if atmospheric_environment else _PM_INDEX).get(size)
+        if index is None:
+            raise ValueError("Particle size {} measurement not available.".format(size))
+        return self.value(index)
 
     def pm_per_1l_air(self, size):
-        if size == 0.3:
-            return self.data[6]
-        if size == 0.5:
-            return self.data[7]
-        if size == 1.0:
-            return self.data[8]
-        if size == 2.5:
-            return self.data[9]
-        if size == 5:
-            return self.data[10]
-        if size == 10:
-            return self.data[11]
-
-        raise ValueError("Particle size {} measurement not available.".format(size))
+        index = _COUNT_INDEX.get(size)
+        if index is None:
+            raise ValueError("Particle size {} measurement not available.".format(size))
+        return self.value(index)
 
     def __repr__(self):
         return """
@@ -190,6 +266,14 @@ class PMS5003():
                  mode='active',
                  retries=5
                  ):
+        self._setup(uart, pin_reset, pin_enable, mode, retries)
+
+        self.reset()
+
+        if mode == 'passive':
+            self.cmd_mode_passive()
+
+    def _setup(self, uart, pin_reset, pin_enable, mode, retries):
         self._port = uart
         self._serial = type(uart) is machine.UART
         self._mode = 'active'  # device starts up in active mode
@@ -198,6 +282,19 @@ class PMS5003():
         self._pin_reset = pin_reset
         self._attempts = retries + 1 if retries else 1
 
+        # UART frame parser: bytes are read in bulk into _rx[_rx_start:_rx_end]
+        # and frames are checked and decoded in place into one reused frame.
+        self._rx = bytearray(RX_BUF_SIZE)
+        rx = memoryview(self._rx)
+        self._rx_tails = [rx[i:] for i in range(RX_BUF_SIZE)]  # readinto() targets
+        self._rx_start = 0
+        self._rx_end = 0
+        self._frame = PMS5003Data.reusable()
+        self.frames = 0         # valid data frames decoded
+        self.bad_frames = 0     # frames dropped for a wrong length or checksum
+        self.skipped_bytes = 0  # bytes discarded while hunting for a start of frame
+        self.frames_skipped = 0  # valid frames superseded by a newer one in read_latest()
+
         if mode not in ('active', 'passive'):
             raise ValueError("Invalid mode")
 
@@ -209,11 +306,6 @@ class PMS5003():
             self._pin_reset.init(machine.Pin.OUT)
             self._pin_reset.value(1)
 
-        self.reset()
-
-        if mode == 'passive':
-            self.cmd_mode_passive()
-
     def cmd_mode_passive(self):
         """
         Sends command to device to enable 'passive' mode.
@@ -258,10 +350,23 @@ class PMS5003():
         time.sleep(self.MIN_CMD_INTERVAL)
         return resp
 
+    def send_command(self, cmd_bytes):
+        """Write a command frame (e.g. PMS5003_CMD_SLEEP) without waiting for the
+           response; data-frame reads skip any response frame. Keep commands at
+           least MIN_CMD_INTERVAL apart."""
+        if self._serial:
+            self._port.write(self._build_cmd_frame(cmd_bytes))
+
+    def request(self):
+        """Passive mode: ask for a data frame without waiting for it; pick it up
+           with read_latest()."""
+        self._cmd_passive_read()
+
     def _reset_input_buffer(self):
         if not self._serial:
             return
 
+        self._rx_start = self._rx_end = 0
         while self._port.read() is not None:
             pass
 
@@ -304,12 +409,14 @@ class PMS5003():
             except OSError:
                 return False
 
-        return self._port.any() >= PMS5003Data.FRAME_LEN
+        return self._rx_end - self._rx_start + self._port.any() >= PMS5003Data.FRAME_LEN
 
     def read(self):
         """Read a data frame. In passive mode this will transmit a request for one.
            This will make additional attempts based on retries value in constructor
-           if there are exceptions and only raise the first exception if all fail."""
+           if there are exceptions and only raise the first exception if all fail.
+           On a UART the same PMS5003Data object is returned every time, refilled
+           by the next read(): use (or copy) its values before reading again."""
         read_ex = None
         for _ in range(self._attempts):
             if self._mode == 'passive':
@@ -321,42 +428,106 @@ class PMS5003():
                     read_ex = ex
         raise read_ex if read_ex else RuntimeError("read failed - internal error")
 
-    def _wait_for_bytes(self, num_bytes, timeout=MAX_RESP_TIME):
-        start = time.ticks_ms()
-        while self._port.any() < num_bytes:
-            elapsed = time.ticks_ms() - start
-            if elapsed > timeout:
-                raise ReadTimeoutError("PMS5003 Read Timeout: Waiting for {} bytes!".format(num_bytes))
+    def read_latest(self):
+        """Active mode: drain everything the UART holds and return the newest valid
+           data frame, or None if no complete frame arrived since the last call.
+           Older frames are dropped and counted in frames_skipped. Never waits.
+           The frame's received_ms is corrected for the bytes that arrived after
+           it, so age_ms() is its real age even after a backlog."""
+        if not self._serial:
+            return self._read_data() if self.data_available() else None
+        frame = None
+        after = 0  # bytes received after the end of the newest frame
+        while True:
+            offset = self._parse(PMS5003Data.DATA_LEN)
+            if offset >= 0:
+                if frame is not None:
+                    self.frames_skipped += 1
+                self.frames += 1
+                frame = self._frame.load(self._rx, offset)
+                after = self._rx_end - self._rx_start
+                continue
+            n = self._fill()
+            if not n:
+                break
+            after += n
+        if frame is not None:
+            frame.received_ms = time.ticks_add(frame.received_ms, -(after * BYTE_US // 1000))
+        return frame
+
+    def _fill(self):
+        """ Move what the UART has received into the parser buffer. Returns the byte count. """
+        n = self._port.readinto(self._rx_space()) or 0
+        self._rx_end += n
+        return n
+
+    def _rx_space(self):
+        """ Make room in the parser buffer and return the free part for readinto(). """
+        buf = self._rx
+        start, end = self._rx_start, self._rx_end
+        if start:
+            # Slide the unparsed tail (less than a frame) to the front
+            for i in range(end - start):
+                buf[i] = buf[start + i]
+            end -= start
+            self._rx_start = start = 0
+        if end == RX_BUF_SIZE:
+            # Full without a complete frame: cannot happen with valid lengths
+            self.skipped_bytes += end - 1
+            buf[0] = buf[end - 1]
+            end = 1
+        self._rx_end = end
+        return self._rx_tails[end]
+
+    def _parse(self, data_len):
+        """ Find the next valid frame with a DATA_LEN of data_len in the buffer.
+            Returns the offset of its data (after the length field), or -1 if
+            more bytes are needed. Everything before the frame is consumed. """
+        buf = self._rx
+        end = self._rx_end
+        start = self._rx_start
+        while True:
+            i = _find_sof(buf, start, end)
+            if i < 0:
+                # Keep a trailing 0x42, it may start the next frame
+                keep = 1 if end > start and buf[end - 1] == 0x42 else 0
+                self.skipped_bytes += end - start - keep
+                self._rx_start = end - keep
+                return -1
+            self.skipped_bytes += i - start
+            start = i
+            if end - i < 4:
+                break
+            length = (buf[i + 2] << 8) | buf[i + 3]
+            if length != data_len:
+                # Not the frame we want (or a false start of frame): skip the SOF
+                self.bad_frames += 1
+                start = i + 2
+                continue
+            if end - i < 4 + length:
+                break
+            checksum = 0
+            for j in range(i, i + 2 + length):
+                checksum += buf[j]
+            if checksum != (buf[i + 2 + length] << 8) | buf[i + 3 + length]:
+                self.bad_frames += 1
+                start = i + 2
+                continue
+            self._rx_start = i + 4 + length
+            return i + 4
+        self._rx_start = start
+        return -1
 
     def _read_data(self, response_class=PMS5003Data):
         if self._serial:
-            sof_index = 0
-
+            start = time.ticks_ms()
             while True:
-                self._wait_for_bytes(1)
-
-                one_byte = self._port.read(1)
-                if one_byte is None or len(one_byte) == 0:
-                    continue
-
-                if ord(one_byte) == PMS5003_SOF[sof_index]:
-                    if sof_index == 0:
-                        sof_index = 1
-                    elif sof_index == 1:
-                        break
-                else:
-                    sof_index = 0
-
-            self._wait_for_bytes(2)
-
-            len_data = self._port.read(2)  # Get frame length packet
-            frame_length = struct.unpack(">H", len_data)[0]
-            response_class.check_data_len(frame_length, desc="Length field")
-
-            self._wait_for_bytes(frame_length)
-
-            raw_data = self._port.read(frame_length)
-            return response_class(raw_data, frame_length_bytes=len_data)
+                offset = self._parse(response_class.DATA_LEN)
+                if offset >= 0:
+                    break
+                if not self._fill() and time.ticks_diff(time.ticks_ms(), start) > self.MAX_RESP_TIME:
+                    raise ReadTimeoutError("PMS5003 Read Timeout: no valid frame")
+            return self._decode(response_class, offset)
         else:
             try:
                 raw_data = self._port.readfrom_mem(PMSA003I_I2C_ADDR, 0x00, 32)
@@ -364,6 +535,14 @@ class PMS5003():
                 raise RuntimeError("Error reading from I2C")
             return response_class(raw_data[4:], frame_length_bytes=raw_data[2:4])
 
+    def _decode(self, response_class, offset):
+        if response_class is PMS5003Data:
+            self.frames += 1
+            return self._frame.load(self._rx, offset)
+        # Command responses are rare, build them the ordinary way
+        return response_class(bytes(self._rx[offset:offset + response_class.DATA_LEN]),
+                              frame_length_bytes=bytes(self._rx[offset - 2:offset]))
+
     def _cmd_passive_read(self):
         """
         Sends command to request a data frame while in 'passive'
@@ -373,3 +552,106 @@ class PMS5003():
             return
         self._reset_input_buffer()
         self._port.write(self._build_cmd_frame(PMS5003_CMD_READ))
+
+
+class AsyncPMS5003(PMS5003):
+    """PMS5003 on a UART for uasyncio: reset(), read() and the mode commands are
+       coroutines that wait on a uasyncio.StreamReader instead of spinning on
+       any(), so a slow or rebooting sensor never holds up the other tasks.
+       The constructor does not touch the sensor: await reset() first, it also
+       enters passive mode if that mode was asked for.
+
+           pms = AsyncPMS5003(uart, pin_reset, pin_enable)
+           await pms.reset()
+           data = await pms.read()
+    """
+
+    def __init__(self,
+                 uart,
+                 pin_reset,
+                 pin_enable,
+                 mode='active',
+                 retries=5
+                 ):
+        self._setup(uart, pin_reset, pin_enable, mode, retries)
+        if not self._serial:
+            raise ValueError("AsyncPMS5003 needs a UART")
+        self._mode = mode  # applied by reset()
+        self._reader = asyncio.StreamReader(uart)
+
+    async def reset(self):
+        """Reset the device via its pin, wait (without blocking) for the first data
+           frame and restore passive mode as necessary. Returns False without a
+           reset pin."""
+        if self._pin_reset is None:
+            return False
+
+        await asyncio.sleep_ms(100)
+        self._pin_reset.value(0)
+        self._reset_input_buffer()
+        await asyncio.sleep_ms(100)
+        self._pin_reset.value(1)
+
+        # Wait for the first data frame and leave it for read()
+        offset = await self._read_frame(PMS5003Data.DATA_LEN, self.MAX_RESET_TIME,
+                                        "PMS5003 Read Timeout: No response after reset")
+        self._rx_start = offset - 4
+
+        # After a reset device will be in active mode, restore passive mode
+        if self._mode == 'passive':
+            self._reset_input_buffer()
+            await self.cmd_mode_passive()
+
+        return True
+
+    async def cmd_mode_passive(self):
+        """See PMS5003.cmd_mode_passive()."""
+        self._mode = 'passive'
+        return await self._command(PMS5003_CMD_MODE_PASSIVE)
+
+    async def cmd_mode_active(self):
+        """See PMS5003.cmd_mode_active()."""
+        self._mode = 'active'
+        return await self._command(PMS5003_CMD_MODE_ACTIVE)
+
+    async def _command(self, cmd_bytes):
+        # mode changes with interval < 50ms break on a PMS5003
+        await asyncio.sleep_ms(int(self.MIN_CMD_INTERVAL * 1000))
+        self._reset_input_buffer()
+        self._port.write(self._build_cmd_frame(cmd_bytes))
+        offset = await self._read_frame(PMS5003CmdResponse.DATA_LEN, self.MAX_RESP_TIME,
+                                        "PMS5003 Read Timeout: no command response")
+        resp = self._decode(PMS5003CmdResponse, offset)
+        await asyncio.sleep_ms(int(self.MIN_CMD_INTERVAL * 1000))
+        return resp
+
+    async def read(self):
+        """Await a data frame; see PMS5003.read(). UART errors (OSError) are retried too."""
+        read_ex = None
+        for _ in range(self._attempts):
+            if self._mode == 'passive':
+                self._cmd_passive_read()
+            try:
+                offset = await self._read_frame(PMS5003Data.DATA_LEN, self.MAX_RESP_TIME,
+                                                "PMS5003 Read Timeout: no valid frame")
+                return self._decode(PMS5003Data, offset)
+            except (RuntimeError, OSError) as ex:  # OSError: a UART error, retried like a bad frame
+                if read_ex is None:
+                    read_ex = ex
+        raise read_ex if read_ex else RuntimeError("read failed - internal error")
+
+    async def _read_frame(self, data_len, timeout, message):
+        """ _parse() for uasyncio: other tasks run until the frame is in. Returns its data offset. """
+        start = time.ticks_ms()
+        while True:
+            offset = self._parse(data_len)
+            if offset >= 0:
+                return offset
+            remaining = timeout - time.ticks_diff(time.ticks_ms(), start)
+            if remaining <= 0:
+                raise ReadTimeoutError(message)
+            try:
+                n = await asyncio.wait_for_ms(self._reader.readinto(self._rx_space()), remaining)
+            except asyncio.TimeoutError:
+                raise ReadTimeoutError(message)
+            self._rx_end += n or 0
@@ -0,0 +1,204 @@
+""" pmsduty.py - sleep/wake duty cycling of the PMS5003
+
+The fan and laser of the PMS5003 are its main power draw and, in active
+mode, it streams a frame every second whether anyone reads it or not. The
+controller keeps the sensor asleep between measurements:
+
+    SLEEP  --period due-->  SETTLE (woken, fan spinning up for settle_ms)
+    SETTLE --settled-->     READ   (passive mode, `reads` requested frames)
+    READ   --done-->        SLEEP  (returns the averaged sample)
+
+    duty = PMSDutyCycle(pms)
+    duty.set_phase("ascent")
+    sample = duty.poll()        # from a periodic task, never blocks
+    if sample is not None:
+        pm25 = sample.value(PM2_5)
+
+The schedule gives per flight phase (cycle period in ms, reads per cycle),
+optionally followed by the phase's settle time (settle_ms if not given).
+A period of 0 keeps the sensor awake and returns every `reads` frames, a
+period of None keeps it asleep (a cycle under way is abandoned).
+
+The sensor is usually asleep at launch, and an ascent can be over before
+the datasheet's 30 s settle. Ascent therefore settles for ASCENT_SETTLE_MS
+only: its first values are less accurate, but there are some. After that the
+sensor stays awake (period 0) through descent, so it settles only once.
+"""
+
+import time
+from array import array
+from pms5003 import (PMS5003Data, VALUES, PMS5003_CMD_MODE_PASSIVE, PMS5003_CMD_SLEEP,
+                     PMS5003_CMD_WAKEUP)
+
+# Datasheet: stable data only 30 s after wake-up, the fan needs to spin up
+SETTLE_MS = 30000
+# Frames once the fan runs, a few seconds after wake-up
+ASCENT_SETTLE_MS = 5000
+
+# Per flight phase: (cycle period in ms, passive reads averaged per cycle[, settle ms])
+DEFAULT_SCHEDULE = {
+    "ground": (120000, 3),
+    "ascent": (0, 1, ASCENT_SETTLE_MS),
+    "descent": (0, 1),
+    "landed": (300000, 3),
+    "off": (None, 0),
+}
+
+_SLEEP = 0
+_SETTLE = 1
+_READ = 2
+
+
+class PMSDutyCycle:
+    def __init__(self, pms, schedule=DEFAULT_SCHEDULE, phase="ground", settle_ms=SETTLE_MS,
+                 read_interval_ms=1000, timeout_ms=2000):
+        self.pms = pms
+        self.schedule = schedule
+        self.settle_ms = settle_ms
+        self.read_interval_ms = read_interval_ms
+        self.timeout_ms = timeout_ms
+        self.phase = phase
+        self._use(phase)
+
+        self.sample = PMS5003Data.reusable()  # the averaged result, reused
+        self._values = array('H', [0] * VALUES)  # one frame, see _collect()
+        self._sums = [0] * VALUES
+        self._count = 0
+        self._misses = 0
+        self._state = _SLEEP
+        self._cycle_start = time.ticks_ms()
+        self._due = time.ticks_add(self._cycle_start, int(pms.MIN_CMD_INTERVAL * 1000))  # after the sleep command
+        self._waiting = False
+        self._awake_since = 0
+
+        self.cycles = 0
+        self.frames = 0      # frames averaged
+        self.timeouts = 0    # requested frames that never came
+        self.awake_ms = 0    # time with the fan running, up to the last finished cycle
+
+        # The sensor is put to sleep until the first cycle is due
+        pms.send_command(PMS5003_CMD_SLEEP)
+
+    @property
+    def asleep(self):
+        return self._state == _SLEEP
+
+    def set_phase(self, phase):
+        """ Switch to the schedule of another flight phase; takes effect at once. """
+        if phase == self.phase:
+            return
+        self.phase = phase
+        self._use(phase)
+        if self.period_ms is None:
+            if self._state != _SLEEP:
+                self._clear()
+                self._sleep(time.ticks_ms())
+        elif self._state == _SLEEP:
+            # Next cycle relative to the last one, but never later than the old plan
+            due = time.ticks_add(self._cycle_start, self.period_ms)
+            if time.ticks_diff(due, self._due) < 0:
+                self._due = due
+        elif self._state == _SETTLE:
+            # A phase with a shorter settle time reads sooner
+            due = time.ticks_add(self._awake_since, self._settle_ms)
+            if time.ticks_diff(due, self._due) < 0:
+                self._due = due
+
+    def _use(self, phase):
+        entry = self.schedule[phase]
+        self.period_ms, self.reads = entry[0], entry[1]
+        self._settle_ms = entry[2] if len(entry) > 2 else self.settle_ms
+
+    def poll(self):
+        """ Advance the duty cycle. Returns the averaged PMS5003Data when a cycle
+            completes, otherwise None. """
+        if self.period_ms is None:
+            return None
+        now = time.ticks_ms()
+        if self._waiting:
+            sample = self._collect(now)
+            if not self._waiting:
+                return sample
+        if time.ticks_diff(now, self._due) < 0:
+            return None
+
+        if self._state == _SLEEP:
+            self.pms.send_command(PMS5003_CMD_WAKEUP)
+            self._awake_since = now
+            self._cycle_start = now
+            self._state = _SETTLE
+            self._due = time.ticks_add(now, self._settle_ms)
+        elif self._state == _SETTLE:
+            # Woken sensors stream in active mode: ask for passive, first read
+            # no earlier than MIN_CMD_INTERVAL later
+            self.pms.send_command(PMS5003_CMD_MODE_PASSIVE)
+            self._state = _READ
+            self._due = time.ticks_add(now, int(self.pms.MIN_CMD_INTERVAL * 1000))
+        elif self._waiting:
+            # No frame within timeout_ms
+            self.timeouts += 1
+            self._misses += 1
+            self._waiting = False
+            if self._misses > self.reads:
+                return self._finish(now)
+        else:
+            self.pms.request()
+            self._waiting = True
+            self._due = time.ticks_add(now, self.timeout_ms)
+        return None
+
+    def _collect(self, now):
+        frame = self.pms.read_latest()
+        if frame is None:
+            return None
+        self._waiting = False
+        data = frame.fill(self._values)
+        sums = self._sums
+        for i in range(len(sums)):
+            sums[i] += data[i]
+        self._count += 1
+        self.frames += 1
+        if self._count >= self.reads:
+            return self._finish(now)
+        self._due = time.ticks_add(now, self.read_interval_ms)
+        return None
+
+    def _finish(self, now):
+        """ End of a cycle: average, then sleep (or carry on when the period is 0). """
+        count = self._count
+        sample = None
+        if count:
+            sample = self.sample
+            sums = self._sums
+            for i in range(len(sums)):
+                sums[i] = (sums[i] + count // 2) // count
+            sample.store(sums)
+            sample.received_ms = now
+        self._clear()
+        self.cycles += 1
+
+        if self.period_ms:
+            self._sleep(now)
+            self._due = time.ticks_add(self._cycle_start, self.period_ms)
+            if time.ticks_diff(self._due, now) < 0:
+                self._due = now
+        else:
+            self.awake_ms += time.ticks_diff(now, self._awake_since)
+            self._awake_since = self._cycle_start = now
+            self._due = time.ticks_add(now, self.read_interval_ms)
+        return sample
+
+    def _clear(self):
+        for i in range(len(self._sums)):
+            self._sums[i] = 0
+        self._count = self._misses = 0
+
+    def _sleep(self, now):
+        self.pms.send_command(PMS5003_CMD_SLEEP)
+        self.awake_ms += time.ticks_diff(now, self._awake_since)
+        self._state = _SLEEP
+        self._waiting = False
+
+    def report(self):
+        print("pms duty: phase {} cycles {} frames {} timeouts {} awake {} s".format(
+            self.phase, self.cycles, self.frames, self.timeouts, self.awake_ms // 1000))
@@ -0,0 +1,157 @@
+""" pressurering.py - Timer-driven BME280 sampler filling a ring of raw samples
+
+A hardware Timer samples the BME280 at a fixed 25-100 Hz, independent of
+how long the other tasks take. Every sample (ticks_us of the read, raw
+temperature, raw pressure) goes into preallocated `array('i')` rings;
+consumers catch up whenever they run:
+
+    ring = PressureRing(bmp, rate_hz=50)
+    ring.start()
+    for seq, stamp_us, raw_temp, raw_press in ring.iterate(cursor):
+        cursor = seq + 1
+        temp, pressure, _ = bmp.compensate(raw_temp, raw_press, None, result)
+
+The timer callback only schedules the read (micropython.schedule) and the
+read itself is one burst read in normal mode (set by start()); neither
+allocates. A tick whose previous read has not run yet is counted in
+`dropped`, a sample overwritten before a consumer got to it in `lost`.
+"""
+
+from array import array
+import micropython
+import time
+from machine import Timer
+from bme280 import BME280_STANDBY_0_5, BME280_IIR_OFF
+
+
+class PressureRing:
+    def __init__(self, bmp, rate_hz=50, size=128, timer_id=-1):
+        self._check_rate(rate_hz)
+        self.bmp = bmp
+        self.rate_hz = rate_hz
+        self.size = size
+        self.timer_id = timer_id
+        self.stamps = array("i", bytes(4 * size))  # ticks_us of the read
+        self.temps = array("i", bytes(4 * size))   # raw temperature
+        self.presses = array("i", bytes(4 * size))  # raw pressure
+        self.count = 0      # samples written; sample seq is at index seq % size
+        self._raw = array("i", [0, 0, 0])
+        self._pending = False
+        self._read_ref = self._read  # bound once: schedule() from the IRQ must not allocate
+        self._timer = None
+
+        self.ticks = 0
+        self.dropped = 0    # ticks skipped, the previous read still pending
+        self.lost = 0       # samples overwritten before iterate() reached them
+        self.errors = 0     # failed reads
+
+    def start(self, standby=BME280_STANDBY_0_5, iir=BME280_IIR_OFF):
+        """ Puts the BME280 in normal mode and starts sampling. """
+        self.bmp.set_normal_mode(standby=standby, iir=iir)
+        self._timer = Timer(self.timer_id)
+        self._timer.init(mode=Timer.PERIODIC, freq=self.rate_hz, callback=self._tick)
+
+    @staticmethod
+    def _check_rate(rate_hz):
+        if not 25 <= rate_hz <= 100:
+            raise ValueError("rate_hz {} outside 25..100".format(rate_hz))
+
+    def set_rate(self, rate_hz):
+        """ Changes the sample rate, at once if sampling. """
+        self._check_rate(rate_hz)
+        self.rate_hz = rate_hz
+        if self._timer is not None:
+            self._timer.init(mode=Timer.PERIODIC, freq=rate_hz, callback=self._tick)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+
+    def _tick(self, timer):
+        self.ticks += 1
+        if self._pending:
+            self.dropped += 1
+            return
+        self._pending = True
+        try:
+            micropython.schedule(self._read_ref, 0)
+        except RuntimeError:  # schedule queue full
+            self._pending = False
+            self.dropped += 1
+
+    def _read(self, _):
+        try:
+            raw = self.bmp.collect_into(self._raw)
+        except OSError:
+            self.errors += 1
+        else:
+            i = self.count % self.size
+            self.stamps[i] = time.ticks_us()
+            self.temps[i] = raw[0]
+            self.presses[i] = raw[1]
+            self.count += 1
+        self._pending = False
+
+    def latest(self, result):
+        """ Copies the newest (ticks_us, raw temperature, raw pressure) into
+            result. Returns its seq, or -1 before the first sample. """
+        while True:
+            seq = self.count - 1
+            if seq < 0:
+                return -1
+            i = seq % self.size
+            result[0] = self.stamps[i]
+            result[1] = self.temps[i]
+            result[2] = self.presses[i]
+            if self.count - seq < self.size:  # not overwritten while copying
+                return seq
+
+    def snapshot(self, stamps, temps, presses):
+        """ Copies the newest len(stamps) samples (at most size - 1), oldest
+            first, into the caller's arrays. Returns the number copied. """
+        size = self.size
+        while True:
+            end = self.count
+            n = min(len(stamps), size - 1, end)
+            start = end - n
+            for k in range(n):
+                i = (start + k) % size
+                stamps[k] = self.stamps[i]
+                temps[k] = self.temps[i]
+                presses[k] = self.presses[i]
+            if self.count - start < size:
+                return n
+
+    def iterate(self, since=0):
+        """ Yields (seq, ticks_us, raw temperature, raw pressure) for the
+            samples from seq `since` on that are still in the ring. """
+        size = self.size
+        seq = since
+        while seq < self.count:
+            if self.count - seq >= size:
+                # overwritten: skip to the oldest sample still there
+                self.lost += self.count - size + 1 - seq
+                seq = self.count - size + 1
+                continue
+            i = seq % size
+            sample = (seq, self.stamps[i], self.temps[i], self.presses[i])
+            if self.count - seq < size:
+                yield sample
+                seq += 1
+
+    @property
+    def rate(self):
+        """ Achieved sample rate over the samples in the ring (Hz). """
+        n = min(self.count, self.size - 1)
+        if n < 2:
+            return 0.0
+        last = (self.count - 1) % self.size
+        first = (self.count - n) % self.size
+        span = time.ticks_diff(self.stamps[last], self.stamps[first])
+        return (n - 1) * 1000000 / span if span > 0 else 0.0
+
+    def report(self):
+        print("pressure ring: {:.1f} Hz of {} Hz, {} samples, {} ticks dropped, {} samples lost, "
+              "{} read errors".format(self.rate, self.rate_hz, self.count, self.dropped, self.lost,
+                                     self.errors))
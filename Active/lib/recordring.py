@@ -0,0 +1,104 @@
+""" recordring.py - lock-protected ring of fixed-size sample records between two cores
+
+The sampling loop on core 0 puts records, a thread on core 1 (dualcore.py)
+takes them out for the SD card and the radio:
+
+    ring = RecordRing(slots=64, fields=10)
+    ring.put(values)                 # core 0: a sequence of `fields` numbers or None
+    seq = ring.get_into(record)      # core 1: oldest record into an array('f'), -1 if empty
+
+Records are stored as floats in one preallocated array('f'); None is stored
+as NaN and given back as None by values(). put() never waits for the
+consumer: when the ring is full the oldest record is overwritten (or the
+new one dropped, with drop_oldest=False) and counted in `dropped`. The lock
+is only held to copy one record in or out.
+"""
+
+from array import array
+import _thread
+
+_NAN = float("nan")
+
+
+class RecordRing:
+    def __init__(self, slots=64, fields=10, drop_oldest=True):
+        self.slots = slots
+        self.fields = fields
+        self.drop_oldest = drop_oldest
+        self._data = array("f", bytes(4 * slots * fields))
+        self._seqs = array("i", bytes(4 * slots))
+        self._head = 0      # oldest record
+        self._count = 0
+        self._next_seq = 0
+        self._lock = _thread.allocate_lock()
+
+        # statistics
+        self.puts = 0
+        self.gets = 0
+        self.dropped = 0     # records lost because the consumer fell behind
+        self.contended = 0   # put() or get_into() found the lock taken
+        self.high_water = 0
+
+    def __len__(self):
+        return self._count
+
+    def _acquire(self):
+        if not self._lock.acquire(0):
+            self._lock.acquire()
+            self.contended += 1
+
+    def put(self, values):
+        """ Appends a record without waiting for the consumer. Returns its seq, -1 if dropped. """
+        self._acquire()
+        try:
+            count = self._count
+            if count == self.slots:
+                self.dropped += 1
+                if not self.drop_oldest:
+                    return -1
+                self._head = (self._head + 1) % self.slots
+                count -= 1
+            slot = (self._head + count) % self.slots
+            base = slot * self.fields
+            data = self._data
+            for i in range(self.fields):
+                value = values[i]
+                data[base + i] = _NAN if value is None else value
+            seq = self._next_seq
+            self._seqs[slot] = seq
+            self._next_seq = seq + 1
+            self._count = count + 1
+            self.puts += 1
+            if count + 1 > self.high_water:
+                self.high_water = count + 1
+            return seq
+        finally:
+            self._lock.release()
+
+    def get_into(self, record):
+        """ Moves the oldest record into `record` (an array('f') of `fields`).
+            Returns its seq, or -1 when the ring is empty. """
+        self._acquire()
+        try:
+            if not self._count:
+                return -1
+            slot = self._head
+            base = slot * self.fields
+            data = self._data
+            for i in range(self.fields):
+                record[i] = data[base + i]
+            self._head = (slot + 1) % self.slots
+            self._count -= 1
+            self.gets += 1
+            return self._seqs[slot]
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def values(record):
+        """ A record as a list, NaN back to None. """
+        return [None if value != value else value for value in record]
+
+    def report(self):
+        print("record ring: {} put, {} taken, {} dropped, {} waits on the lock, high water {}/{}".format(
+            self.puts, self.gets, self.dropped, self.contended, self.high_water, self.slots))
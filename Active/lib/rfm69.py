@@ -21,9 +21,11 @@ see project: https://github.com/mchobby/esp8266-upy/tree/master/rfm69
 #   Based on RFM69 LowPowerLabs (https://github.com/LowPowerLab/RFM69/)
 #
 
-from micropython import const
+from machine import idle
+from micropython import const, schedule
 from time import sleep, sleep_us, sleep_ms, ticks_ms, ticks_diff
 import random
+import uasyncio as asyncio
 
 
 __version__ = "0.0.1"
@@ -154,22 +156,66 @@ _RH_BROADCAST_ADDRESS = const(0xFF)
 _RH_FLAGS_ACK = const(0x80)
 _RH_FLAGS_RETRY = const(0x40)
 
+# Registers the chip updates by itself (FIFO, AFC/FEI results, RSSI, IRQ flags,
+# temperature): never served from the register shadow, always read over SPI.
+_VOLATILE = bytearray(0x80)
+for _reg in (RFM69_REG_FIFO, RFM69_REG_AFC_FEI, 0x1F, 0x20, 0x21, 0x22, RFM69_REG_RSSI_CONFIG,
+		RFM69_REG_RSSI_VALUE, RFM69_REG_IRQ_FLAGS1, RFM69_REG_IRQ_FLAGS2, RFM69_REG_TEMP1, RFM69_REG_TEMP2):
+	_VOLATILE[_reg] = 1
 
-def check_timeout(flag, limit):
-	"""test for timeout waiting for specified flag"""
+
+def check_timeout(flag, limit, wait=None):
+	"""test for timeout waiting for specified flag, calling wait() between tests if given"""
 	timed_out = False
 	start = ticks_ms()
+	limit_ms = int( limit * 1000 )  # no float arithmetic (heap allocation) in the loop
 	while not timed_out and not flag():
-		if ticks_diff( ticks_ms(), start ) >= limit * 1000:
+		if ticks_diff( ticks_ms(), start ) >= limit_ms:
 			timed_out = True
+		elif wait is not None:
+			wait()
 	return timed_out
 
 class RFM69:
-	def __init__(self, spi=None, nss=None, reset=None): # dio0_pin=None
+	def __init__(self, spi=None, nss=None, reset=None, dio0=None):
 		self.reset_pin = reset
 		self.nss = nss # Pin('X5', Pin.OUT_PP)
 		self.spi = spi
 		self._mode = None
+		self._tx_start = 0
+		self._tx_limit_ms = 0
+
+		# Preallocated SPI buffers: register access, send and receive_into()
+		# allocate nothing, so polling a register does not feed the GC.
+		self._cmd = bytearray(2)
+		self._resp = bytearray(2)
+		self._reg = memoryview(self._cmd)[:1]
+		self._tx_header = bytearray(6)  # FIFO address, length, RadioHead header
+		self._rx = bytearray(RFM69_FIFO_SIZE)
+		rx = memoryview(self._rx)
+		self._rx_views = [rx[:n] for n in range(RFM69_FIFO_SIZE + 1)]  # one view per FIFO length
+
+		# Write-through shadow of the configuration registers: reads of a known
+		# register and writes of an unchanged value issue no SPI transaction.
+		self._shadow = bytearray(0x80)
+		self._cached = bytearray(0x80)  # 1 when _shadow holds the chip's value
+		self.spi_transactions = 0
+		self.spi_saved = 0  # transactions answered from the shadow
+
+		# Optional DIO0 interrupt line: PacketSent in TX, PayloadReady in RX.
+		# When given, waiting for those flags needs no SPI polling.
+		self.dio0 = dio0
+		self.on_dio0 = None  # callback(mode), run through micropython.schedule on DIO0 rising
+		self.dio0_dropped = 0  # on_dio0 calls lost to a full schedule queue
+		self._dio0_event = False
+		self._dio0_flag = None
+		self._wait = None  # between flag tests of the blocking calls
+		if dio0 is not None:
+			self._dio0_flag = asyncio.ThreadSafeFlag()
+			# The flag is set by the interrupt, so the CPU can sleep until one
+			# (WFI: the next IRQ or the 1 ms tick) instead of spinning
+			self._wait = idle
+			dio0.irq( handler=self._dio0_irq, trigger=dio0.IRQ_RISING )
 		self._tx_power = None
 		self.high_power = True # RFM69HCW can accept higher value for tx_power
 
@@ -242,6 +288,8 @@ class RFM69:
 		return self.spi_read( RFM69_REG_VERSION )
 
 	def set_mode(self, newMode ):
+		if newMode == self._mode and self._cached[RFM69_REG_OPMODE]:
+			return newMode  # already there, ModeReady is set
 		self.spi_write( RFM69_REG_OPMODE, (self.spi_read( RFM69_REG_OPMODE ) & 0xE3) | newMode)
 		# Wait for the mode change by pulling the interrupt bit
 		start = ticks_ms()
@@ -265,6 +313,15 @@ class RFM69:
 		sleep_us(100)
 		self.reset_pin.low()
 		sleep_ms(5)
+		self.clear_shadow()
+
+	def clear_shadow(self):
+		""" Forget the register shadow, e.g. after the chip was reset or configured
+			outside this driver. Registers are read over SPI again when next used. """
+		cached = self._cached
+		for i in range(len(cached)):
+			cached[i] = 0
+		self._mode = None
 
 
 	def send( self, data, keep_listening=False, destination=None, node=None,
@@ -279,41 +336,83 @@ class RFM69:
 			automatically after the packet is sent. The default setting is False.
 
 			Returns: True if success or False if the send timed out. """
+		self.send_start( data, destination=destination, node=node, identifier=identifier, flags=flags )
+		# Wait for packet sent interrupt: the DIO0 flag if wired (sleeping
+		# between interrupts), otherwise explicit polling over SPI.
+		timed_out = check_timeout(self.__packet_sent, self.xmit_timeout, self._wait)
+		self.__end_send( keep_listening )
+		return not timed_out
+
+	def send_start( self, data, destination=None, node=None, identifier=None, flags=None ):
+		""" Load the FIFO and start transmitting, without waiting for the packet to be sent.
+			Finish with send_done() (or use send_async()). Same arguments as send(). """
 		assert 0 < len(data) <= 60
 		self.__idle()  # Stop receiving to clear FIFO and keep it clear.
-		# Fill the FIFO with a packet to send. Combine header and data to form payload
-		payload = bytearray(4)
-		# payload[0] = 4 + len(data) # already using variable data_length datagram
+		# Fill the FIFO with a packet to send: length and header from the
+		# preallocated buffer, then the data itself in the same SPI transaction
+		header = self._tx_header
+		header[0] = RFM69_REG_FIFO | 0x80
+		header[1] = 4 + len(data) # variable data_length datagram
 		if destination is None:  # use attribute
-			payload[0] = self.destination
+			header[2] = self.destination
 		else:  # use kwarg
-			payload[0] = destination
+			header[2] = destination
 		if node is None:  # use attribute
-			payload[1] = self.node
+			header[3] = self.node
 		else:  # use kwarg
-			payload[1] = node
+			header[3] = node
 		if identifier is None:  # use attribute
-			payload[2] = self.identifier
+			header[4] = self.identifier
 		else:  # use kwarg
-			payload[2] = identifier
+			header[4] = identifier
 		if flags is None:  # use attribute
-			payload[3] = self.flags
+			header[5] = self.flags
 		else:  # use kwarg
-			payload[3] = flags
-		payload = payload + data
+			header[5] = flags
 		# Write payload to transmit fifo
-		self.spi_write_fifo( payload )
+		self.spi_transactions += 1
+		self.nss.low()
+		self.spi.write( header )
+		self.spi.write( data )
+		self.nss.high()
 		# Turn on transmit mode to send out the packet.
 		self.__transmit()
-		# Wait for packet sent interrupt with explicit polling (not ideal but
-		# best that can be done right now without interrupts).
-		timed_out = check_timeout(self.__packet_sent, self.xmit_timeout)
+		self._tx_start = ticks_ms()
+		self._tx_limit_ms = int( self.xmit_timeout * 1000 )  # once: send_done() polls allocation-free
+
+	def send_done( self, keep_listening=False ):
+		""" Poll a transmission started by send_start(). Returns None while the packet is
+			still going out, then True if it was sent or False if it timed out. The radio
+			is then idle, or listening if keep_listening is True. """
+		if self.__packet_sent():
+			sent = True
+		elif ticks_diff( ticks_ms(), self._tx_start ) >= self._tx_limit_ms:
+			sent = False
+		else:
+			return None
+		self.__end_send( keep_listening )
+		return sent
+
+	async def send_async( self, data, keep_listening=False, destination=None, node=None,
+			  identifier=None, flags=None ):
+		""" send() for uasyncio: other tasks run while the packet is on air.
+			With dio0 the task sleeps until the interrupt, otherwise it polls every ms. """
+		self.send_start( data, destination=destination, node=node, identifier=identifier, flags=flags )
+		return await self.wait_sent_async( keep_listening )
+
+	async def wait_sent_async( self, keep_listening=False ):
+		""" Await the end of a transmission started by send_start().
+			Returns True if the packet was sent or False if it timed out. """
+		timed_out = await self.__wait_async( self.__packet_sent, self.xmit_timeout )
+		self.__end_send( keep_listening )
+		return not timed_out
+
+	def __end_send( self, keep_listening ):
 		# Listen again if requested.
 		if keep_listening:
 			self.__listen()
 		else:  # Enter idle mode to stop receiving other packets.
 			self.__idle()
-		return not timed_out
 
 	def send_with_ack(self, data):
 		""" Reliable Datagram mode: Send a packet with data and wait for an ACK response.
@@ -365,34 +464,72 @@ class RFM69:
 		if timeout is None:
 			timeout = self.receive_timeout
 		if timeout is not None:
-			# Wait for the payload_ready signal.  This is not ideal and will
-			# surely miss or overflow the FIFO when packets aren't read fast
-			# enough, however it's the best that can be done from Python without
-			# interrupt supports.
+			# Wait for the payload_ready signal: the DIO0 flag if wired, otherwise
+			# polling, which will miss or overflow the FIFO when packets aren't
+			# read fast enough.
 			# Make sure we are listening for packets.
 			self.__listen()
-			timed_out = check_timeout(self.__payload_ready, timeout)
+			timed_out = check_timeout(self.__payload_ready, timeout, self._wait)
+		length = self.__collect( timed_out, keep_listening, with_ack )
+		if not length:
+			return None
+		return self._rx[:length] if with_header else self._rx[4:length]
+
+	def receive_into( self, buf, *, keep_listening=True, with_ack=False, timeout=None, with_header=False ):
+		""" receive() without allocating: the packet is copied into `buf` (truncated to its size).
+			Returns the number of bytes copied, or None if no packet was received. """
+		timed_out = False
+		if timeout is None:
+			timeout = self.receive_timeout
+		if timeout is not None:
+			self.__listen()
+			timed_out = check_timeout(self.__payload_ready, timeout, self._wait)
+		length = self.__collect( timed_out, keep_listening, with_ack )
+		if not length:
+			return None
+		start = 0 if with_header else 4
+		n = min( length - start, len(buf) )
+		rx = self._rx
+		for i in range(n):  # byte loop: slicing would allocate
+			buf[i] = rx[start + i]
+		return n
+
+	async def receive_async( self, *, keep_listening=True, with_ack=False, timeout=None, with_header=False ):
+		""" receive() for uasyncio: other tasks run while waiting for a packet.
+			With dio0 the task sleeps until the interrupt, otherwise it polls every ms. """
+		if timeout is None:
+			timeout = self.receive_timeout
+		self.__listen()
+		timed_out = await self.__wait_async( self.__payload_ready, timeout )
+		length = self.__collect( timed_out, keep_listening, with_ack )
+		if not length:
+			return None
+		return self._rx[:length] if with_header else self._rx[4:length]
+
+	def __collect( self, timed_out, keep_listening, with_ack ):
+		""" Read the received packet (if not timed_out) into self._rx and leave the radio
+			listening or idle. Returns the packet length with header, or 0 if there is none. """
 		# Payload ready is set, a packet is in the FIFO.
-		packet = None
+		length = 0
+		packet = self._rx
 		# save last RSSI reading
 		self.last_rssi = self.rssi
 		# Enter idle mode to stop receiving other packets.
 		self.__idle()
 		if not timed_out:
 			# Read the length of the FIFO.
-			fifo_length = self.spi_read(RFM69_REG_FIFO)
+			fifo_length = min( self.spi_read(RFM69_REG_FIFO), RFM69_FIFO_SIZE )
 			# Handle if the received packet is too small to include the 4 byte
 			# RadioHead header and at least one byte of data --reject this packet and ignore it.
 			if fifo_length > 0:  # read and clear the FIFO if anything in it
-				packet = self.spi_burst_read(RFM69_REG_FIFO, fifo_length)
+				self.spi_burst_read_into(RFM69_REG_FIFO, self._rx_views[fifo_length])
 
-			if fifo_length < 5:
-				packet = None
-			else:
+			if fifo_length >= 5:
+				length = fifo_length
 				if ( self.node != _RH_BROADCAST_ADDRESS
 					and packet[0] != _RH_BROADCAST_ADDRESS
 					and packet[0] != self.node  ):
-					packet = None
+					length = 0
 				# send ACK unless this was an ACK or a broadcast
 				elif ( with_ack
 					and ((packet[3] & _RH_FLAGS_ACK) == 0)
@@ -405,18 +542,16 @@ class RFM69:
 							identifier=packet[2], flags=(packet[3] | _RH_FLAGS_ACK),  )
 					# reject Retries if we have seen this identifier from this source before
 					if (self.seen_ids[packet[1]] == packet[2]) and (packet[3] & _RH_FLAGS_RETRY):
-						packet = None
+						length = 0
 					else:  # save the packet identifier for this source
 						self.seen_ids[packet[1]] = packet[2]
-				if ( not with_header and packet is not None ):  # skip the header if not wanted
-					packet = packet[4:]
-		# Listen again if necessary and return the result packet.
+		# Listen again if necessary and return the result packet length.
 		if keep_listening:
 			self.__listen()
 		else:
 			# Enter idle mode to stop receiving other packets.
 			self.__idle()
-		return packet
+		return length
 
 	def __transmit(self):
 		""" Transmit a packet which is queued in the FIFO.  This is a low level function for
@@ -427,6 +562,7 @@ class RFM69:
 			self.spi_write( RFM69_REG_TEST_PA2, RF_TEST_PA2_BOOST)
 		# Enable packet sent interrupt for D0 line.
 		self.dio_0_mapping = 0b00
+		self.__arm_dio0()
 		# Enter TX mode (will clear FIFO!).
 		#self.operation_mode = TX_MODE
 		self.set_mode( RFM69_MODE_TX )
@@ -454,18 +590,57 @@ class RFM69:
 			self.spi_write( RFM69_REG_TEST_PA2, RF_TEST_PA2_NORMAL)
 		# Enable payload ready interrupt for D0 line.
 		self.dio_0_mapping = 0b01
+		self.__arm_dio0()
 		# Enter RX mode (will clear FIFO!).
 		#self.operation_mode = RX_MODE
 		self.set_mode( RFM69_MODE_RX )
 
 	def __packet_sent(self):
 		""" Transmit status """
+		if self.dio0 is not None:
+			return self._dio0_event
 		return (self.spi_read(RFM69_REG_IRQ_FLAGS2) & 0x8) >> 3
 
 	def __payload_ready(self):
 		""" Receive status """
+		if self.dio0 is not None:
+			# The level too: a packet may have arrived before we (re)armed while listening
+			return self._dio0_event or self.dio0.value()
 		return (self.spi_read(RFM69_REG_IRQ_FLAGS2) & 0x4) >> 2
 
+	def __arm_dio0(self):
+		""" Forget the previous DIO0 edge before entering TX or RX mode. """
+		self._dio0_event = False
+		if self._dio0_flag is not None:
+			self._dio0_flag.clear()
+
+	def _dio0_irq(self, pin):
+		# Pin IRQ: no allocation here, user code is deferred with schedule()
+		self._dio0_event = True
+		self._dio0_flag.set()
+		if self.on_dio0 is not None:
+			try:
+				schedule( self.on_dio0, self._mode )
+			except RuntimeError:  # schedule queue full: the flags above still work
+				self.dio0_dropped += 1
+
+	async def __wait_async(self, flag, limit):
+		""" check_timeout() for uasyncio. Returns True on timeout. """
+		start = ticks_ms()
+		limit_ms = int( limit * 1000 )  # no float arithmetic (heap allocation) in the loop
+		while not flag():
+			remaining = limit_ms - ticks_diff( ticks_ms(), start )
+			if remaining <= 0:
+				return True
+			if self._dio0_flag is not None:
+				try:
+					await asyncio.wait_for_ms( self._dio0_flag.wait(), remaining )
+				except asyncio.TimeoutError:
+					return not flag()
+			else:
+				await asyncio.sleep_ms( 1 )
+		return False
+
 	def clear_fifo( self ):
 		self.set_mode( RFM69_MODE_STDBY )
 		self.set_mode( RFM69_MODE_RX )
@@ -642,52 +817,72 @@ class RFM69:
 
 	# Read/Write Functions
 	def spi_read(self, register):
-		# Read U8 register from module
-		data = bytearray(2)
+		# Read U8 register from module (from the shadow when it is known)
+		if self._cached[register]:
+			self.spi_saved += 1
+			return self._shadow[register]
+		self.spi_transactions += 1
+		data = self._cmd
 		data[0] = register & ~0x80
 		data[1] = 0
-		resp = bytearray(2)
+		resp = self._resp
 		self.nss.low()
 		self.spi.write_readinto(data, resp ) # timeout=5000)
 		self.nss.high()
+		if not _VOLATILE[register]:
+			self._shadow[register] = resp[1]
+			self._cached[register] = 1
 		return resp[1]
 
 	def spi_burst_read(self, register, length):
-		data = bytearray(length+1)
-		data[0] = register & ~0x80
-		for i in range(1,length+1):
-			data[i] = 0
-		# We get the length again as the first character of the buffer
-		buf = bytearray(length+1)
+		buf = bytearray(length)
+		self.spi_burst_read_into(register, buf)
+		return buf
+
+	def spi_burst_read_into(self, register, buf):
+		# Read len(buf) bytes starting at register, without allocating
+		self.spi_transactions += 1
+		self._reg[0] = register & ~0x80
 		self.nss.low()
-		self.spi.write_readinto(data, buf ) # , timeout=5000)
+		self.spi.write(self._reg )
+		self.spi.readinto(buf)
 		self.nss.high()
-		return buf[1:]
 
 	def spi_write(self, register, value):
 		# Write U8 value into a module register
-		if (type(value) is bytearray) or (type(value) is bytes):
-			data = bytearray(1)
+		if isinstance(value, int):
+			if self._cached[register] and self._shadow[register] == value:
+				self.spi_saved += 1
+				return
+			self.spi_transactions += 1
+			data = self._cmd
 			data[0] = register | 0x80
+			data[1] = value
 			self.nss.low()
 			self.spi.write(data )# , timeout=5000)
-			self.spi.write(value)
 			self.nss.high()
+			if not _VOLATILE[register]:
+				self._shadow[register] = value
+				self._cached[register] = 1
 		else:
-			data = bytearray(2)
-			data[0] = register | 0x80
-			data[1] = value
+			self.spi_transactions += 1
+			self._reg[0] = register | 0x80
 			self.nss.low()
-			self.spi.write(data )# , timeout=5000)
+			self.spi.write(self._reg )# , timeout=5000)
+			self.spi.write(value)
 			self.nss.high()
+			if register != RFM69_REG_FIFO:  # burst: the address increments
+				for i in range(len(value)):
+					self._shadow[register + i] = value[i]
+					self._cached[register + i] = 1
 
 	def spi_write_fifo(self, data):
-		# fifo_data = bytearray(len(data)+2)
-		buf2 = bytearray(2)
-		buf2[0] = RFM69_REG_FIFO | 0x80
-		buf2[1] = len(data )
+		data_len = self._cmd
+		data_len[0] = RFM69_REG_FIFO | 0x80
+		data_len[1] = len(data )
+		self.spi_transactions += 1
 		self.nss.low()
-		self.spi.write( buf2 )
+		self.spi.write( data_len )
 		self.spi.write( data )
 		self.nss.high()
 
@@ -701,7 +896,7 @@ class RFM69:
 	@dio_0_mapping.setter
 	def  dio_0_mapping( self, value ):
 		assert 0<=value<=3, "Invalid DIO_0 value"
-		reg = self.spi_read( RFM69_REG_DIO_MAPPING1 ) & 0b11000000
+		reg = self.spi_read( RFM69_REG_DIO_MAPPING1 ) & 0b00111111  # keep DIO1-3
 		self.spi_write( RFM69_REG_DIO_MAPPING1, reg | (value<<6) )
 
 	@property
@@ -1,148 +1,398 @@
 from machine import I2C
 import time
-import struct
+
+PERIODIC_INTERVAL_MS = 5000  # start_periodic_measurement: a new value every 5 s
+LOW_POWER_INTERVAL_MS = 30000  # start_low_power_periodic_measurement: every 30 s
+SINGLE_SHOT_MS = 5000        # trigger_single_shot: measurement time
+SINGLE_SHOT_RHT_MS = 50      # trigger_single_shot(rht_only=True)
+DATA_READY_POLL_MS = 250     # read_if_ready: status polling once a value is due
+COMMAND_MS = 1               # execution time of the data ready and read measurement commands
+BUDGET_MS = 200              # default time budget of a blocking call, retries included
+RETRY_MS = 10                # first retry delay, doubled after every failure
+BACKOFF_MAX_MS = 5000        # read_if_ready: longest pause after repeated failures
+# Datasheet execution times (ms) of the long commands
+STOP_MS = 500
+REINIT_MS = 20
+FACTORY_RESET_MS = 1200
+SELF_TEST_MS = 10000
+
+# Measurement modes (SCD4x.mode); None until the driver starts or stops one
+MODE_IDLE = 0
+MODE_PERIODIC = 1
+MODE_LOW_POWER = 2
+MODE_SINGLE_SHOT = 3  # a single shot is running, back to idle once collected
+
+# Upper bounds (ms) of the call latency histogram, the last bin counts the rest
+LATENCY_BINS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+def _make_crc_table():
+    # CRC-8 of every byte value: polynomial 0x31, MSB first
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table[i] = crc
+    return bytes(table)
+
+_CRC_TABLE = _make_crc_table()
+
+def crc8(msb, lsb):
+    """Sensirion CRC-8 (init 0xFF) of one 16-bit word."""
+    return _CRC_TABLE[_CRC_TABLE[0xFF ^ msb] ^ lsb]
+
+def _word(data, index):
+    return (data[3 * index] << 8) | data[3 * index + 1]
+
+# read_if_ready() states, each followed by the next one
+_IDLE = 0     # next: send the data ready command
+_STATUS = 1   # next: fetch the data ready status
+_READY = 2    # data ready: send the read measurement command (same call)
+_MEASURE = 3  # next: fetch the measurement
 
 class SCD4x:
-    def __init__(self, i2c, address=0x62):
+    def __init__(self, i2c, address=0x62, budget_ms=BUDGET_MS):
         self.i2c = i2c
         self.address = address
-        self.error_count = 0
+        self.budget_ms = budget_ms
+        self.error_count = 0     # consecutive failed transactions, 0 after a success
+        self.errors = 0          # failed transactions in total
+        self.rejected_words = 0  # words read with a CRC mismatch
+        self.latency = [0] * (len(LATENCY_BINS_MS) + 1)
+        self.max_latency_us = 0
+        self.mode = None
+        self.interval_ms = PERIODIC_INTERVAL_MS
+        self.poll_ms = DATA_READY_POLL_MS
+        self._rht_only = False
+        # Newest measurement (co2, temperature, humidity) and when it was read
+        self.last = None
+        self.last_ms = 0
+        # Bring-up, see begin(): when it started, ms from then to the first sample
+        self.boot_ms = time.ticks_ms()
+        self.first_sample_ms = None
+        self.serial_number = None
+        self.self_test_passed = None
+        self._ready_at = self.boot_ms
+        self._next_poll = self.boot_ms
+        self._state = _IDLE
+        # Reused transfer buffers: responses of up to 3 words, commands with an argument
+        self._rx = bytearray(9)
+        self._rx_views = {n: memoryview(self._rx)[:n] for n in (3, 6, 9)}
+        self._tx = bytearray(5)
 
-    def _write_command(self, command, retries=5, delay=0.1):
-        for attempt in range(retries):
-            try:
-                self.i2c.writeto(self.address, command)
-                time.sleep_ms(20)  # Increased delay for sensor processing
-                self.error_count = 0  # Reset error count on success
-                return True
-            except OSError:
-                self.error_count += 1
-                time.sleep(delay)
-        return False
+    def _verify(self, data):
+        # Check the CRC of every word in place
+        table = _CRC_TABLE
+        bad = 0
+        for i in range(0, len(data), 3):
+            if table[table[0xFF ^ data[i]] ^ data[i + 1]] != data[i + 2]:
+                bad += 1
+        if bad:
+            self.rejected_words += bad
+            raise OSError(84)  # EILSEQ, handled like a failed transfer
+
+    def _read_into(self, length):
+        data = self._rx_views[length]
+        self.i2c.readfrom_into(self.address, data)
+        self._verify(data)
+        return data
 
-    def _read_data(self, command, length, retries=5, delay=0.1):
-        for attempt in range(retries):
+    def _failed(self):
+        self.error_count += 1
+        self.errors += 1
+
+    def _record(self, start_us):
+        us = time.ticks_diff(time.ticks_us(), start_us)
+        if us > self.max_latency_us:
+            self.max_latency_us = us
+        i = 0
+        while i < len(LATENCY_BINS_MS) and us > LATENCY_BINS_MS[i] * 1000:
+            i += 1
+        self.latency[i] += 1
+
+    def _transfer(self, command, length, wait_ms, budget_ms):
+        # Blocking command with optional read back into the reused buffer.
+        # Failed attempts (and CRC mismatches) are retried with doubling
+        # delays while the next attempt still fits in the budget.
+        start_us = time.ticks_us()
+        deadline = time.ticks_add(time.ticks_ms(), self.budget_ms if budget_ms is None else budget_ms)
+        delay_ms = RETRY_MS
+        while True:
             try:
                 self.i2c.writeto(self.address, command)
-                time.sleep_ms(20)  # Increased delay for sensor processing
-                data = self.i2c.readfrom(self.address, length)
+                time.sleep_ms(wait_ms)  # Sensor processing time of the command
+                data = self._read_into(length) if length else True
                 self.error_count = 0  # Reset error count on success
+                self._record(start_us)
                 return data
             except OSError:
-                self.error_count += 1
-                time.sleep(delay)
-        return None
+                self._failed()
+            left = time.ticks_diff(deadline, time.ticks_ms())
+            if left < delay_ms + wait_ms:
+                self._record(start_us)
+                return None
+            time.sleep_ms(delay_ms)
+            delay_ms *= 2
+
+    def _write_command(self, command, wait_ms=20, budget_ms=None):
+        return self._transfer(command, 0, wait_ms, budget_ms) is not None
+
+    def _read_data(self, command, length, wait_ms=20, budget_ms=None):
+        # The result is a view of the reused buffer, valid until the next transfer
+        return self._transfer(command, length, wait_ms, budget_ms)
+
+    def _write_word(self, command, value, wait_ms=20, budget_ms=None):
+        # Command followed by a 16-bit argument and its CRC
+        tx = self._tx
+        tx[0] = command >> 8
+        tx[1] = command & 0xFF
+        tx[2] = (value >> 8) & 0xFF
+        tx[3] = value & 0xFF
+        tx[4] = crc8(tx[2], tx[3])
+        return self._transfer(tx, 0, wait_ms, budget_ms) is not None
+
+    def _started(self, mode, interval_ms):
+        self.mode = mode
+        self.interval_ms = interval_ms
+        self._state = _IDLE
+        self._next_poll = time.ticks_add(time.ticks_ms(), interval_ms - self.poll_ms)
 
     def start_periodic_measurement(self):
-        self._write_command(b'\x21\xb1')
+        if self._write_command(b'\x21\xb1', wait_ms=COMMAND_MS):
+            self._started(MODE_PERIODIC, PERIODIC_INTERVAL_MS)
+
+    def start_low_power_periodic_measurement(self):
+        # A measurement every 30 s at about a fifth of the periodic mode current
+        if self._write_command(b'\x21\xac', wait_ms=COMMAND_MS):
+            self._started(MODE_LOW_POWER, LOW_POWER_INTERVAL_MS)
+
+    def stop_periodic_measurement(self, wait=True):
+        """Back to idle. With wait=False it returns at once; ready() tells when
+        the sensor takes commands again (500 ms)."""
+        self._write_command(b'\x3f\x86', wait_ms=STOP_MS if wait else 0)
+        self.mode = MODE_IDLE
+        self._ready_at = time.ticks_add(time.ticks_ms(), 0 if wait else STOP_MS)
 
-    def stop_periodic_measurement(self):
-        self._write_command(b'\x3f\x86')
+    def ready(self):
+        """False while a command started with begin() or
+        stop_periodic_measurement(wait=False) is still executing."""
+        return time.ticks_diff(time.ticks_ms(), self._ready_at) >= 0
+
+    def trigger_single_shot(self, rht_only=False):
+        """Start one measurement of an idle sensor and return at once; the
+        following read_if_ready() calls collect it when done (5 s, 50 ms for
+        rht_only, which keeps the last CO2 value)."""
+        if not self._write_command(b'\x21\x96' if rht_only else b'\x21\x9d', wait_ms=0):
+            return False
+        self._rht_only = rht_only
+        self.mode = MODE_SINGLE_SHOT
+        self._state = _IDLE
+        self._next_poll = time.ticks_add(time.ticks_ms(), SINGLE_SHOT_RHT_MS if rht_only else SINGLE_SHOT_MS)
+        return True
 
     def measure_single_shot(self):
-        self._write_command(b'\x21\x9D')  # Single shot command for full measurement
+        self.trigger_single_shot()  # Single shot command for full measurement
         time.sleep(5)  # Wait for measurement to complete
 
     def measure_single_shot_rht_only(self):
-        self._write_command(b'\x21\x96')  # Single shot command for RH and T only
+        self.trigger_single_shot(rht_only=True)  # Single shot command for RH and T only
         time.sleep(0.05)  # Wait for measurement to complete
 
-    def read_measurement(self):
-        data = self._read_data(b'\xec\x05', 9)
+    def get_data_ready_status(self, budget_ms=None):
+        """True when a measurement is waiting to be read (1 ms command)."""
+        data = self._read_data(b'\xe4\xb8', 3, wait_ms=COMMAND_MS, budget_ms=budget_ms)
         if data:
-            try:
-                co2 = struct.unpack('>H', data[0:2])[0]
-                temperature = -45 + 175 * struct.unpack('>H', data[3:5])[0] / 65536.0
-                humidity = 100 * struct.unpack('>H', data[6:8])[0] / 65536.0
-                return co2, temperature, humidity
-            except (struct.error, IndexError):
-                return None, None, None
-        else:
-            return None, None, None
+            return _word(data, 0) & 0x07ff != 0
+        return False
+
+    def _decode_measurement(self, data):
+        co2 = _word(data, 0)
+        if self._rht_only:
+            # No CO2 in an RH/T-only single shot
+            co2 = self.last[0] if self.last else None
+            self._rht_only = False
+        if self.mode == MODE_SINGLE_SHOT:
+            self.mode = MODE_IDLE
+        temperature = -45 + 175 * _word(data, 1) / 65536.0
+        humidity = 100 * _word(data, 2) / 65536.0
+        self.last = (co2, temperature, humidity)
+        self.last_ms = time.ticks_ms()
+        if self.first_sample_ms is None:
+            self.first_sample_ms = time.ticks_diff(self.last_ms, self.boot_ms)
+        return self.last
+
+    def read_measurement(self, budget_ms=None):
+        data = self._read_data(b'\xec\x05', 9, wait_ms=COMMAND_MS, budget_ms=budget_ms)
+        if data:
+            return self._decode_measurement(data)
+        return None, None, None
+
+    def read_if_ready(self):
+        """Returns (co2, temperature, humidity) when the sensor has a new
+        measurement, otherwise None. Never sleeps: a call sends a command, or
+        fetches the response of the one sent on an earlier call (followed by
+        the read measurement command when data is ready), and does nothing
+        until the next measurement is due. After a failure it waits poll_ms,
+        doubling up to BACKOFF_MAX_MS while the failures repeat. The newest
+        values stay in self.last."""
+        now = time.ticks_ms()
+        if self.mode == MODE_IDLE or time.ticks_diff(now, self._next_poll) < 0:
+            return None
+        state = self._state
+        start_us = time.ticks_us()
+        try:
+            if state == _STATUS:
+                if not _word(self._read_into(3), 0) & 0x07ff:
+                    self.error_count = 0
+                    self._state = _IDLE
+                    self._next_poll = time.ticks_add(now, self.poll_ms)
+                    return None
+                state = _READY
+            if state == _MEASURE:
+                data = self._read_into(9)
+            else:
+                # Send the next command, its response can be fetched COMMAND_MS later
+                self.i2c.writeto(self.address, b'\xe4\xb8' if state == _IDLE else b'\xec\x05')
+                self.error_count = 0
+                self._state = state + 1
+                self._next_poll = time.ticks_add(now, COMMAND_MS)
+                return None
+        except OSError:
+            self._failed()
+            self._state = _IDLE
+            backoff = self.poll_ms << min(self.error_count - 1, 8)
+            self._next_poll = time.ticks_add(now, min(backoff, BACKOFF_MAX_MS))
+            return None
+        finally:
+            self._record(start_us)
+        self.error_count = 0
+        self._state = _IDLE
+        self._decode_measurement(data)
+        # Start polling again shortly before the next measurement is due
+        # (after a single shot the sensor is idle until triggered again)
+        self._next_poll = time.ticks_add(self.last_ms, self.interval_ms - self.poll_ms)
+        return self.last
+
+    def reset_stats(self):
+        self.errors = self.max_latency_us = 0
+        for i in range(len(self.latency)):
+            self.latency[i] = 0
+
+    def report(self):
+        print("scd4x: {} errors, latency max {} us, calls up to ms {}".format(
+            self.errors, self.max_latency_us,
+            " ".join("{}:{}".format(bound, n) for bound, n in
+                     zip(LATENCY_BINS_MS + (">",), self.latency) if n)))
+
+    def measurement_age_ms(self):
+        """Milliseconds since self.last was read, None before the first one."""
+        if self.last is None:
+            return None
+        return time.ticks_diff(time.ticks_ms(), self.last_ms)
 
     def get_serial_number(self):
         data = self._read_data(b'\x36\x82', 9)
         if data:
-            serial_number = struct.unpack('>HHH', data)
+            serial_number = (_word(data, 0), _word(data, 1), _word(data, 2))
             return serial_number
         else:
             return None
 
     def soft_reset(self):
-        self._write_command(b'\x36\x32')
-        time.sleep(0.5)  # Increased delay for reset
+        # reinit: reload the settings from EEPROM (0x3632 would be a factory reset)
+        self._write_command(b'\x36\x46', wait_ms=REINIT_MS)
+
+    def perform_factory_reset(self):
+        self._write_command(b'\x36\x32', wait_ms=FACTORY_RESET_MS)
 
     def perform_self_test(self):
-        self._write_command(b'\x36\x39')
-        time.sleep(10)  # Self-test takes 10 seconds
-        data = self._read_data(b'\xE4\xB8', 3)
+        # The result is read back once the 10 s self-test is done
+        data = self._read_data(b'\x36\x39', 3, wait_ms=SELF_TEST_MS)
         if data:
-            return struct.unpack('>H', data[:2])[0] == 0
+            return _word(data, 0) == 0
         else:
             return False
 
     def set_temperature_offset(self, offset):
         value = int(offset * 374.49142857)
-        self._write_command(b'\x24\x1d' + struct.pack('>H', value))
+        self._write_word(0x241d, value)
 
     def get_temperature_offset(self):
         data = self._read_data(b'\x23\x18', 3)
         if data:
-            offset = struct.unpack('>H', data[:2])[0]
+            offset = _word(data, 0)
             return 0.0026702880859375 * offset 
         else:
             return None
 
     def set_altitude(self, altitude):
-        self._write_command(b'\x24\x27' + struct.pack('>H', altitude))
+        self._write_word(0x2427, altitude)
 
     def get_altitude(self):
         data = self._read_data(b'\x23\x22', 3)
         if data:
-            return struct.unpack('>H', data[:2])[0]
+            return _word(data, 0)
         else:
             return None
 
     def perform_forced_calibration(self, target_co2):
-        self._write_command(b'\x36\x2f' + struct.pack('>H', target_co2))
+        self._write_word(0x362f, target_co2)
         time.sleep(0.5)
         data = self._read_data(b'\xE4\xB8', 3)
         if data:
-            return struct.unpack('>H', data[:2])[0]
+            return _word(data, 0)
         else:
             return None
 
     def set_automatic_self_calibration(self, enable):
-        self._write_command(b'\x24\x16' + struct.pack('>H', int(enable)))
+        self._write_word(0x2416, int(enable))
 
     def get_automatic_self_calibration(self):
         data = self._read_data(b'\x23\x13', 3)
         if data:
-            return struct.unpack('>H', data[:2])[0] == 1
+            return _word(data, 0) == 1
         else:
             return None
 
-    def initialize_sensor(self):
+    def begin(self):
+        """Start the bring-up and return at once; finish() completes it. The
+        sensor may still be measuring from before an MCU reset, and then only
+        takes commands 500 ms after a stop, which the other setup can use."""
+        self.boot_ms = time.ticks_ms()
+        self.first_sample_ms = None
+        self._write_command(b'\x3f\x86', wait_ms=0, budget_ms=0)
+        self.mode = MODE_IDLE
+        self._ready_at = time.ticks_add(time.ticks_ms(), STOP_MS)
+
+    def finish(self, self_test=False, start=True):
+        """Wait what is left of the stop, optionally run the 10 s self-test,
+        read the serial number and start periodic measurement. Returns the
+        serial number, None when the sensor does not answer."""
+        wait = time.ticks_diff(self._ready_at, time.ticks_ms())
+        if wait > 0:
+            time.sleep_ms(wait)
+        self.serial_number = self.get_serial_number()
+        if self_test:
+            self.self_test_passed = self.perform_self_test()
+        if start:
+            self.start_periodic_measurement()
+        return self.serial_number
+
+    def initialize_sensor(self, self_test=False):
         print("Initializing sensor...")
-        self.soft_reset()
-        time.sleep(0.5)
-        serial_number = self.get_serial_number()
+        self.begin()
+        serial_number = self.finish(self_test, start=False)
         if serial_number:
             print(f"Sensor Serial Number: {serial_number}")
         else:
             print("Failed to read sensor serial number")
-        
-        self_test_result = self.perform_self_test()
-        if self_test_result:
-            print("Sensor self-test passed")
-        else:
-            print("Sensor self-test failed")
+
+        if self_test:
+            print("Sensor self-test", "passed" if self.self_test_passed else "failed")
 
         temperature_offset = self.get_temperature_offset()
         if temperature_offset is not None:
             print(f"Temperature Offset: {temperature_offset:.2f} °C")
         else:
             print("Failed to read temperature offset")
-        
-        time.sleep(5)  # Simulate initialization time
         print("Initialization complete")
@@ -0,0 +1,117 @@
+""" scd4xmode.py - SCD41 measurement mode picked from the sampling budget
+
+The SCD41 can measure every 5 s (periodic), every 30 s (low power periodic)
+or once on request (single shot, idle in between). The policy takes the
+longest acceptable time between CO2 samples and runs the mode with the
+lowest average supply current that still meets it:
+
+    co2 = SCD4xModePolicy(scd, interval_ms=5000)
+    co2.set_interval(300000)    # e.g. on the ground: one sample per 5 min
+    sample = co2.poll()         # from a periodic task, never blocks
+    if sample is not None:
+        ppm, temperature, humidity = sample
+
+With the datasheet currents single shots beat both periodic modes from a
+budget of 15 s up; low power periodic is picked when single shots are not
+allowed (single_shot=False).
+
+Switching out of a periodic mode stops it without waiting; the next mode
+starts once the sensor takes commands again, 500 ms later.
+"""
+
+import time
+from scd4x_micro import (MODE_IDLE, MODE_PERIODIC, MODE_LOW_POWER, MODE_SINGLE_SHOT,
+                         PERIODIC_INTERVAL_MS, LOW_POWER_INTERVAL_MS, SINGLE_SHOT_MS)
+
+# Datasheet average supply currents at 3.3 V (mA)
+IDLE_MA = 0.2
+PERIODIC_MA = 15.0
+LOW_POWER_MA = 3.2
+# Charge of one single shot above idle (mA*s): 0.45 mA average at one per 5 min
+SINGLE_SHOT_MAS = (0.45 - IDLE_MA) * 300
+
+# Mode, shortest interval it can deliver
+_MODES = (
+    (MODE_PERIODIC, PERIODIC_INTERVAL_MS),
+    (MODE_LOW_POWER, LOW_POWER_INTERVAL_MS),
+    (MODE_SINGLE_SHOT, SINGLE_SHOT_MS),
+)
+
+
+def average_ma(mode, interval_ms):
+    """ Average supply current of a mode giving one sample every interval_ms. """
+    if mode == MODE_PERIODIC:
+        return PERIODIC_MA
+    if mode == MODE_LOW_POWER:
+        return LOW_POWER_MA
+    return IDLE_MA + SINGLE_SHOT_MAS * 1000 / interval_ms
+
+
+def pick_mode(interval_ms, single_shot=True):
+    """ The mode with the lowest current that samples at least every interval_ms. """
+    best = MODE_PERIODIC
+    for mode, native_ms in _MODES:
+        if native_ms > interval_ms or (mode == MODE_SINGLE_SHOT and not single_shot):
+            continue
+        if average_ma(mode, interval_ms) < average_ma(best, interval_ms):
+            best = mode
+    return best
+
+
+class SCD4xModePolicy:
+    def __init__(self, scd, interval_ms=PERIODIC_INTERVAL_MS, single_shot=True):
+        self.scd = scd
+        self.single_shot = single_shot
+        self.interval_ms = interval_ms
+        self.mode = pick_mode(interval_ms, single_shot)
+        self._next_shot = time.ticks_ms()
+        self._shot_ms = 0
+
+        self.switches = 0   # mode changes
+        self.shots = 0      # single shots triggered
+        self.lost = 0       # single shots that never came back
+
+    def set_interval(self, interval_ms):
+        """ New sampling budget; a mode change is carried out by poll(). """
+        self.interval_ms = interval_ms
+        mode = pick_mode(interval_ms, self.single_shot)
+        if mode != self.mode:
+            self.mode = mode
+            self.switches += 1
+        if mode == MODE_SINGLE_SHOT:
+            # Next shot interval_ms after the last one, but never later than planned
+            due = time.ticks_add(self._shot_ms, interval_ms)
+            if time.ticks_diff(due, self._next_shot) < 0:
+                self._next_shot = due
+
+    def poll(self):
+        """ Drive the sensor towards the wanted mode. Returns the new
+            (co2, temperature, humidity) or None. """
+        scd = self.scd
+        now = time.ticks_ms()
+        if scd.mode == MODE_SINGLE_SHOT:
+            sample = scd.read_if_ready()
+            if sample is None and time.ticks_diff(now, self._shot_ms) > 2 * SINGLE_SHOT_MS:
+                # The result was lost (e.g. a failed read): the sensor is idle again
+                scd.mode = MODE_IDLE
+                self.lost += 1
+            return sample
+        if scd.mode != self.mode:
+            if scd.mode != MODE_IDLE:
+                scd.stop_periodic_measurement(wait=False)
+            elif scd.ready():
+                if self.mode == MODE_PERIODIC:
+                    scd.start_periodic_measurement()
+                elif self.mode == MODE_LOW_POWER:
+                    scd.start_low_power_periodic_measurement()
+                elif time.ticks_diff(now, self._next_shot) >= 0 and scd.trigger_single_shot():
+                    self.shots += 1
+                    self._shot_ms = now
+                    self._next_shot = time.ticks_add(now, self.interval_ms)
+            return None
+        return scd.read_if_ready()
+
+    def report(self):
+        print("scd4x mode: {} every {} s, {} switches, {} single shots ({} lost)".format(
+            ("idle", "periodic", "low power", "single shot")[self.mode], self.interval_ms // 1000,
+            self.switches, self.shots, self.lost))
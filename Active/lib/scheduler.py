@@ -0,0 +1,145 @@
+""" scheduler.py - cooperative multi-rate task scheduler on top of uasyncio
+
+Every sensor/driver gets its own periodic task at its native rate instead of
+sharing one lockstep `while True` loop:
+
+    sched = Scheduler()
+    sched.every("pressure", 40, read_pressure)     # 25 Hz
+    sched.every("pm", 1000, read_pm)               # 1 Hz
+    sched.every("co2", 5000, read_co2)             # every 5 s
+    sched.run()
+
+Tasks are plain callables. They must not block for long (they share the
+CPU cooperatively); when one runs late the missed periods are counted as
+overruns and skipped instead of being replayed in a burst.
+"""
+
+import time
+import uasyncio as asyncio
+
+
+class PeriodicTask:
+    """ A callable run every `period_ms` milliseconds, with timing statistics. """
+
+    def __init__(self, name, period_ms, func):
+        self.name = name
+        self.period_ms = period_ms
+        self.func = func
+        self.enabled = True
+        self.runs = 0
+        self.overruns = 0    # periods skipped because the task started too late
+        self.errors = 0
+        self.last_error = None
+        self.max_late_us = 0  # worst start delay versus the scheduled tick (jitter)
+        self.total_late_us = 0
+        self.max_run_us = 0
+        self._first_us = 0
+        self._last_us = 0
+
+    @property
+    def rate_hz(self):
+        """ Achieved call rate since the task started. """
+        if self.runs < 2:
+            return 0.0
+        span = time.ticks_diff(self._last_us, self._first_us)
+        return (self.runs - 1) * 1000000 / span if span > 0 else 0.0
+
+    @property
+    def mean_late_us(self):
+        return self.total_late_us // self.runs if self.runs else 0
+
+    def reset_stats(self):
+        self.runs = self.overruns = self.errors = 0
+        self.max_late_us = self.total_late_us = self.max_run_us = 0
+
+    async def run(self):
+        due = time.ticks_us()
+        while True:
+            # Sleep in whole milliseconds, then yield until the exact tick
+            wait = time.ticks_diff(due, time.ticks_us())
+            while wait > 0:
+                await asyncio.sleep_ms(wait // 1000)
+                wait = time.ticks_diff(due, time.ticks_us())
+
+            period_us = self.period_ms * 1000
+            start = time.ticks_us()
+            if self.enabled:
+                late = time.ticks_diff(start, due)
+                self.total_late_us += late
+                if late > self.max_late_us:
+                    self.max_late_us = late
+                if self.runs == 0:
+                    self._first_us = start
+                self._last_us = start
+                self.runs += 1
+                try:
+                    self.func()
+                except Exception as ex:
+                    self.errors += 1
+                    self.last_error = ex
+                run_us = time.ticks_diff(time.ticks_us(), start)
+                if run_us > self.max_run_us:
+                    self.max_run_us = run_us
+
+            due = time.ticks_add(due, period_us)
+            behind = time.ticks_diff(time.ticks_us(), due)
+            if behind >= 0:
+                # Already past the next slot: count and skip, don't burst
+                missed = behind // period_us + 1
+                if self.enabled:
+                    self.overruns += missed
+                due = time.ticks_add(due, missed * period_us)
+
+
+class Scheduler:
+    def __init__(self):
+        self.tasks = []
+        self._coros = []
+        self._running = []
+
+    def every(self, name, period_ms, func):
+        """ Register `func` to be called every `period_ms`. Returns the PeriodicTask. """
+        task = PeriodicTask(name, period_ms, func)
+        self.tasks.append(task)
+        return task
+
+    def spawn(self, coro):
+        """ Run a free-running coroutine (e.g. an async driver) alongside the periodic tasks. """
+        self._coros.append(coro)
+
+    def task(self, name):
+        for task in self.tasks:
+            if task.name == name:
+                return task
+        raise KeyError(name)
+
+    async def main(self, duration_ms=None):
+        for task in self.tasks:
+            self._running.append(asyncio.create_task(task.run()))
+        for coro in self._coros:
+            self._running.append(asyncio.create_task(coro))
+        self._coros = []
+        try:
+            if duration_ms is None:
+                while self._running:
+                    await asyncio.sleep_ms(1000)
+            else:
+                await asyncio.sleep_ms(duration_ms)
+        finally:
+            self.stop()
+
+    def run(self, duration_ms=None):
+        """ Run all tasks, forever or for `duration_ms`. """
+        asyncio.run(self.main(duration_ms))
+
+    def stop(self):
+        for running in self._running:
+            running.cancel()
+        self._running = []
+
+    def report(self):
+        print("task        rate_hz  runs  overruns  errors  late_avg_us  late_max_us  run_max_us")
+        for t in self.tasks:
+            print("{:10s} {:8.2f} {:5d} {:9d} {:7d} {:12d} {:12d} {:11d}".format(
+                t.name, t.rate_hz, t.runs, t.overruns, t.errors,
+                t.mean_late_us, t.max_late_us, t.max_run_us))
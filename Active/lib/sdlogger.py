@@ -0,0 +1,160 @@
+""" sdlogger.py - buffered, sector-aligned logger for the SD card
+
+Keeps one handle open and collects records in a preallocated buffer that is a
+whole number of 512-byte sectors. Data only goes to the card in whole sectors,
+so FatFs hands it straight to `SDCard.writeblocks` as one multi-block (CMD25)
+write instead of a read-modify-write of a single sector per line.
+
+    log = SDLogger("/sd/log.csv", sectors=8, flush_ms=1000, sync_ms=5000)
+    log.write(msg)   # appends msg + "\\n"
+    log.poll()       # from a periodic task: time based flush/sync
+    log.close()
+
+It can also log straight to a block device (no filesystem) from `start_block`:
+
+    log = SDLogger(blockdev=sd, start_block=2048)
+
+Sync policy (`sync_ms`): FAT metadata (file size, directory entry) is only
+committed by a sync. None syncs on close only, 0 syncs after every flush and
+a positive value syncs at most that often. Data written since the last sync
+can be lost on power failure.
+"""
+
+import time
+
+SECTOR_SIZE = 512
+
+
+class SDLogger:
+    def __init__(self, path=None, *, blockdev=None, start_block=0, sectors=8,
+                 flush_ms=1000, sync_ms=5000, mode="a"):
+        if (path is None) == (blockdev is None):
+            raise ValueError("Give either a path or a block device")
+        self.path = path
+        self.blockdev = blockdev
+        self.flush_ms = flush_ms
+        self.sync_ms = sync_ms
+
+        self._buf = bytearray(sectors * SECTOR_SIZE)
+        self._mv = memoryview(self._buf)
+        self._len = 0
+
+        if blockdev is None:
+            self._file = open(path, mode + "b")
+            # keep writes aligned to sectors relative to the start of the file
+            self._pos = self._file.seek(0, 2) if mode == "a" else 0
+        else:
+            self._file = None
+            self._pos = start_block * SECTOR_SIZE
+
+        now = time.ticks_ms()
+        self._last_flush = now
+        self._last_sync = now
+        self._dirty = False  # data written since the last sync
+
+        # statistics
+        self.lines = 0
+        self.bytes = 0
+        self.flushes = 0
+        self.syncs = 0
+        self.max_flush_us = 0
+
+    def write(self, record):
+        """ Append one record (str or bytes) followed by a newline. """
+        if isinstance(record, str):
+            record = record.encode()
+        n = len(record) + 1
+        if self._len + n > len(self._buf):
+            self.flush(partial=False)
+            if self._len + n > len(self._buf):
+                self.flush(partial=True)
+        if n > len(self._buf):
+            self._write_out(record)
+            self._write_out(b"\n")
+        else:
+            self._mv[self._len:self._len + n - 1] = record
+            self._buf[self._len + n - 1] = 0x0A
+            self._len += n
+        self.lines += 1
+        self.bytes += n
+        if self._len >= len(self._buf):
+            self.flush(partial=False)
+
+    def poll(self):
+        """ Flush and sync according to the time thresholds. Call it periodically. """
+        now = time.ticks_ms()
+        if self._len and time.ticks_diff(now, self._last_flush) >= self.flush_ms:
+            self.flush(partial=True)
+        if (self._dirty and self.sync_ms is not None
+                and time.ticks_diff(now, self._last_sync) >= self.sync_ms):
+            self.sync()
+
+    def flush(self, partial=True):
+        """ Write buffered data out. Only whole sectors unless `partial` is True. """
+        # Bytes missing to reach the next sector boundary on the card
+        head = -self._pos % SECTOR_SIZE
+        if self._len < head:
+            n = self._len if partial else 0
+        else:
+            n = head + (self._len - head) // SECTOR_SIZE * SECTOR_SIZE
+            if partial:
+                n = self._len
+        if n == 0:
+            return
+        start = time.ticks_us()
+        self._write_out(self._mv[:n])
+        self._mv[:self._len - n] = self._mv[n:self._len]
+        self._len -= n
+        elapsed = time.ticks_diff(time.ticks_us(), start)
+        if elapsed > self.max_flush_us:
+            self.max_flush_us = elapsed
+        self.flushes += 1
+        self._last_flush = time.ticks_ms()
+        if self.sync_ms == 0:
+            self.sync()
+
+    def _write_out(self, data):
+        if self._file is not None:
+            self._file.write(data)
+            self._pos += len(data)
+            self._dirty = True
+            return
+
+        # Raw block device: whole sectors go out in one writeblocks call
+        block, offset = divmod(self._pos, SECTOR_SIZE)
+        if offset:
+            # rewrite the partially filled sector, preceded by what it already holds
+            sector = bytearray(SECTOR_SIZE)
+            self.blockdev.readblocks(block, sector)
+            take = min(SECTOR_SIZE - offset, len(data))
+            sector[offset:offset + take] = data[:take]
+            self.blockdev.writeblocks(block, sector)
+            data = data[take:]
+            self._pos += take
+            block += 1
+        whole = len(data) // SECTOR_SIZE * SECTOR_SIZE
+        if whole:
+            self.blockdev.writeblocks(block, data[:whole])
+            self._pos += whole
+            block += whole // SECTOR_SIZE
+        if whole < len(data):
+            sector = bytearray(SECTOR_SIZE)
+            tail = len(data) - whole
+            sector[:tail] = data[whole:]
+            self.blockdev.writeblocks(block, sector)
+            self._pos += tail
+
+    def sync(self):
+        """ Commit written data and FAT metadata to the card. """
+        if self._file is not None:
+            self._file.flush()
+        self._dirty = False
+        self.syncs += 1
+        self._last_sync = time.ticks_ms()
+
+    def close(self):
+        self.flush(partial=True)
+        self.sync()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
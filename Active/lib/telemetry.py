@@ -0,0 +1,115 @@
+""" telemetry.py - compact binary telemetry frames for the RFM69 downlink
+
+A frame is one header byte followed by up to MAX_RECORDS fixed-layout records:
+
+    header  : (FRAME_VERSION << 4) | record count
+    record  : little-endian, RECORD_SIZE (19) bytes
+        H  time since start        0.1 s (wraps after 109 min)
+        H  pressure                2 Pa
+        h  altitude                0.1 m
+        h  BME280 temperature      0.01 degC
+        H  PM1.0 / PM2.5 / PM10    ug/m3 (3 x H)
+        H  CO2                     ppm
+        h  SCD41 temperature       0.01 degC
+        B  humidity                0.5 %RH
+
+Missing values (None) are sent as NO_DATA_U16 / NO_DATA_I16 / NO_DATA_U8.
+Values outside a field's range are sent as its nearest end (never as the
+NO_DATA value), so a sensor glitch cannot make pack_record() raise.
+Three records fit in the 60 bytes RFM69.send() accepts, against one ASCII line.
+The same module decodes frames on the ground station or on a PC.
+"""
+
+import ustruct as struct
+
+FRAME_VERSION = 1
+RECORD_FMT = "<HHhhHHHHhB"
+RECORD_SIZE = 19  # struct.calcsize(RECORD_FMT)
+MAX_PAYLOAD = 60  # RFM69.send() limit
+MAX_RECORDS = (MAX_PAYLOAD - 1) // RECORD_SIZE
+
+NO_DATA_U16 = 0xFFFF
+NO_DATA_I16 = -0x8000
+NO_DATA_U8 = 0xFF
+
+FIELDS = ("time_sec", "pressure_hpa", "altitude_m", "bmp280_temp",
+          "pm1", "pm25", "pm10", "co2_ppm", "scd41_temp", "humidity")
+
+
+def _clamp(value, low, high):
+    return low if value < low else high if value > high else value
+
+
+def _u16(value):
+    return NO_DATA_U16 if value is None else _clamp(int(value), 0, 0xFFFE)
+
+
+def _i16(value, scale):
+    return NO_DATA_I16 if value is None else _clamp(round(value * scale), -0x7FFF, 0x7FFF)
+
+
+def pack_record(buf, offset, time_sec, pressure, altitude, bmp_temp,
+                pm1, pm25, pm10, co2, scd41_temp, humidity):
+    """ Pack one sample into `buf` at `offset`. Units as logged: s, hPa, m, degC, ug/m3, ppm, %RH. """
+    struct.pack_into(RECORD_FMT, buf, offset,
+                     int(time_sec * 10) & 0xFFFF,
+                     _clamp(int(pressure * 50 + 0.5), 0, 0xFFFF),
+                     _i16(altitude, 10),
+                     _i16(bmp_temp, 100),
+                     _u16(pm1), _u16(pm25), _u16(pm10), _u16(co2),
+                     _i16(scd41_temp, 100),
+                     NO_DATA_U8 if humidity is None else _clamp(int(humidity * 2 + 0.5), 0, 0xFE))
+
+
+def unpack_record(buf, offset=0):
+    """ Inverse of pack_record(): a tuple in FIELDS order with None for missing values. """
+    t, p, alt, temp, pm1, pm25, pm10, co2, scd_t, hum = struct.unpack_from(RECORD_FMT, buf, offset)
+    return (t / 10, p / 50, alt / 10, temp / 100,
+            None if pm1 == NO_DATA_U16 else pm1,
+            None if pm25 == NO_DATA_U16 else pm25,
+            None if pm10 == NO_DATA_U16 else pm10,
+            None if co2 == NO_DATA_U16 else co2,
+            None if scd_t == NO_DATA_I16 else scd_t / 100,
+            None if hum == NO_DATA_U8 else hum / 2)
+
+
+class Frame:
+    """ A reusable frame buffer: add() records, then send frame.payload(). """
+
+    def __init__(self, max_records=MAX_RECORDS):
+        self.max_records = max_records
+        self.buf = bytearray(1 + max_records * RECORD_SIZE)
+        self._mv = memoryview(self.buf)
+        self.count = 0
+
+    def clear(self):
+        self.count = 0
+
+    @property
+    def full(self):
+        return self.count >= self.max_records
+
+    def add(self, *sample):
+        """ Append a sample (pack_record() arguments). Returns False if the frame is full. """
+        if self.count >= self.max_records:
+            return False
+        pack_record(self.buf, 1 + self.count * RECORD_SIZE, *sample)
+        self.count += 1
+        return True
+
+    def payload(self):
+        """ The encoded frame as a memoryview into the reusable buffer. """
+        self.buf[0] = (FRAME_VERSION << 4) | self.count
+        return self._mv[:1 + self.count * RECORD_SIZE]
+
+
+def decode(frame):
+    """ Decode a received frame into a list of record tuples (see FIELDS). """
+    if not frame:
+        raise ValueError("Empty frame")
+    version, count = frame[0] >> 4, frame[0] & 0x0F
+    if version != FRAME_VERSION:
+        raise ValueError("Unsupported frame version {}".format(version))
+    if len(frame) != 1 + count * RECORD_SIZE:
+        raise ValueError("Frame length {} does not match {} records".format(len(frame), count))
+    return [unpack_record(frame, 1 + i * RECORD_SIZE) for i in range(count)]
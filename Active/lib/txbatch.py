@@ -0,0 +1,107 @@
+""" txbatch.py - multi-sample packet batching on top of RFM69.send()
+
+Samples are packed into a telemetry.Frame and sent when the frame is full
+or when the oldest sample has waited `max_delay_ms`, so one send (one set of
+mode switches, one preamble) carries up to MAX_RECORDS samples.
+
+    batch = BatchSender(rfm, max_delay_ms=1500)
+    batch.add(time_s, pressure, altitude, ...)   # from the logging task
+    batch.poll()                                 # from the radio task
+
+With `queue` (a txqueue.TxQueue) frames are handed to the queue instead of
+being sent in place, so flushing never waits for the radio.
+"""
+
+import time
+from telemetry import MAX_RECORDS, Frame
+from txqueue import PRIO_BULK
+
+# On-air bytes added to the payload: length byte, RadioHead header, CRC
+_LENGTH_BYTES = 1
+_HEADER_BYTES = 4
+_CRC_BYTES = 2
+
+
+class BatchSender:
+    def __init__(self, rfm, max_delay_ms=1000, max_records=MAX_RECORDS, keep_listening=False,
+                 queue=None, priority=PRIO_BULK):
+        self.rfm = rfm
+        self.queue = queue
+        self.priority = priority
+        self.max_delay_ms = max_delay_ms
+        self.keep_listening = keep_listening
+        self.frame = Frame(max_records)
+        self._oldest = 0
+
+        # Radio settings used for the air time estimate, read once
+        self._bit_us = 1000000 / rfm.bitrate
+        self._overhead_bytes = (rfm.preamble_length + rfm.sync_size + 1
+                                + _LENGTH_BYTES + _HEADER_BYTES + _CRC_BYTES)
+
+        self._start = time.ticks_ms()
+        self.samples = 0    # samples handed to the radio
+        self.packets = 0
+        self.bytes = 0      # payload bytes of the packets
+        self.failures = 0   # sends that timed out (or were dropped by the queue)
+        self.airtime_us = 0
+        self.send_us = 0    # time spent inside RFM69.send() (or TxQueue.put())
+
+    def add(self, *sample):
+        """ Queue a sample (telemetry.pack_record() arguments); sends when the frame is full. """
+        if self.frame.count == 0:
+            self._oldest = time.ticks_ms()
+        self.frame.add(*sample)
+        if self.frame.full:
+            self.flush()
+
+    def poll(self):
+        """ Send a partial frame once its oldest sample is `max_delay_ms` old. """
+        if self.frame.count and time.ticks_diff(time.ticks_ms(), self._oldest) >= self.max_delay_ms:
+            self.flush()
+
+    def flush(self):
+        count = self.frame.count
+        if not count:
+            return True
+        payload = self.frame.payload()
+        start = time.ticks_us()
+        if self.queue is not None:
+            ok = self.queue.put(payload, self.priority)
+        else:
+            ok = self.rfm.send(payload, keep_listening=self.keep_listening)
+        self.send_us += time.ticks_diff(time.ticks_us(), start)
+        self.airtime_us += int((self._overhead_bytes + len(payload)) * 8 * self._bit_us)
+        self.packets += 1
+        self.bytes += len(payload)
+        if ok:
+            self.samples += count
+        else:
+            self.failures += 1
+        self.frame.clear()
+        return ok
+
+    @property
+    def elapsed_ms(self):
+        return time.ticks_diff(time.ticks_ms(), self._start)
+
+    @property
+    def samples_per_s(self):
+        """ Effective samples per second delivered to the air since start. """
+        elapsed = self.elapsed_ms
+        return self.samples * 1000 / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def airtime_utilisation(self):
+        """ Fraction of wall time the transmitter was on air. """
+        elapsed = self.elapsed_ms
+        return self.airtime_us / (elapsed * 1000) if elapsed > 0 else 0.0
+
+    def reset_stats(self):
+        self._start = time.ticks_ms()
+        self.samples = self.packets = self.bytes = self.failures = 0
+        self.airtime_us = self.send_us = 0
+
+    def report(self):
+        print("radio: {} samples in {} packets ({} failed), {:.2f} samples/s, air {:.2%}, send {} ms".format(
+            self.samples, self.packets, self.failures, self.samples_per_s,
+            self.airtime_utilisation, self.send_us // 1000))
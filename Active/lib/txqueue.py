@@ -0,0 +1,167 @@
+""" txqueue.py - non-blocking, prioritised transmit queue for RFM69
+
+put() copies a packet into a preallocated slot and returns at once; the
+radio is driven in the background, either by the `run()` coroutine under
+uasyncio (sleeps on DIO0 when the radio has it) or by calling `poll()`
+from a plain loop.
+
+    txq = TxQueue(rfm, slots=8)
+    txq.put(frame.payload(), PRIO_HIGH)   # altitude / state frame
+    txq.put(pm_frame, PRIO_BULK)          # bulk sensor data
+    asyncio.create_task(txq.run())
+
+Each priority has its own ring of `slots` buffers; higher priorities are
+always sent first. When a ring is full the oldest packet of that priority is
+dropped (or the new one, with drop_oldest=False) and counted in `dropped`.
+"""
+
+from array import array
+import time
+import uasyncio as asyncio
+
+PRIO_HIGH = 0
+PRIO_BULK = 1
+
+_MAX_PACKET = 60  # RFM69.send() limit
+
+
+class TxQueue:
+    def __init__(self, rfm, slots=8, priorities=2, drop_oldest=True, keep_listening=False):
+        self.rfm = rfm
+        self.slots = slots
+        self.priorities = priorities
+        self.drop_oldest = drop_oldest
+        self.keep_listening = keep_listening
+
+        n = slots * priorities
+        self._bufs = [bytearray(_MAX_PACKET) for _ in range(n)]
+        self._views = [memoryview(buf) for buf in self._bufs]
+        self._lens = bytearray(n)
+        self._stamps = array("I", bytes(4 * n))  # ticks_ms at put(), for latency
+        self._head = bytearray(priorities)        # next slot to send, per priority
+        self._count = bytearray(priorities)
+        self._ready = asyncio.Event()
+        self._busy = False       # poll(): a packet is on air
+        self._busy_prio = 0
+        self._busy_stamp = 0
+
+        # statistics, per priority
+        self.queued = [0] * priorities
+        self.sent = [0] * priorities
+        self.failed = [0] * priorities
+        self.dropped = [0] * priorities
+        self.max_latency_ms = [0] * priorities  # put() to end of transmission
+        self.high_water = 0
+        self.errors = 0          # exceptions raised by the radio
+        self.last_error = None
+
+    def __len__(self):
+        return sum(self._count)
+
+    def put(self, data, priority=PRIO_BULK):
+        """ Queue a packet (at most 60 bytes) without blocking. Returns False if it was dropped. """
+        n = len(data)
+        assert 0 < n <= _MAX_PACKET
+        count = self._count[priority]
+        base = priority * self.slots
+        if count == self.slots:
+            self.dropped[priority] += 1
+            if not self.drop_oldest:
+                return False
+            # overwrite the oldest packet of this priority
+            self._head[priority] = (self._head[priority] + 1) % self.slots
+            count -= 1
+        slot = base + (self._head[priority] + count) % self.slots
+        self._views[slot][:n] = data
+        self._lens[slot] = n
+        self._stamps[slot] = time.ticks_ms()
+        self._count[priority] = count + 1
+        self.queued[priority] += 1
+        depth = len(self)
+        if depth > self.high_water:
+            self.high_water = depth
+        self._ready.set()
+        return True
+
+    def _start_next(self):
+        """ Load the oldest packet of the highest non-empty priority into the radio. """
+        for prio in range(self.priorities):
+            if self._count[prio]:
+                slot = prio * self.slots + self._head[prio]
+                self._head[prio] = (self._head[prio] + 1) % self.slots
+                self._count[prio] -= 1
+                self._busy_prio = prio
+                self._busy_stamp = self._stamps[slot]
+                # The FIFO is loaded before this returns, the slot is free again
+                self.rfm.send_start(self._views[slot][:self._lens[slot]])
+                return True
+        return False
+
+    def _finished(self, ok):
+        prio = self._busy_prio
+        if ok:
+            self.sent[prio] += 1
+        else:
+            self.failed[prio] += 1
+        latency = time.ticks_diff(time.ticks_ms(), self._busy_stamp)
+        if latency > self.max_latency_ms[prio]:
+            self.max_latency_ms[prio] = latency
+
+    def poll(self):
+        """ Advance the transmitter from a plain loop. Never waits for the radio.
+            A radio error fails the packet on air, as in run(). """
+        try:
+            if self._busy:
+                done = self.rfm.send_done(self.keep_listening)
+                if done is None:
+                    return
+                self._finished(done)
+                self._busy = False
+            self._busy = self._start_next()
+        except Exception as ex:
+            self.errors += 1
+            self.last_error = ex
+            self._busy = False
+            self._finished(False)
+
+    def flush(self, timeout_ms=2000):
+        """ Send everything queued from a plain loop, e.g. at shutdown when
+            nothing polls any more. Returns False if packets were left after timeout_ms. """
+        start = time.ticks_ms()
+        while len(self) or self._busy:
+            if time.ticks_diff(time.ticks_ms(), start) >= timeout_ms:
+                return False
+            self.poll()
+        return True
+
+    async def run(self):
+        """ Drain the queue in the background under uasyncio. A radio error
+            (e.g. a mode change timeout) fails the packet on air, not the task. """
+        while True:
+            try:
+                if not self._start_next():
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                # send_start() already ran inside _start_next(); wait for PacketSent
+                ok = await self.rfm.wait_sent_async(self.keep_listening)
+            except Exception as ex:
+                self.errors += 1
+                self.last_error = ex
+                ok = False
+            self._busy = False
+            self._finished(ok)
+
+    def reset_stats(self):
+        for prio in range(self.priorities):
+            self.queued[prio] = self.sent[prio] = self.failed[prio] = 0
+            self.dropped[prio] = self.max_latency_ms[prio] = 0
+        self.high_water = self.errors = 0
+
+    def report(self):
+        for prio in range(self.priorities):
+            print("txq prio {}: queued {} sent {} failed {} dropped {} max latency {} ms".format(
+                prio, self.queued[prio], self.sent[prio], self.failed[prio],
+                self.dropped[prio], self.max_latency_ms[prio]))
+        if self.errors:
+            print("txq: {} radio errors, last: {}".format(self.errors, self.last_error))
@@ -1,10 +1,16 @@
+import machine
 from machine import SPI, I2C, Pin, ADC
-from pms5003 import PMS5003
+from pms5003 import PMS5003, PM1_0, PM2_5, PM10
 from rfm69 import RFM69
 from bme280 import BME280, BMP280_I2CADDR
 from scd4x_micro import SCD4x
 import time
 import sdcard
+from sdlogger import SDLogger
+from txbatch import BatchSender
+from txqueue import TxQueue
+from recordring import RecordRing
+from dualcore import Drain
 import os
 import uos
 
@@ -23,6 +29,12 @@ nss = Pin(5, Pin.OUT, value=True)
 rst = Pin(3, Pin.OUT, value=False)
 i2c = I2C(0, scl=Pin(9), sda=Pin(8)) # initialize the i2c bus on GP9 and GP8
 
+#Initialize I2C1 for SCD41 and start its bring-up first: it completes
+#in sensor.finish() below, after the other devices are set up
+i2c_scd41 = I2C(1, scl=Pin(15), sda=Pin(14), freq=100000)  # Adjust pins and I2C ID as needed
+sensor = SCD4x(i2c_scd41)
+sensor.begin()
+
 # RFM Module
 rfm = RFM69(spi=spi, nss=nss, reset=rst)
 rfm.tx_power = 15 # 13 dBm = 20mW (default value, safer for all modules) ; 20 # 20 dBm = 100mW
@@ -63,6 +75,9 @@ if sd and not file_exists(filename):
     with open(filename, "w") as f:
         f.write("count;time_sec;pressure_hpa;bmp280_temp;PM1.0_ug/m3;PM2.5_ug/m3;PM10_ug/m3;CO2_ppm;SCD41_temp;Humidity_%\n")
 
+# Keep the log file open; records are written to the card in whole sectors
+logger = SDLogger(filename, flush_ms=2000, sync_ms=10000) if sd else None
+
 
 # Initialise the PMS5003 for Enviro+
 pms5003 = PMS5003(
@@ -76,18 +91,70 @@ pms5003 = PMS5003(
 i2c_bme280 = I2C(0, scl=Pin(9), sda=Pin(8))  # Initialize the I2C bus on GP9 and GP8
 bmp = BME280(i2c=i2c_bme280, address=BMP280_I2CADDR)
 
-#Initialize I2C1 for SCD41
-i2c_scd41 = I2C(1, scl=Pin(15), sda=Pin(14), freq=100000)  # Adjust pins and I2C ID as needed
-sensor = SCD4x(i2c_scd41)
+
+# Sampling stays on core 0, it only puts records into the ring; a thread on
+# core 1 (dualcore.py) formats them, writes the SD card and drives the radio
+SAMPLE_PERIOD_MS = 250
+REPORT_EVERY = 120  # samples, 30 s
+ring = RecordRing(slots=64, fields=10)  # 16 s of samples: time_sec, pressure, altitude, ... humidity
+
+# Samples go out in binary frames, several per packet (txbatch.py),
+# through a queue drained without waiting for the radio (txqueue.py)
+txq = TxQueue(rfm, slots=8)
+batch = BatchSender(rfm, max_delay_ms=1000, queue=txq)
+
+
+def write_record(seq, record):
+    # Core 1: one sample to the console, the SD card and the radio
+    elapsed_time, pressure, altitude, bmp_temp, pm1, pm25, pm10, co2, scd41_temp, humidity = ring.values(record)
+
+    # Prepare the output message
+    msg = f"{seq + 1};{elapsed_time:.2f};{pressure:.2f};{bmp_temp:.2f};"
+    msg += f"{pm1:.0f};{pm25:.0f};{pm10:.0f}"
+
+    # Append SCD41 data if it is available
+    if co2 is not None and scd41_temp is not None and humidity is not None:
+        msg += f";{co2:.0f};{scd41_temp:.2f};{humidity:.2f}"
+    else:
+        msg += f"; ; ; "
+
+    print(msg)
+
+    # Write to SD Card
+    if logger:
+        logger.write(msg)
+
+    #send message RFM, batched; this build has no altitude
+    batch.add(elapsed_time, pressure, altitude, bmp_temp,
+              pm1, pm25, pm10,
+              co2, scd41_temp, humidity)
+
+
+def service_io():
+    # Core 1, while the ring is empty: time based SD flush/sync, radio
+    if logger:
+        logger.poll()
+    batch.poll()
+    txq.poll()
+    led.value(len(txq) > 0) # Led ON while data waits for the radio
+
+
+drain = Drain(ring, write_record, service_io)
+late = 0  # sampling periods started late
+
+
+def report():
+    print("core 0: {} samples, {} started late".format(ring.puts, late))
+    ring.report()
+    drain.report()
+    batch.report()
+    txq.report()
 
 
 # Perform initial setup
 try:
-    # Initialize sensor SCD41
-    sensor.initialize_sensor()
-    
-    # Start periodic measurement for SCD41
-    sensor.start_periodic_measurement()
+    # Finish the SCD41 bring-up (no self-test) and start periodic measurement
+    print("SCD41 serial number:", sensor.finish())
     
     #print relevant transmition data
     print( 'Frequency     :', rfm.frequency_mhz )
@@ -99,48 +166,65 @@ try:
     # Print header
     print("count;time_sec;pressure_hpa;bmp280_temp;PM1.0_ug/m3;PM2.5_ug/m3;PM10_ug/m3;CO2_ppm;SCD41_temp;Humidity_%")
     
+    # First PMS5003 frame, then only the newest one each loop (read_latest never waits)
+    data = pms5003.read()
+    co2 = None
+
     # Record the start time
-    ctime = time.time()
-    counter = 1
+    start_ms = time.ticks_ms()
+    due = start_ms
+    drain.start()
 
     while True:
         # Get the current time and calculate elapsed time
-        elapsed_time = time.time() - ctime
+        elapsed_time = time.ticks_diff(time.ticks_ms(), start_ms) / 1000.0
                 
-        # Read measurement data from BMP280 every 0.5 seconds
-        bmp_temp, pressure, _ = bmp.raw_values
+        # Start the BMP280 conversion; it runs while the SCD41 and PMS5003 are read
+        bmp.start_conversion()
         
-        # Read measurement data from SCD41 whenever it is ready
-        co2, scd41_temp, humidity = sensor.read_measurement()
+        # Read measurement data from SCD41 whenever it is ready, keeping the last values in between
+        if sensor.read_if_ready() and co2 is None:
+            print("SCD41: first sample {} ms after reset, {} ms after bring-up started".format(
+                time.ticks_ms(), sensor.first_sample_ms))
+        co2, scd41_temp, humidity = sensor.last or (None, None, None)
         
-        # Read measurement data from the PMS5003
-        data = pms5003.read()
-                
-        # Prepare the output message
-        msg = f"{counter};{elapsed_time:.2f};{pressure:.2f};{bmp_temp:.2f};"
-        msg += f"{data.pm_ug_per_m3(1)};{data.pm_ug_per_m3(2.5)};{data.pm_ug_per_m3(10)}"
+        # Read measurement data from the PMS5003, keeping the last values until a new frame
+        data = pms5003.read_latest() or data
+        pm1, pm25, pm10 = data.value(PM1_0), data.value(PM2_5), data.value(PM10)
         
-        # Append SCD41 data if it is available
-        if co2 is not None and scd41_temp is not None and humidity is not None:
-            msg += f";{co2};{scd41_temp:.2f};{humidity:.2f}"
+        # Collect the BMP280 conversion (waits only for what is left of it)
+        bmp_temp, pressure, _ = bmp.raw_values
+
+        # Hand the sample to core 1; never waits, drops the oldest when core 1 is behind
+        ring.put((elapsed_time, pressure, 0.0, bmp_temp, pm1, pm25, pm10, co2, scd41_temp, humidity))
+        if ring.puts % REPORT_EVERY == 0:
+            report()
+
+        # Wait for the next period (none of the I/O above is ours any more)
+        due = time.ticks_add(due, SAMPLE_PERIOD_MS)
+        wait = time.ticks_diff(due, time.ticks_ms())
+        if wait > 0:
+            time.sleep_ms(wait)
         else:
-            msg += f"; ; ; "
-        
-        counter += 1  # Increment counter
-        time.sleep(0.25)  # Wait before next reading
-        
-        print(msg)
-        
-        # Write to SD Card
-        if sd:
-            with open(filename, "a") as f:
-                f.write(msg + "\n")
-        
-        #send message RFM
-        led.on() # Led ON while sending data
-        rfm.send(bytes(msg , "utf-8"))
-        led.off()
+            late += 1
+            due = time.ticks_ms()
         
 finally:
-    # Ensure the sensor is set to IDLE mode when done
+    # Ensure the sensor is set to IDLE mode when done, whatever core 1 is doing
     sensor.stop_periodic_measurement()
+    # Core 1 writes out what is left in the ring and exits; the SD card and
+    # the radio are only used from here once it has
+    if drain.stop():
+        # The log first: a radio failure must not cost the last SD sector
+        if logger:
+            logger.close()
+        # Nothing polls the radio queue any more: send the last frames from here
+        try:
+            batch.flush()
+            if not txq.flush():
+                print("radio: {} packets left unsent".format(len(txq)))
+        except Exception as ex:
+            print("radio:", ex)
+    else:
+        print("core 1 still busy, log file not closed")
+    report()
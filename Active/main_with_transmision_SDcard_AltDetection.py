@@ -1,10 +1,23 @@
+import machine
 from machine import SPI, I2C, Pin, ADC
-from pms5003 import PMS5003
+from pms5003 import AsyncPMS5003, PM1_0, PM2_5, PM10, PMS5003_CMD_SLEEP
 from rfm69 import RFM69
-from bme280 import BME280, BMP280_I2CADDR
+from bme280 import BME280, BMP280_I2CADDR, BME280_COMPENSATION_INT32
+from pressurering import PressureRing
+from altfilter import AltitudeFilter, PHASE_NAMES
+from phasegov import PhaseGovernor
 from scd4x_micro import SCD4x
+from scd4xmode import SCD4xModePolicy
+from pmsduty import PMSDutyCycle
+from scheduler import Scheduler
+from txbatch import BatchSender
+from txqueue import TxQueue
+from recordring import RecordRing
+from dualcore import Drain
+from array import array
 import time
 import sdcard
+from sdlogger import SDLogger
 import os
 import uos
 
@@ -23,8 +36,14 @@ nss = Pin(5, Pin.OUT, value=True)
 rst = Pin(3, Pin.OUT, value=False)
 i2c = I2C(0, scl=Pin(9), sda=Pin(8)) # initialize the i2c bus on GP9 and GP8
 
+#Initialize I2C1 for SCD41 and start its bring-up first: it completes
+#in sensor.finish() below, after the other devices are set up
+i2c_scd41 = I2C(1, scl=Pin(15), sda=Pin(14), freq=100000)  # Adjust pins and I2C ID as needed
+sensor = SCD4x(i2c_scd41)
+sensor.begin()
+
 # RFM Module
-rfm = RFM69(spi=spi, nss=nss, reset=rst)
+rfm = RFM69(spi=spi, nss=nss, reset=rst) # add dio0=Pin(<G0 gpio>, Pin.IN) once G0 is wired: no SPI polling while sending
 rfm.tx_power = 15 # 13 dBm = 20mW (default value, safer for all modules) ; 20 # 20 dBm = 100mW
 rfm.frequency_mhz  = FREQ
 rfm.encryption_key = (ENCRYPTION_KEY)
@@ -63,9 +82,13 @@ if sd and not file_exists(filename):
     with open(filename, "w") as f:
         f.write("count;time_sec;pressure_hpa;altitude_m;bmp280_temp;PM1.0_ug/m3;PM2.5_ug/m3;PM10_ug/m3;CO2_ppm;SCD41_temp;Humidity_%\n")
 
+# Keep the log file open; records are written to the card in whole sectors
+logger = SDLogger(filename, flush_ms=2000, sync_ms=10000) if sd else None
 
-# Initialise the PMS5003 for Enviro+
-pms5003 = PMS5003(
+
+# Initialise the PMS5003 for Enviro+ (reset by start_pm, then asleep between
+# measurements, see pm_duty and read_pm)
+pms5003 = AsyncPMS5003(
     uart=machine.UART(0, tx=machine.Pin(16), rx=machine.Pin(17), baudrate=9600),
     pin_enable=machine.Pin(19),
     pin_reset=machine.Pin(18),
@@ -75,12 +98,12 @@ pms5003 = PMS5003(
 
 # Initialize I2C0 for BME280
 i2c_bme280 = I2C(0, scl=Pin(9), sda=Pin(8))  # Initialize the I2C bus on GP9 and GP8
-bmp = BME280(i2c=i2c_bme280, address=BMP280_I2CADDR)
-
-
-#Initialize I2C1 for SCD41
-i2c_scd41 = I2C(1, scl=Pin(15), sda=Pin(14), freq=100000)  # Adjust pins and I2C ID as needed
-sensor = SCD4x(i2c_scd41)
+# 32-bit compensation: 1 Pa resolution without long ints, read 25 times a second
+bmp = BME280(i2c=i2c_bme280, address=BMP280_I2CADDR, compensation=BME280_COMPENSATION_INT32)
+# Sampled by a hardware timer into a ring (normal mode, one burst read per sample)
+# at the rate of the flight phase, see gov below
+ring = PressureRing(bmp, size=128)  # 1.3 s of samples at 100 Hz
+bmp_result = array("i", [0, 0, 0])
 
 
 # Initialize Buzzer
@@ -88,18 +111,233 @@ buzzer = Pin(27, Pin.OUT)  # Buzzer on GP27
 
 # Starting pressure for altitude calculation (from BMP280 sensor)
 sea_level_pressure = 1013.25  # Standard pressure at sea level (in hPa)
-start_altitude = None
 altitude_above_200m = False  # Flag to track if altitude exceeded 200m
+# Filtered altitude, vertical speed and flight phase from every pressure sample
+alt = AltitudeFilter(sea_level_pa=int(sea_level_pressure * 100))
+flight_phase = alt.phase
+# Pressure, CO2, PM, logging, SD sync and radio rates per flight phase (phasegov.py)
+gov = PhaseGovernor(phase=flight_phase)
+
+# Task periods in ms: every driver runs at its own rate
+PRESSURE_PERIOD_MS = 100   # altitude from every ring sample since the last run
+CO2_PERIOD_MS      = 250   # SCD41 delivers every 5 s or less often; poll() skips the bus until then
+PM_PERIOD_MS       = 100   # PMS5003 duty cycle steps
+REPORT_PERIOD_MS   = 30000
+# The logging and radio periods follow the flight phase: gov.value("log_ms"), gov.value("radio_ms")
+
+# Core 0 runs the sensor tasks and puts one record per logging period into
+# `records`; a thread on core 1 (dualcore.py) prints and logs them and drives
+# the radio, so SD card writes and radio sends never delay the sampling
+records = RecordRing(slots=64, fields=10)  # time_sec, pressure, altitude, ... humidity
+
+# Latest value of every channel, updated by the sensor tasks
+pressure = altitude = bmp_temp = 0.0
+pressure_seq = 0  # next ring sample to process
+pm1 = pm25 = pm10 = None
+co2 = scd41_temp = humidity = None
+
+# Core 1 state: only the governor's setters write it from core 0
+beacon = False  # landed: the radio sends only the newest sample, see service_io
+radio_period_ms = gov.value("radio_ms")
+next_radio_ms = 0
+last_record = None
+
+# Every logged sample goes to the radio, several per packet (txbatch.py),
+# through a queue polled from core 1 (txqueue.py)
+txq = TxQueue(rfm, slots=8)
+batch = BatchSender(rfm, max_delay_ms=1500, queue=txq)
+
+# SCD41 periodic, low power or single shot measurement, whichever meets the
+# phase's CO2 interval cheapest
+co2_mode = SCD4xModePolicy(sensor, interval_ms=gov.value("co2_ms"))
+
+# PMS5003 woken for a few passive reads per cycle, as often as the phase needs
+pm_duty = PMSDutyCycle(pms5003, phase=gov.value("pms"))
+
+
+def read_pressure():
+    global pressure_seq, bmp_temp
+    for seq, stamp, raw_temp, raw_press in ring.iterate(pressure_seq):
+        pressure_seq = seq + 1
+        temp, pressure_q8, _ = bmp.compensate(raw_temp, raw_press, None, bmp_result)
+        bmp_temp = temp / 100
+        pressure_pa = pressure_q8 // 256
+        update_altitude(pressure_pa, alt.update_pressure(pressure_pa, stamp))
+
+
+def update_altitude(pressure_pa, phase):
+    global pressure, altitude, altitude_above_200m, flight_phase
+    pressure = pressure_pa / 100
+    altitude = alt.altitude_mm / 1000
+    if phase != flight_phase:
+        flight_phase = phase
+        gov.set_phase(phase)
+        print("Flight phase: {} at {:.1f} m, {:.1f} m/s".format(
+            PHASE_NAMES[phase], altitude, alt.speed_mm_s / 1000))
+
+    # Check if the altitude has exceeded 200m above the pad (don't buzz until back near the ground)
+    if alt.agl_mm > 200000:
+        altitude_above_200m = True
+
+    # Only activate buzzer when altitude is back near the ground (below 50 meters above the pad)
+    if altitude_above_200m and alt.agl_mm < 50000:
+        buzzer.on()  # Activate buzzer when near the ground
+    else:
+        buzzer.off()  # Deactivate buzzer when not in range
+
+
+async def start_pm():
+    # The sensor boots for up to MAX_RESET_TIME after a reset: await it so the
+    # other tasks keep their rate, then hand it to the duty cycle
+    try:
+        await pms5003.reset()
+    except (RuntimeError, OSError) as ex:
+        print("PMS5003:", ex)
+    pms5003.send_command(PMS5003_CMD_SLEEP)  # the reset woke it, pm_duty wakes it when due
+    sched.task("pm").enabled = True
+
+
+def read_pm():
+    global pm1, pm25, pm10
+    # Never blocks: wakes, reads and puts the sensor back to sleep in steps.
+    # The values are the average of the last cycle until the next one ends.
+    try:
+        data = pm_duty.poll()
+    except (RuntimeError, OSError) as ex:
+        print("PMS5003:", ex)
+        pm1 = pm25 = pm10 = None
+        return
+    if data is not None:
+        pm1, pm25, pm10 = data.value(PM1_0), data.value(PM2_5), data.value(PM10)
+
+
+def read_co2():
+    global co2, scd41_temp, humidity
+    new = co2_mode.poll()
+    if new is not None:
+        if co2 is None:
+            print("SCD41: first sample {} ms after reset, {} ms after bring-up started".format(
+                time.ticks_ms(), sensor.first_sample_ms))
+        co2, scd41_temp, humidity = new
+
+
+def log_sample():
+    # Core 0: hand the latest values to core 1, never waits
+    elapsed_s = time.ticks_diff(time.ticks_ms(), start_time_ms) / 1000.0
+    records.put((elapsed_s, pressure, altitude, bmp_temp, pm1, pm25, pm10, co2, scd41_temp, humidity))
+
+
+def count_or_none(value):
+    return "None" if value is None else "{:.0f}".format(value)
+
+
+def write_record(seq, record):
+    # Core 1: one sample to the console, the SD card and the radio
+    global last_record
+    last_record = values = records.values(record)
+    elapsed_s, pressure, altitude, bmp_temp, pm1, pm25, pm10, co2, scd41_temp, humidity = values
+
+    # Prepare the output message
+    msg = f"{seq + 1};{elapsed_s:.2f};{pressure:.2f};{altitude:.2f};{bmp_temp:.2f};"
+    msg += f"{count_or_none(pm1)};{count_or_none(pm25)};{count_or_none(pm10)}"
+
+    # Append SCD41 data if it is available
+    if co2 is not None:
+        msg += f";{co2:.0f};{scd41_temp:.2f};{humidity:.2f}"
+    else:
+        msg += f"; ; ; "
+
+    print(msg)
 
+    if not beacon:
+        batch.add(*values)
+
+    if logger:
+        logger.write(msg)
+
+
+def service_io():
+    # Core 1, while no record waits: SD flush/sync and the radio
+    global next_radio_ms
+    if logger:
+        logger.poll()
+    now = time.ticks_ms()
+    if time.ticks_diff(now, next_radio_ms) >= 0:
+        next_radio_ms = time.ticks_add(now, radio_period_ms)
+        if beacon:
+            # Landed: one packet with the newest sample per radio period
+            # (with whatever was logged before the switch still pending)
+            if last_record is not None:
+                batch.add(*last_record)
+                batch.flush()
+        else:
+            # Queues the pending samples once the oldest one is max_delay_ms old
+            # (full frames were already queued from write_record)
+            batch.poll()
+    txq.poll()
+    led.value(len(txq) > 0) # Led ON while data waits for the radio
+
+
+drain = Drain(records, write_record, service_io)
+
+
+def report():
+    sched.report()
+    records.report()
+    drain.report()
+    batch.report()
+    txq.report()
+    sensor.report()
+    co2_mode.report()
+    pm_duty.report()
+    ring.report()
+    gov.report()
+
+
+sched = Scheduler()
+sched.every("pressure", PRESSURE_PERIOD_MS, read_pressure)
+sched.every("co2", CO2_PERIOD_MS, read_co2)
+sched.every("pm", PM_PERIOD_MS, read_pm).enabled = False  # until start_pm has reset the sensor
+sched.every("sd", gov.value("log_ms"), log_sample)
+sched.every("report", REPORT_PERIOD_MS, report)
+sched.spawn(start_pm())
+
+
+# Flight phase changes reconfigure the subsystems through these. They run
+# on core 0: for core 1 they only set values, the SD card and radio are not touched
+def set_log_period(period_ms):
+    sched.task("sd").period_ms = period_ms
+
+
+def set_radio_period(period_ms):
+    global radio_period_ms
+    radio_period_ms = period_ms
+    batch.max_delay_ms = period_ms * 3 // 2
+
+
+def set_sync(sync_ms):
+    if logger:
+        logger.sync_ms = sync_ms
+
+
+def set_beacon(on):
+    global beacon
+    beacon = on
+
+
+gov.bind("pressure_hz", ring.set_rate)
+gov.bind("log_ms", set_log_period)
+gov.bind("sync_ms", set_sync)
+gov.bind("radio_ms", set_radio_period)
+gov.bind("beacon", set_beacon)
+gov.bind("co2_ms", co2_mode.set_interval)
+gov.bind("pms", pm_duty.set_phase)
 
 
 # Perform initial setup
 try:
-    # Initialize sensor SCD41
-    sensor.initialize_sensor()
-    
-    # Start periodic measurement for SCD41
-    sensor.start_periodic_measurement()
+    # Finish the SCD41 bring-up (no self-test) and start periodic measurement
+    print("SCD41 serial number:", sensor.finish())
     
     #print relevant transmition data
     print( 'Frequency     :', rfm.frequency_mhz )
@@ -113,69 +351,30 @@ try:
     
     # Record the start time
     start_time_ms = time.ticks_ms()
-    counter = 1
-
-    while True:
-        # Get the current time and calculate elapsed time
-        elapsed_time_ms = time.ticks_ms() - start_time_ms
-                
-        # Read measurement data from BMP280 every 0.5 seconds
-        bmp_temp, pressure, _ = bmp.raw_values
-        
-        
-        
-        # If starting altitude is None, calculate it from initial pressure
-        if start_altitude is None:
-            start_altitude = 44330 * (1 - (pressure / sea_level_pressure) ** 0.1903)
+    batch.reset_stats()
+    txq.reset_stats()
+    sensor.reset_stats()
 
-        # Calculate the current altitude based on pressure
-        altitude = 44330 * (1 - (pressure / sea_level_pressure) ** 0.1903)
-        
-        # Check if the altitude has exceeded 200m (don't buzz until back near the ground)
-        if altitude > start_altitude + 200:
-            altitude_above_200m = True
-
-        # Only activate buzzer when altitude is back near the ground (below 10 meters from start altitude)
-        if altitude_above_200m and altitude < start_altitude + 50:
-            buzzer.on()  # Activate buzzer when near the ground
-        else:
-            buzzer.off()  # Deactivate buzzer when not in range
-        
-        
-        
-        # Read measurement data from SCD41 whenever it is ready
-        co2, scd41_temp, humidity = sensor.read_measurement()
-        
-        # Read measurement data from the PMS5003
-        data = pms5003.read()
-                
-        # Prepare the output message
-        msg = f"{counter};{elapsed_time_ms/1000.0:.2f};{pressure:.2f};{altitude:.2f};{bmp_temp:.2f};"
-        msg += f"{data.pm_ug_per_m3(1)};{data.pm_ug_per_m3(2.5)};{data.pm_ug_per_m3(10)}"
-        
-        # Append SCD41 data if it is available
-        if co2 is not None and scd41_temp is not None and humidity is not None:
-            msg += f";{co2};{scd41_temp:.2f};{humidity:.2f}"
-        else:
-            msg += f"; ; ; "
-        
-        counter += 1  # Increment counter
-        time.sleep(0.10)  # Wait before next reading
-        
-        print(msg)
-        
-        # Write to SD Card every 0.5 seconds
-        if sd:
-            with open(filename, "a") as f:
-                f.write(msg + "\n")
-        
-        #send message via RFM69 every second
-        if counter% 2 == 0:
-            led.on() # Led ON while sending data
-            rfm.send(bytes(msg , "utf-8"))
-            led.off()
+    ring.start()
+    drain.start()
+    sched.run()
         
 finally:
-    # Ensure the sensor is set to IDLE mode when done
+    ring.stop()
+    # Ensure the sensor is set to IDLE mode when done, whatever core 1 is doing
     sensor.stop_periodic_measurement()
-
+    # Core 1 writes out what is left in the ring and exits; the SD card and
+    # the radio are only used from here once it has
+    if drain.stop():
+        # The log first: a radio failure must not cost the last SD sector
+        if logger:
+            logger.close()
+        # Nothing polls the radio queue any more: send the last frames from here
+        try:
+            batch.flush()
+            if not txq.flush():
+                print("radio: {} packets left unsent".format(len(txq)))
+        except Exception as ex:
+            print("radio:", ex)
+    else:
+        print("core 1 still busy, log file not closed")
@@ -0,0 +1,74 @@
+""" bench_altitude.py - altitude.AltitudeTable against the barometric formula: error and time
+
+Walks the table's pressure range (and a little past both ends) in 1 Pa
+steps and compares the interpolated altitude with pressure_to_mm(), for
+the default sea level pressure and a low and a high one. The worst error
+must stay under MAX_ERROR_MM. Then times a lookup from whole Pa and from
+read_compensated_data()'s Pa * 256 against the formula, and checks a table
+rebuilt from tobytes() (the frozen path) gives the same altitudes.
+
+On CPython the formula is one C pow() and about as fast as the lookup. On
+the device it is a software float pow() (no FPU on the RP2040) and four
+float results, each a heap object there; the lookup creates none.
+
+    python host/bench_altitude.py [samples]
+"""
+
+import sys
+import time
+
+import upy  # noqa: F401
+from altitude import AltitudeTable, pressure_to_mm, P_MIN_PA, P_MAX_PA, SEA_LEVEL_PA
+
+MAX_ERROR_MM = 50
+MARGIN_PA = 2000    # checked past each end of the table, on the extended end segments
+
+
+def worst_error(table, p_min, p_max):
+    worst = (0, None)
+    for pa in range(p_min, p_max + 1):
+        error = abs(table.mm_from_pa(pa) - pressure_to_mm(pa, table.sea_level_pa))
+        if error > worst[0]:
+            worst = (error, pa)
+    return worst
+
+
+def per_call_us(func, args):
+    start = time.perf_counter()
+    for arg in args:
+        func(arg)
+    return (time.perf_counter() - start) / len(args) * 1e6
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    for sea_level_pa in (SEA_LEVEL_PA, 98000, 104000):
+        start = time.perf_counter()
+        table = AltitudeTable(sea_level_pa)
+        build_ms = (time.perf_counter() - start) * 1000
+        error, pa = worst_error(table, P_MIN_PA, P_MAX_PA)
+        outside, outside_pa = worst_error(table, P_MIN_PA - MARGIN_PA, P_MAX_PA + MARGIN_PA)
+        print("sea level {:6d} Pa: {} entries ({} bytes), built in {:.1f} ms, max error {} mm at {} Pa, "
+              "{} mm at {} Pa within {} Pa outside the range".format(
+                  sea_level_pa, len(table.table), len(table.tobytes()), build_ms, error, pa,
+                  outside, outside_pa, MARGIN_PA))
+        assert error <= MAX_ERROR_MM, (sea_level_pa, error, pa)
+
+    table = AltitudeTable()
+    frozen = AltitudeTable(table=table.tobytes())
+    assert all(frozen.mm_from_pa(pa) == table.mm_from_pa(pa) for pa in range(P_MIN_PA, P_MAX_PA, 7))
+    print("frozen table from tobytes(): same altitudes")
+
+    span = P_MAX_PA - P_MIN_PA
+    pressures = [P_MIN_PA + (i * 7919) % span for i in range(samples)]
+    pressures_q8 = [pa * 256 + (i & 255) for i, pa in enumerate(pressures)]
+    formula_us = per_call_us(pressure_to_mm, pressures)
+    pa_us = per_call_us(table.mm_from_pa, pressures)
+    q8_us = per_call_us(table.mm, pressures_q8)
+    print("per call (CPython): formula {:.3f} us, table from Pa {:.3f} us ({:.2f}x), "
+          "from Pa * 256 {:.3f} us ({:.2f}x)".format(
+              formula_us, pa_us, formula_us / pa_us, q8_us, formula_us / q8_us))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+""" bench_bme280.py - BME280 read cost per loop iteration: blocking, split forced, normal mode
+
+Runs a loop against FakeBME280 on a simulated clock. Every iteration reads
+the BME280 and spends `other_ms` on other I/O (SCD41 read, radio, SD flush),
+then waits for the next period. The fake takes the driver's maximum
+conversion time for a forced conversion and counts reads made before it is
+done. Compared:
+
+  blocking     raw_values: start a conversion, sleep it out, read
+  split        start_conversion(), the other I/O, then raw_values
+  normal       set_normal_mode() once, then raw_values is one burst read
+
+    python host/bench_bme280.py [iterations] [other_ms] [period_ms]
+"""
+
+import sys
+import time
+
+import upy  # noqa: F401
+import machine
+from bench_scd41 import SimClock
+from fakes import FakeBME280
+
+from bme280 import BME280, BMP280_I2CADDR, BME280_STANDBY_20
+
+
+def run(flow, iterations, other_ms, period_ms):
+    clock = SimClock()
+    saved = time.ticks_ms, time.ticks_us, time.sleep_ms, time.sleep_us
+    time.ticks_ms, time.ticks_us, time.sleep_ms = clock.ticks_ms, clock.ticks_us, clock.sleep_ms
+    time.sleep_us = lambda us: clock.sleep_ms(us / 1000)
+    try:
+        i2c = machine.I2C(0)
+        fake = i2c.attach(BMP280_I2CADDR, FakeBME280(pressure=lambda t: 101325 - 10 * t,
+                                                     clock=clock.seconds))
+        bmp = BME280(i2c=i2c, address=BMP280_I2CADDR)
+        fake.measure_s = bmp.measure_us / 1e6
+        if flow == "normal":
+            bmp.set_normal_mode(standby=BME280_STANDBY_20)
+        i2c.transactions = 0
+        driver = []
+        loop = []
+        for _ in range(iterations):
+            start = clock.ms
+            spent = 0.0
+            if flow == "split":
+                bmp.start_conversion()
+                spent += clock.ms - start
+            clock.ms += other_ms
+            before = clock.ms
+            bmp.raw_values
+            spent += clock.ms - before
+            driver.append(spent)
+            loop.append(clock.ms - start)
+            clock.ms = max(clock.ms, start + period_ms)
+    finally:
+        time.ticks_ms, time.ticks_us, time.sleep_ms, time.sleep_us = saved
+    print("{:9s} in driver mean {:5.2f} ms max {:5.2f} ms, loop work {:5.2f} ms, "
+          "{:.1f} I2C transactions/read, {} early reads".format(
+              flow, sum(driver) / iterations, max(driver), sum(loop) / iterations,
+              i2c.transactions / iterations, fake.early_reads))
+    return sum(loop) / iterations, fake.early_reads
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    other_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    period_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 40
+    print("{} iterations, {} ms of other I/O, loop every {} ms".format(iterations, other_ms, period_ms))
+    base, _ = run("blocking", iterations, other_ms, period_ms)
+    for flow in ("split", "normal"):
+        work, early = run(flow, iterations, other_ms, period_ms)
+        print("  {:.2f} ms saved per iteration".format(base - work))
+        assert early == 0, early
+
+
+if __name__ == "__main__":
+    main()
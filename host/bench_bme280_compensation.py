@@ -0,0 +1,156 @@
+""" bench_bme280_compensation.py - BME280 pressure compensation variants: agreement, time, long ints
+
+Golden vectors first: the worked example of the Bosch BMP280 datasheet
+(same calibration format and formulas as the BME280), which every variant
+must reproduce. Then the 32-bit and float variants are compared with the
+64-bit one over a grid of temperatures and pressures, and timed per sample.
+
+Allocation: on a 32-bit MicroPython port an int outside -2**30 .. 2**30-1
+is a heap-allocated long int, and (on the RP2040 port) every float result
+is a heap object too. The compensation is run once more on int and float
+subclasses that count such results. The float subclass also rounds every
+result to single precision, the float type of the RP2040 port, to give the
+deviation on the device.
+
+    python host/bench_bme280_compensation.py [samples]
+"""
+
+import struct
+import sys
+import time
+
+import upy  # noqa: F401
+import machine
+from fakes import FakeBME280, BME280_CALIB, bme280_pressure, bme280_t_fine
+
+from bme280 import (BME280, BME280_COMPENSATION_INT64, BME280_COMPENSATION_INT32,
+                    BME280_COMPENSATION_FLOAT)
+
+NAMES = {BME280_COMPENSATION_INT64: "int64", BME280_COMPENSATION_INT32: "int32",
+         BME280_COMPENSATION_FLOAT: "float"}
+# Most a variant may differ from the 64-bit result (Pa)
+TOLERANCE_PA = {BME280_COMPENSATION_INT64: 0, BME280_COMPENSATION_INT32: 8,
+                BME280_COMPENSATION_FLOAT: 0.01}
+# ... and from the datasheet example (Pa * 256 truncates)
+GOLDEN_TOLERANCE_PA = {BME280_COMPENSATION_INT64: 0.02, BME280_COMPENSATION_INT32: 8,
+                       BME280_COMPENSATION_FLOAT: 0.02}
+
+# BMP280 datasheet, section 3.12: raw readings and the expected results
+ADC_T, ADC_P = 519888, 415148
+T_FINE, TEMPERATURE = 128422, 2508         # degC * 100
+PRESSURE = 100653.27                       # Pa, double precision formula
+
+SMALL_INT = 1 << 30
+counts = {"long": 0, "float": 0}
+
+
+class Counted(int):
+    """ An int counting results that would be long ints on a 32-bit port. """
+
+    def _wrap(self, value):
+        if isinstance(value, float):
+            counts["float"] += 1
+            return CountedFloat(value)
+        if not -SMALL_INT <= value < SMALL_INT:
+            counts["long"] += 1
+        return Counted(value)
+
+
+def single(value):
+    return struct.unpack("f", struct.pack("f", value))[0]
+
+
+class CountedFloat(float):
+    """ A single precision float counting results. """
+
+    def __new__(cls, value):
+        return super().__new__(cls, single(value))
+
+    def _wrap(self, value):
+        counts["float"] += 1
+        return CountedFloat(value)
+
+
+def _counting(name):
+    def op(self, *args):
+        result = getattr(super(type(self), self), name)(*args)
+        if result is NotImplemented:
+            result = getattr(float(self), name)(*args)  # int with float
+        return self._wrap(result)
+    return op
+
+
+for _cls in (Counted, CountedFloat):
+    for _name in ("__add__", "__radd__", "__sub__", "__rsub__", "__mul__", "__rmul__",
+                  "__truediv__", "__rtruediv__", "__floordiv__", "__rfloordiv__",
+                  "__mod__", "__neg__"):
+        setattr(_cls, _name, _counting(_name))
+for _name in ("__lshift__", "__rlshift__", "__rshift__", "__rrshift__", "__and__", "__rand__"):
+    setattr(Counted, _name, _counting(_name))
+
+
+def make(compensation):
+    i2c = machine.I2C(0)
+    i2c.attach(0x77, FakeBME280())
+    return BME280(i2c=i2c, address=0x77, compensation=compensation)
+
+
+def check_golden(bmp):
+    assert bme280_t_fine(BME280_CALIB, ADC_T) == T_FINE
+    assert abs(bme280_pressure(BME280_CALIB, T_FINE, ADC_P) / 256 - PRESSURE) <= 0.02
+
+    def collect_into(result):
+        result[0], result[1], result[2] = ADC_T, ADC_P, 0x6000
+        return result
+
+    bmp.collect_into = collect_into
+    t, p, _ = bmp.read_compensated_data()
+    assert bmp.t_fine == T_FINE and t == TEMPERATURE, (bmp.t_fine, t)
+    assert abs(p / 256 - PRESSURE) <= GOLDEN_TOLERANCE_PA[bmp.compensation], p / 256
+    return p / 256
+
+
+def grid():
+    for t_fine in range(60000, 200001, 10000):            # about -7 to 78 degC
+        for raw_press in range(250000, 600001, 5000):     # about 30 to 110 kPa at 25 degC
+            yield t_fine, raw_press
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    reference = make(BME280_COMPENSATION_INT64)
+    points = list(grid())
+    expected = [reference._pressure(t_fine, raw) / 256 for t_fine, raw in points]
+    print("golden vectors: t_fine {}, T {} degC * 100, p {} Pa".format(T_FINE, TEMPERATURE, PRESSURE))
+    base_us = None
+    for compensation in (BME280_COMPENSATION_INT64, BME280_COMPENSATION_INT32, BME280_COMPENSATION_FLOAT):
+        bmp = make(compensation)
+        bmp.compensation = compensation
+        golden = check_golden(bmp)
+
+        worst = max(abs(bmp._pressure(t_fine, raw) / 256 - p) for (t_fine, raw), p in zip(points, expected))
+        assert worst <= TOLERANCE_PA[compensation], (NAMES[compensation], worst)
+
+        pressure = bmp._pressure
+        start = time.perf_counter()
+        for i in range(samples):
+            pressure(T_FINE, ADC_P + (i & 1023))
+        us = (time.perf_counter() - start) / samples * 1e6
+        base_us = base_us or us
+
+        for name in ("dig_P1", "dig_P2", "dig_P3", "dig_P4", "dig_P5", "dig_P6", "dig_P7",
+                     "dig_P8", "dig_P9"):
+            setattr(bmp, name, Counted(getattr(bmp, name)))
+        bmp._pressure_coeffs = tuple(CountedFloat(c) for c in bmp._pressure_coeffs)
+        counts["long"] = counts["float"] = 0
+        worst_single = max(abs(int(bmp._pressure(Counted(t_fine), Counted(raw))) / 256 - p)
+                           for (t_fine, raw), p in zip(points, expected))
+        print("{:6s} example {:9.2f} Pa, max deviation {:6.3f} Pa ({:6.3f} Pa in single precision), "
+              "{:5.2f} us/sample ({:.2f}x int64, CPython), per sample {:4.1f} long ints {:4.1f} floats".format(
+                  NAMES[compensation], golden, worst, worst_single, us, us / base_us,
+                  counts["long"] / len(points), counts["float"] / len(points)))
+    print("{} grid points checked, datasheet example reproduced by every variant within tolerance".format(len(points)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+""" bench_dualcore.py - sampling rate with the SD card and radio on the same core or on core 1
+
+Sampling loop of the SD card firmware at `period_ms` (sensor reads cost
+`sensor_ms`, the SCD41 is the real driver on FakeSCD41) against the I/O it
+feeds: SDLogger straight on a FakeBlockDevice that stalls `stall_ms` on
+every other write (an SD card busy with its own housekeeping) and
+BatchSender through TxQueue on the RFM69 driver and FakeRFM69, over a
+50 kbaud SPI.
+
+  * one core: the loop formats, logs and polls the radio itself
+  * two cores: the loop only puts records into a RecordRing, a Drain
+    thread does the rest (with a 64 slot ring and with an 8 slot one)
+
+CPython's own _thread has the calls the firmware uses (allocate_lock,
+start_new_thread), so recordring.py and dualcore.py run unchanged on a
+thread here. The GIL lets one thread run at a time, but the waits for
+the card and the radio are where the time goes. Reports the achieved
+rate, periods started late, the longest period and, with two cores, the
+ring's backpressure counters. Every run ends like the firmware: SCD41
+stopped first, then the ring drained to the card; the bench checks the
+sensor is idle and every record not dropped reached the log and the air.
+
+    python host/bench_dualcore.py [seconds] [period_ms] [stall_ms] [sensor_ms]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import upy  # noqa: F401
+import machine
+from fakes import FakeBlockDevice, FakeRFM69, FakeSCD41
+
+from dualcore import Drain
+from recordring import RecordRing
+from rfm69 import RFM69
+from scd4x_micro import SCD4x
+from sdlogger import SDLogger
+from txbatch import BatchSender
+from txqueue import TxQueue
+
+SPI_BAUDRATE = 50000
+STALL_EVERY = 2
+
+
+class BusyCard(FakeBlockDevice):
+    """ FakeBlockDevice that stalls `stall_ms` on every STALL_EVERY-th write. """
+
+    def __init__(self, path, stall_ms):
+        super().__init__(path)
+        self.stall_ms = stall_ms
+        self.writes = 0
+
+    def writeblocks(self, block_num, buf):
+        self.writes += 1
+        if self.writes % STALL_EVERY == 0:
+            time.sleep(self.stall_ms / 1000)
+        super().writeblocks(block_num, buf)
+
+
+class Rig:
+    """ The firmware's devices and core 1 work, one set per run. """
+
+    def __init__(self, tmp, stall_ms):
+        i2c = machine.I2C(1, freq=100000)
+        self.scd41 = i2c.attach(0x62, FakeSCD41())
+        self.sensor = SCD4x(i2c)
+        self.sensor.start_periodic_measurement()
+        spi = machine.SPI(0, baudrate=SPI_BAUDRATE)
+        self.radio = fake = spi.attach(FakeRFM69())
+        rfm = RFM69(spi=spi, nss=fake.nss, reset=machine.Pin(3), dio0=fake.dio0)
+        self.txq = TxQueue(rfm, slots=8)
+        self.batch = BatchSender(rfm, max_delay_ms=1000, queue=self.txq)
+        self.card = BusyCard(os.path.join(tmp, "card.img"), stall_ms)
+        self.logger = SDLogger(blockdev=self.card, start_block=2048, sectors=8, flush_ms=1000)
+        self.io_threads = set()
+
+    def write_record(self, seq, values):
+        self.io_threads.add(threading.get_ident())
+        elapsed_time, pressure, altitude, bmp_temp, pm1, pm25, pm10, co2, scd41_temp, humidity = values
+        msg = f"{seq + 1};{elapsed_time:.2f};{pressure:.2f};{bmp_temp:.2f};"
+        msg += f"{pm1:.0f};{pm25:.0f};{pm10:.0f}"
+        if co2 is not None:
+            msg += f";{co2:.0f};{scd41_temp:.2f};{humidity:.2f}"
+        else:
+            msg += "; ; ; "
+        self.logger.write(msg)
+        self.batch.add(elapsed_time, pressure, altitude, bmp_temp, pm1, pm25, pm10, co2, scd41_temp,
+                       humidity)
+
+    def service_io(self):
+        self.io_threads.add(threading.get_ident())
+        self.logger.poll()
+        self.batch.poll()
+        self.txq.poll()
+
+    def sample(self, start, sensor_ms):
+        self.sensor.read_if_ready()
+        co2, scd41_temp, humidity = self.sensor.last or (None, None, None)
+        time.sleep_us(int(sensor_ms * 1000))  # BME280 and PMS5003 reads
+        return (time.ticks_diff(time.ticks_ms(), start) / 1000, 1013.25, 0.0, 21.5, 5, 8, 9,
+                co2, scd41_temp, humidity)
+
+
+def run(name, seconds, period_ms, stall_ms, sensor_ms, slots=None):
+    with tempfile.TemporaryDirectory() as tmp:
+        rig = Rig(tmp, stall_ms)
+        ring = drain = None
+        if slots:
+            ring = RecordRing(slots=slots, fields=10)
+            drain = Drain(ring, lambda seq, record: rig.write_record(seq, ring.values(record)),
+                          rig.service_io)
+        samples = late = longest = 0
+        start = time.ticks_ms()
+        due = last = start
+        try:
+            if drain is not None:
+                drain.start()
+            while time.ticks_diff(time.ticks_ms(), start) < seconds * 1000:
+                now = time.ticks_ms()
+                longest = max(longest, time.ticks_diff(now, last))
+                last = now
+                values = rig.sample(start, sensor_ms)
+                if ring is not None:
+                    ring.put(values)
+                else:
+                    rig.write_record(samples, values)
+                    rig.service_io()
+                samples += 1
+                due = time.ticks_add(due, period_ms)
+                wait = time.ticks_diff(due, time.ticks_ms())
+                if wait > 0:
+                    time.sleep_ms(wait)
+                else:
+                    late += 1
+                    due = time.ticks_ms()
+        finally:
+            elapsed = time.ticks_diff(time.ticks_ms(), start) / 1000
+            rig.sensor.stop_periodic_measurement()
+            stopped = drain.stop() if drain is not None else True
+            rig.logger.close()  # before the radio, as the firmware does
+            rig.batch.flush()
+            sent = rig.txq.flush()
+        assert stopped, "core 1 did not stop"
+        assert rig.scd41.interval is None, "SCD41 still measuring"
+        expected = samples - (ring.dropped if ring is not None else 0)
+        assert rig.logger.lines == expected, (rig.logger.lines, expected)
+        on_air = sum(packet[4] & 0x0F for packet in rig.radio.sent)  # after the RadioHead header
+        assert sent and on_air == expected, (on_air, expected)
+        if ring is not None:
+            assert threading.get_ident() not in rig.io_threads, "I/O ran on core 0"
+        counters = ""
+        if ring is not None:
+            counters = ", ring: {} dropped, {} lock waits, high water {}/{}".format(
+                ring.dropped, ring.contended, ring.high_water, ring.slots)
+        print("{:20s} {:5.1f} Hz of {:5.1f}, {:4d} late, longest period {:4d} ms, {:5d} logged, "
+              "{:3d} packets{}".format(
+                  name, samples / elapsed, 1000 / period_ms, late, longest, rig.logger.lines,
+                  rig.batch.packets, counters))
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    period_ms = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    stall_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 100
+    sensor_ms = float(sys.argv[4]) if len(sys.argv) > 4 else 3
+    print("{} s at {} ms per sample, sensors {} ms, card stalls {} ms every {} writes".format(
+        seconds, period_ms, sensor_ms, stall_ms, STALL_EVERY))
+    run("one core", seconds, period_ms, stall_ms, sensor_ms)
+    run("two cores, 64 slots", seconds, period_ms, stall_ms, sensor_ms, slots=64)
+    run("two cores, 8 slots", seconds, period_ms, stall_ms, sensor_ms, slots=8)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+""" bench_phasegov.py - bytes logged and sent per flight phase, governed against fixed rates
+
+Runs a simulated flight (replay_altitude.simulated_flight: pad, boost,
+coast, parachute, landing) on a simulated clock through the AltDetection
+firmware's tasks: pressure samples into AltitudeFilter, SD lines through
+SDLogger (to a temporary file), radio samples through BatchSender,
+PMSDutyCycle on FakePMS5003. PhaseGovernor reconfigures them at each
+phase change, exactly as bound in the firmware.
+
+Per phase it reports pressure samples, SD bytes and syncs, radio packets
+and payload bytes, PMS5003 fan-on time and the SCD41 average current of
+the mode SCD4xModePolicy would pick. The same flight is then run with one
+row for every phase, the fixed rates of the firmware before the governor
+(50 Hz, a line every 500 ms, sync every 10 s, radio every second, PMS5003
+always on, CO2 every 5 s).
+
+    python host/bench_phasegov.py [pad_s] [landed_s]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import upy
+import machine
+from fakes import FakePMS5003
+from replay_altitude import simulated_flight
+
+from altfilter import AltitudeFilter, LANDED, PHASE_NAMES
+from phasegov import PhaseGovernor, DEFAULT_TABLE
+from pms5003 import PMS5003, PM1_0, PM2_5, PM10
+from pmsduty import PMSDutyCycle
+from scd4xmode import average_ma, pick_mode
+from sdlogger import SDLogger
+from txbatch import BatchSender
+
+STEP_MS = 10
+FLIGHT_HZ = 100  # rows of the simulated flight, the fastest pressure rate
+
+#         pressure_hz  log_ms  sync_ms  radio_ms  beacon  co2_ms  pms
+FIXED = (50,          500,    10000,   1000,     False,  5000,   "ascent")
+FIXED_TABLE = {phase: FIXED for phase in range(len(PHASE_NAMES))}
+
+# Counters snapshotted at every phase change
+COUNTERS = ("pressure", "log_bytes", "syncs", "packets", "radio_bytes", "fan_ms", "co2_mas")
+
+
+class SimClock:
+    def __init__(self):
+        self.ms = 0
+
+    def seconds(self):
+        return self.ms / 1000
+
+    def ticks_ms(self):
+        return self.ms & (upy.TICKS_PERIOD - 1)
+
+    def ticks_us(self):
+        return (self.ms * 1000) & (upy.TICKS_PERIOD - 1)
+
+
+class Radio:
+    """ What BatchSender reads of an RFM69 (its defaults), and a send() that always works. """
+    bitrate = 250000
+    preamble_length = 4
+    sync_size = 2
+
+    def send(self, payload, keep_listening=False):
+        return True
+
+
+class Flight:
+    """ The firmware's tasks and the governor bindings, on the simulated clock. """
+
+    def __init__(self, table, clock, log_path):
+        self.clock = clock
+        self.alt = AltitudeFilter()
+        self.gov = PhaseGovernor(table=table, phase=self.alt.phase)
+        self.logger = SDLogger(log_path, flush_ms=2000, mode="w")
+        self.batch = BatchSender(Radio())
+        uart = machine.UART(0, baudrate=9600)
+        self.pms = uart.attach(FakePMS5003(clock=clock.seconds))
+        self.duty = PMSDutyCycle(PMS5003(uart, None, None), phase=self.gov.value("pms"))
+        self.periods = {}
+        self.due = {}
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.beacon = False
+        self.counter = 1
+        self.pressure_pa = 0
+        self.pm = (None, None, None)
+
+        gov = self.gov
+        gov.bind("pressure_hz", lambda hz: self.set_period("pressure", 1000 // hz))
+        gov.bind("log_ms", lambda ms: self.set_period("log", ms))
+        gov.bind("sync_ms", lambda ms: setattr(self.logger, "sync_ms", ms))
+        gov.bind("radio_ms", self.set_radio_period)
+        gov.bind("beacon", self.set_beacon)
+        gov.bind("co2_ms", lambda ms: self.set_period("co2", ms))
+        gov.bind("pms", self.duty.set_phase)
+        self.set_period("pm", 100)
+
+    def set_period(self, name, period_ms):
+        self.periods[name] = period_ms
+        self.due.setdefault(name, self.clock.ms)
+
+    def set_radio_period(self, period_ms):
+        self.set_period("radio", period_ms)
+        self.batch.max_delay_ms = period_ms * 3 // 2
+
+    def set_beacon(self, on):
+        self.beacon = on
+
+    def snapshot(self):
+        c = self.counts
+        c["log_bytes"] = self.logger.bytes
+        c["syncs"] = self.logger.syncs
+        c["packets"] = self.batch.packets
+        c["radio_bytes"] = self.batch.bytes
+        return dict(c)
+
+    def sample(self):
+        return (self.clock.ms / 1000, self.pressure_pa / 100, self.alt.altitude_mm / 1000, 21.5,
+                self.pm[0], self.pm[1], self.pm[2], 612, 22.4, 45.1)
+
+    def step(self, rows):
+        now = self.clock.ms
+        c = self.counts
+        for name, period in self.periods.items():
+            if now < self.due[name]:
+                continue
+            self.due[name] = now + period
+            if name == "pressure":
+                self.pressure_pa = round(rows[now * FLIGHT_HZ // 1000][1])
+                phase = self.alt.update_pressure(self.pressure_pa, self.clock.ticks_us())
+                self.gov.set_phase(phase)
+                c["pressure"] += 1
+            elif name == "log":
+                s = self.sample()
+                msg = f"{self.counter};{s[0]:.2f};{s[1]:.2f};{s[2]:.2f};{s[3]:.2f};{s[4]};{s[5]};{s[6]}"
+                msg += f";{s[7]};{s[8]:.2f};{s[9]:.2f}"
+                self.counter += 1
+                if not self.beacon:
+                    self.batch.add(*s)
+                self.logger.write(msg)
+                self.logger.poll()
+            elif name == "radio":
+                if self.beacon:
+                    self.batch.add(*self.sample())
+                    self.batch.flush()
+                else:
+                    self.batch.poll()
+            elif name == "pm":
+                data = self.duty.poll()
+                if data is not None:
+                    self.pm = (data.value(PM1_0), data.value(PM2_5), data.value(PM10))
+        co2_ms = self.periods["co2"]
+        c["co2_mas"] += average_ma(pick_mode(co2_ms), co2_ms) * STEP_MS / 1000
+        if self.pms.running:
+            c["fan_ms"] += STEP_MS
+
+
+def simulate(table, rows, log_path):
+    clock = SimClock()
+    saved = time.ticks_ms, time.ticks_us
+    time.ticks_ms, time.ticks_us = clock.ticks_ms, clock.ticks_us
+    try:
+        flight = Flight(table, clock, log_path)
+        phase = flight.alt.phase
+        marks = [(phase, 0, flight.snapshot())]
+        end_ms = len(rows) * 1000 // FLIGHT_HZ
+        while clock.ms < end_ms:
+            flight.step(rows)
+            if flight.alt.phase != phase:
+                phase = flight.alt.phase
+                marks.append((phase, clock.ms, flight.snapshot()))
+            clock.ms += STEP_MS
+        flight.logger.close()
+        marks.append((None, clock.ms, flight.snapshot()))
+    finally:
+        time.ticks_ms, time.ticks_us = saved
+    per_phase = {}
+    for (phase, start, a), (_, end, b) in zip(marks, marks[1:]):
+        totals = per_phase.setdefault(phase, dict.fromkeys(COUNTERS + ("ms",), 0))
+        totals["ms"] += end - start
+        for key in COUNTERS:
+            totals[key] += b[key] - a[key]
+    return flight, per_phase
+
+
+def print_table(name, per_phase):
+    print(name)
+    print("  phase      time_s  pressure  sd_bytes  syncs  packets  radio_bytes  fan_s  scd41_mA")
+    total = dict.fromkeys(COUNTERS + ("ms",), 0)
+    for phase, t in sorted(per_phase.items()):
+        for key in total:
+            total[key] += t[key]
+        print_row(PHASE_NAMES[phase], t)
+    print_row("total", total)
+    return total
+
+
+def print_row(name, t):
+    print("  {:8s} {:8.1f} {:9d} {:9d} {:6d} {:8d} {:12d} {:6.0f} {:9.2f}".format(
+        name, t["ms"] / 1000, t["pressure"], t["log_bytes"], t["syncs"], t["packets"],
+        t["radio_bytes"], t["fan_ms"] / 1000, t["co2_mas"] * 1000 / t["ms"] if t["ms"] else 0))
+
+
+def main():
+    pad_s = float(sys.argv[1]) if len(sys.argv) > 1 else 300
+    landed_s = float(sys.argv[2]) if len(sys.argv) > 2 else 600
+    rows, apogee_s, touchdown_s = simulated_flight(rate_hz=FLIGHT_HZ, pad_s=pad_s, landed_s=landed_s)
+    print("simulated flight: launch at {:.0f} s, apogee {:.1f} s, touchdown {:.1f} s, end {:.0f} s".format(
+        pad_s, apogee_s, touchdown_s, rows[-1][0]))
+    totals = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, table in (("governed (phasegov.DEFAULT_TABLE)", DEFAULT_TABLE),
+                            ("fixed rates", FIXED_TABLE)):
+            path = os.path.join(tmp, "log.csv")
+            flight, per_phase = simulate(table, rows, path)
+            totals[name] = print_table(name, per_phase)
+            assert os.path.getsize(path) == flight.logger.bytes
+            assert flight.alt.phase == LANDED, PHASE_NAMES[flight.alt.phase]
+            assert flight.gov.errors == 0, flight.gov.last_error
+    governed, fixed = totals.values()
+    for key, label in (("log_bytes", "SD bytes"), ("syncs", "SD syncs"), ("radio_bytes", "radio bytes"),
+                       ("fan_ms", "PMS5003 fan time")):
+        print("{}: {:.0%} of fixed rates".format(label, governed[key] / fixed[key]))
+
+
+if __name__ == "__main__":
+    main()
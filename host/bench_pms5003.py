@@ -0,0 +1,189 @@
+""" bench_pms5003.py - PMS5003 frame parser throughput and allocations per frame
+
+Feeds the real PMS5003 driver a synthetic UART stream of data frames mixed
+with garbage bytes, false start-of-frame markers and frames with a corrupted
+checksum, then reads until every valid frame has been decoded. Reports
+frames/s, UART calls and the objects the driver allocates per decoded frame. The count
+covers what allocates on MicroPython: bytes returned by UART.read(), buffers
+the driver creates or slices, struct.unpack tuples and response objects.
+Give the path of another pms5003.py to compare, e.g. the previous revision
+from git.
+
+    python host/bench_pms5003.py [frames] [path/to/pms5003.py]
+"""
+
+import importlib.util
+import random
+import sys
+import time
+
+import upy  # noqa: F401
+import machine
+from fakes import pms5003_frame
+
+
+class Counter:
+    objects = 0
+    uart_calls = 0
+
+
+class CountingBytes(bytes):
+    def __new__(cls, *args):
+        Counter.objects += 1
+        return bytes.__new__(cls, *args)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CountingBytes(bytes.__getitem__(self, index))
+        return bytes.__getitem__(self, index)
+
+
+class CountingBytearray(bytearray):
+    def __new__(cls, *args):
+        Counter.objects += 1
+        return bytearray.__new__(cls, *args)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CountingBytes(bytearray.__getitem__(self, index))
+        return bytearray.__getitem__(self, index)
+
+
+class CountingStruct:
+    def __init__(self, struct):
+        self._struct = struct
+
+    def unpack(self, fmt, buf):
+        Counter.objects += 1
+        return self._struct.unpack(fmt, buf)
+
+    def unpack_from(self, fmt, buf, offset=0):
+        Counter.objects += 1
+        return self._struct.unpack_from(fmt, buf, offset)
+
+    def __getattr__(self, name):
+        return getattr(self._struct, name)
+
+
+class StreamDevice:
+    """ Hands the UART the prepared stream in chunks, like bytes arriving over time. """
+
+    def __init__(self, stream, chunk=64):
+        self.stream = stream
+        self.chunk = chunk
+        self.pos = 0
+
+    def poll(self):
+        out = self.stream[self.pos:self.pos + self.chunk]
+        self.pos += len(out)
+        return out
+
+    def receive(self, buf):
+        pass
+
+
+def values(n):
+    return (n % 50, n % 70, n % 90, 1, 2, 3, n % 1000, 300, 60, 10, 2, 1, 0)
+
+
+def build_stream(frames, seed=1):
+    """ Returns (stream, number of valid frames). """
+    rng = random.Random(seed)
+    stream = bytearray()
+    good = 0
+    for n in range(frames):
+        if rng.random() < 0.3:
+            garbage = bytes(rng.choice((0x42, 0x4d, 0x00, rng.randrange(256))) for _ in range(rng.randrange(1, 12)))
+            stream += garbage
+        if rng.random() < 0.05:
+            stream += b"\x42\x4d\xff\xff"  # false start of frame, impossible length
+        frame = bytearray(pms5003_frame(values(n)))
+        if rng.random() < 0.1:
+            frame[10] ^= 0x55  # corrupted in transit: checksum mismatch
+        else:
+            good += 1
+        stream += frame
+    return bytes(stream), good
+
+
+def load_driver(path=None):
+    if path is None:
+        import pms5003
+        module = pms5003
+    else:
+        spec = importlib.util.spec_from_file_location("pms5003_compare", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    module.bytearray = CountingBytearray
+    module.bytes = CountingBytes
+    module.struct = CountingStruct(module.struct)
+    for cls in (module.PMS5003Data, module.PMS5003CmdResponse):
+        cls.__init__ = counted(cls.__init__)
+    return module
+
+
+def counted(init):
+    def wrapper(self, *args, **kwargs):
+        Counter.objects += 1
+        init(self, *args, **kwargs)
+    return wrapper
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    module = load_driver(sys.argv[2] if len(sys.argv) > 2 else None)
+    print("driver:", module.__file__)
+    stream, good = build_stream(frames)
+    print("{} bytes, {} frames of which {} valid".format(len(stream), frames, good))
+
+    uart = machine.UART(1, baudrate=9600, rxbuf=len(stream))
+    device = StreamDevice(stream)
+    uart.attach(device)
+    read, readinto, any_ = uart.read, uart.readinto, uart.any
+
+    def counting_read(nbytes=None):
+        Counter.uart_calls += 1
+        data = read(nbytes)
+        if data is not None:
+            Counter.objects += 1  # a new bytes object on MicroPython too
+        return data
+
+    def counting_readinto(buf, nbytes=None):
+        Counter.uart_calls += 1
+        return readinto(buf, nbytes)
+
+    def counting_any():
+        Counter.uart_calls += 1
+        return any_()
+    uart.read, uart.readinto, uart.any = counting_read, counting_readinto, counting_any
+
+    pms = module.PMS5003(uart, None, None)
+    Counter.objects = Counter.uart_calls = 0
+    decoded = errors = 0
+    objects = uart_calls = 0
+    start = last = time.perf_counter()
+    while decoded < good:
+        try:
+            data = pms.read()
+        except module.ReadTimeoutError:
+            break
+        except RuntimeError:
+            errors += 1
+            continue
+        assert data.pm_ug_per_m3(10) < 90
+        decoded += 1
+        # a driver that lost frames ends on a read timeout: count up to the last frame
+        last = time.perf_counter()
+        objects, uart_calls = Counter.objects, Counter.uart_calls
+    elapsed = last - start
+    decoded_or_1 = max(decoded, 1)
+    print("{} frames decoded, {} read errors raised, {:.0f} frames/s, {:.1f} allocations/frame, "
+          "{:.1f} UART calls/frame".format(decoded, errors, decoded / elapsed,
+                                           objects / decoded_or_1, uart_calls / decoded_or_1))
+    for name in ("frames", "bad_frames", "skipped_bytes"):
+        if hasattr(pms, name):
+            print("  {} {}".format(name, getattr(pms, name)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+""" bench_pms5003_async.py - other tasks' rate while the PMS5003 reboots, blocking versus AsyncPMS5003
+
+FakePMS5003 takes `startup` seconds (10 by default) after a reset before its
+first frame, like a sensor rebooting in flight. A 25 Hz pressure task and a
+2 Hz logging task share the scheduler with the particle sensor task. With
+the blocking driver the PM task spins in reset(); with AsyncPMS5003 it
+awaits. Reports per task the achieved rate and worst lateness, and when the
+first PM value arrived. A last AsyncPMS5003 run has the UART fail once
+(OSError) after the first frame: read() retries it and the frames go on.
+
+    python host/bench_pms5003_async.py [startup_s] [seconds]
+"""
+
+import sys
+import time
+
+import upy  # noqa: F401
+import machine
+from fakes import FakePMS5003
+
+from pms5003 import PMS5003, AsyncPMS5003
+from scheduler import Scheduler
+
+
+def build(startup):
+    uart = machine.UART(0, baudrate=9600)
+    fake = uart.attach(FakePMS5003(startup=startup))
+    pin_reset = machine.Pin(18)
+    fake.reset_pin(pin_reset)
+    return uart, pin_reset
+
+
+def fail_once(uart, after_frames, state):
+    """ Makes uart.readinto() raise OSError once, after `after_frames` frames. """
+    readinto = uart.readinto
+
+    def failing(buf, nbytes=None):
+        if state["pm"] >= after_frames and not state["uart_errors"]:
+            state["uart_errors"] += 1
+            raise OSError(5)  # EIO
+        return readinto(buf, nbytes)
+    uart.readinto = failing
+
+
+def run(name, startup, seconds, use_async, uart_error=False):
+    uart, pin_reset = build(startup)
+    sched = Scheduler()
+    state = {"first_pm_ms": None, "pm": 0, "uart_errors": 0, "task_errors": 0}
+    if uart_error:
+        fail_once(uart, 1, state)
+    t0 = time.ticks_ms()
+
+    def got(data):
+        state["pm"] += 1
+        if state["first_pm_ms"] is None:
+            state["first_pm_ms"] = time.ticks_diff(time.ticks_ms(), t0)
+
+    sched.every("pressure", 40, lambda: None)
+    sched.every("sd", 500, lambda: None)
+
+    if use_async:
+        pms = AsyncPMS5003(uart=uart, pin_enable=machine.Pin(19), pin_reset=pin_reset)
+
+        async def read_pm():
+            # As the firmware's start_pm: errors are reported, the task goes on
+            while True:
+                try:
+                    await pms.reset()
+                    while True:
+                        got(await pms.read())
+                except (RuntimeError, OSError):
+                    state["task_errors"] += 1
+        sched.spawn(read_pm())
+    else:
+        holder = {}
+
+        def read_pm():
+            # First run resets the sensor (as the constructor does), then reads what is there
+            if "pms" not in holder:
+                holder["pms"] = PMS5003(uart=uart, pin_enable=machine.Pin(19), pin_reset=pin_reset)
+            pms = holder["pms"]
+            data = pms.read_latest()
+            if data is not None:
+                got(data)
+        sched.every("pm", 1000, read_pm)
+
+    sched.run(int(seconds * 1000))
+    print(name)
+    for task_name in ("pressure", "sd"):
+        task = sched.task(task_name)
+        print("  {:9s} {:5.1f} Hz of {:4.1f}, worst lateness {:6.0f} ms, {} missed slots".format(
+            task_name, task.runs / seconds, 1000 / task.period_ms, task.max_late_us / 1000, task.overruns))
+    print("  first PM frame after {} ms, {} frames".format(state["first_pm_ms"], state["pm"]))
+    if uart_error:
+        print("  {} UART error, {} reached the task".format(state["uart_errors"], state["task_errors"]))
+        assert state["uart_errors"] == 1 and state["task_errors"] == 0 and state["pm"] > 1, state
+
+
+def main():
+    startup = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else startup + 4
+    print("sensor reboot takes {} s, {} s run".format(startup, seconds))
+    run("blocking PMS5003", startup, seconds, use_async=False)
+    run("AsyncPMS5003", startup, seconds, use_async=True)
+    run("AsyncPMS5003, UART error", startup, seconds, use_async=True, uart_error=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+""" bench_pms5003_data.py - PMS5003Data decode-plus-access cost per frame
+
+Decodes the same set of frames with the current PMS5003Data and, given its
+path, another pms5003.py (e.g. the previous revision from git), then reads
+PM1.0, PM2.5 and PM10 from each the way the firmware does. Both are checked
+to return the same values. Reports for each way of getting at the values
+the time and the heap objects per frame, counted as bench_pms5003.py does
+(struct tuples, byte slices, frame objects), and the size of one frame
+object. CPython runs struct.unpack in C and the byte loops in bytecode, so
+the times favour unpacking everything more than MicroPython does, where
+each of those objects is also garbage to collect.
+
+    python host/bench_pms5003_data.py [frames] [path/to/pms5003.py]
+"""
+
+import importlib.util
+import sys
+import time
+from array import array
+
+import upy  # noqa: F401
+from bench_pms5003 import Counter, CountingBytes, CountingStruct, counted
+from fakes import pms5003_frame
+
+import pms5003
+
+
+def load_driver(path):
+    spec = importlib.util.spec_from_file_location("pms5003_compare", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_frames(count):
+    """ The 28 data bytes (after start of frame and length) of count frames. """
+    frames = []
+    for n in range(count):
+        values = (n % 50, n % 70, n % 90, 1, 2, 3, n % 1000, 300, 60, 10, 2, 1, 0)
+        frames.append(bytes(pms5003_frame(values)[4:]))
+    return frames
+
+
+def size_of(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def timed(module, name, frames, body):
+    start = time.perf_counter()
+    total = body(frames)
+    per_frame = (time.perf_counter() - start) / len(frames) * 1e6
+
+    # Second pass with counting, which would skew the times
+    struct, init = module.struct, module.PMS5003Data.__init__
+    module.struct = CountingStruct(struct)
+    module.PMS5003Data.__init__ = counted(init)
+    counting = [CountingBytes(raw) for raw in frames]  # counts the slices taken
+    Counter.objects = 0
+    try:
+        assert body(counting) == total
+    finally:
+        module.struct, module.PMS5003Data.__init__ = struct, init
+    print("  {:38s} {:6.2f} us/frame, {:.1f} objects/frame".format(
+        name, per_frame, Counter.objects / len(frames)))
+    return total
+
+
+def by_size(cls):
+    def body(frames):
+        total = 0
+        for raw in frames:
+            data = cls(raw)
+            total += data.pm_ug_per_m3(1) + data.pm_ug_per_m3(2.5) + data.pm_ug_per_m3(10)
+        return total
+    return body
+
+
+def reused_by_size(cls):
+    def body(frames):
+        total = 0
+        data = cls.reusable()
+        for raw in frames:
+            data.load(raw, 0)
+            total += data.pm_ug_per_m3(1) + data.pm_ug_per_m3(2.5) + data.pm_ug_per_m3(10)
+        return total
+    return body
+
+
+def by_index(frames):
+    total = 0
+    value = pms5003.PMS5003Data.value
+    for raw in frames:
+        data = pms5003.PMS5003Data(raw)
+        total += value(data, pms5003.PM1_0) + value(data, pms5003.PM2_5) + value(data, pms5003.PM10)
+    return total
+
+
+def reused_by_index(frames):
+    total = 0
+    data = pms5003.PMS5003Data.reusable()
+    for raw in frames:
+        data.load(raw, 0)
+        total += data.value(pms5003.PM1_0) + data.value(pms5003.PM2_5) + data.value(pms5003.PM10)
+    return total
+
+
+def reused_fill(frames):
+    total = 0
+    data = pms5003.PMS5003Data.reusable()
+    values = array('H', [0] * pms5003.VALUES)
+    for raw in frames:
+        data.load(raw, 0).fill(values)
+        total += values[pms5003.PM1_0] + values[pms5003.PM2_5] + values[pms5003.PM10]
+    return total
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    frames = make_frames(count)
+    results = []
+    if len(sys.argv) > 2:
+        other = load_driver(sys.argv[2])
+        print("other:", other.__file__)
+        results.append(timed(other, "constructor + pm_ug_per_m3() x3", frames, by_size(other.PMS5003Data)))
+        if hasattr(other.PMS5003Data, "reusable"):
+            results.append(timed(other, "reusable load() + pm_ug_per_m3() x3", frames,
+                                 reused_by_size(other.PMS5003Data)))
+        print("  frame object {} bytes".format(size_of(other.PMS5003Data(frames[0]))))
+    print("current:", pms5003.__file__)
+    for name, body in (("constructor + pm_ug_per_m3() x3", by_size(pms5003.PMS5003Data)),
+                       ("constructor + value(index) x3", by_index),
+                       ("reusable load() + pm_ug_per_m3() x3", reused_by_size(pms5003.PMS5003Data)),
+                       ("reusable load() + value(index) x3", reused_by_index),
+                       ("reusable load() + fill(array('H'))", reused_fill)):
+        results.append(timed(pms5003, name, frames, body))
+    print("  frame object {} bytes".format(size_of(pms5003.PMS5003Data(frames[0]))))
+    assert len(set(results)) == 1, results
+
+
+if __name__ == "__main__":
+    main()
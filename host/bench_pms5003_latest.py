@@ -0,0 +1,53 @@
+""" bench_pms5003_latest.py - PM data lag with read() versus read_latest() in a slow loop
+
+FakePMS5003 streams in active mode (frame number in the first data word)
+while a loop slower than the stream reads once per iteration, like the SD
+firmware. Reports how many frames behind the returned frame is, its age,
+the frames skipped and UART receive buffer overflows.
+
+    python host/bench_pms5003_latest.py [seconds] [frame_interval_s] [loop_period_s]
+"""
+
+import sys
+import time
+
+import upy  # noqa: F401
+import machine
+from fakes import FakePMS5003
+
+from pms5003 import PMS5003
+
+
+def run(name, seconds, interval, period, latest):
+    uart = machine.UART(1, baudrate=9600, rxbuf=256)
+    fake = uart.attach(FakePMS5003(interval=interval, startup=0.1,
+                                   values=lambda n: (n, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)))
+    reset = machine.Pin(2)
+    fake.reset_pin(reset)
+    pms = PMS5003(uart, reset, None)
+    max_lag = reads = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        time.sleep(period)  # the rest of the loop
+        data = pms.read_latest() if latest else pms.read()
+        if data is None:
+            continue
+        reads += 1
+        max_lag = max(max_lag, fake.frames - data.data[0])
+    print("{:14s} {:3d} reads, lag max {:2d} frames ({:5.0f} ms), "
+          "{} frames skipped, {} bytes lost to UART overflow".format(
+              name, reads, max_lag, max_lag * interval * 1000, getattr(pms, "frames_skipped", 0),
+              uart.overflows))
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    period = float(sys.argv[3]) if len(sys.argv) > 3 else 0.5
+    print("frames every {} s, loop every {} s, {} s".format(interval, period, seconds))
+    run("read()", seconds, interval, period, latest=False)
+    run("read_latest()", seconds, interval, period, latest=True)
+
+
+if __name__ == "__main__":
+    main()
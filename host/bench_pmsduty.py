@@ -0,0 +1,143 @@
+""" bench_pmsduty.py - PMS5003 duty cycling on a simulated clock
+
+Drives PMSDutyCycle and FakePMS5003 from one simulated clock through a
+flight profile (ground, ascent, descent, landed), polling every 100 ms. It
+checks the timing of the command sequence (wake, settle window of the
+phase, passive reads, sleep, cycle period per phase) and compares the fan-on
+time, UART bytes and samples against the sensor left streaming in active
+mode. It also reports how long after the start of each phase its first
+sample came. For ascent that is ASCENT_SETTLE_MS, where the 30 s SETTLE_MS
+could outlast a short ascent.
+
+    python host/bench_pmsduty.py [ground_min] [ascent_min] [descent_min] [landed_min]
+"""
+
+import sys
+import time
+
+import upy
+import machine
+from fakes import FakePMS5003
+
+from pms5003 import PMS5003
+from pmsduty import PMSDutyCycle, ASCENT_SETTLE_MS, SETTLE_MS
+
+STEP_MS = 100
+
+
+class SimClock:
+    def __init__(self):
+        self.ms = 0
+
+    def seconds(self):
+        return self.ms / 1000
+
+    def ticks_ms(self):
+        return self.ms & (upy.TICKS_PERIOD - 1)
+
+
+def make_sensor(clock):
+    uart = machine.UART(0, baudrate=9600)
+    fake = uart.attach(FakePMS5003(clock=clock.seconds))
+    commands = []  # (sim ms, command byte, data byte)
+    receive = fake.receive
+
+    def logged(buf):
+        commands.append((clock.ms, buf[2], buf[4]))
+        receive(buf)
+    fake.receive = logged
+    return uart, fake, commands
+
+
+def simulate(profile, duty_cycled):
+    clock = SimClock()
+    real_ticks_ms = time.ticks_ms
+    time.ticks_ms = clock.ticks_ms
+    try:
+        uart, fake, commands = make_sensor(clock)
+        pms = PMS5003(uart, None, None)
+        duty = PMSDutyCycle(pms, phase=profile[0][0]) if duty_cycled else None
+        samples = {phase: 0 for phase, _ in profile}
+        first_ms = {}  # phase: first sample, ms after the phase started
+        starts = []    # (ms, phase)
+        fan_ms = 0
+        for phase, minutes in profile:
+            if duty:
+                duty.set_phase(phase)
+            start = clock.ms
+            starts.append((start, phase))
+            end = clock.ms + int(minutes * 60000)
+            next_read = clock.ms
+            while clock.ms < end:
+                got = False
+                if duty:
+                    got = duty.poll() is not None
+                elif clock.ms >= next_read:
+                    next_read += 1000
+                    got = pms.read_latest() is not None
+                if got:
+                    samples[phase] += 1
+                    first_ms.setdefault(phase, clock.ms - start)
+                if fake.running:
+                    fan_ms += STEP_MS
+                clock.ms += STEP_MS
+        return uart, fan_ms, samples, first_ms, starts, commands, duty, clock.ms
+    finally:
+        time.ticks_ms = real_ticks_ms
+
+
+def settle_ms(duty, starts, wake, until):
+    """ The shortest settle time of the phases between wake and until. """
+    phases = [phase for i, (start, phase) in enumerate(starts)
+              if start <= until and (i + 1 == len(starts) or starts[i + 1][0] > wake)]
+    return min(duty.schedule[p][2] if len(duty.schedule[p]) > 2 else duty.settle_ms for p in phases)
+
+
+def check_timing(commands, duty, starts, end_ms):
+    """ Every wake-up is followed by the passive command one settle window later
+        (the phase's), then by read requests. Returns the wake times. """
+    wakes = [ms for ms, cmd, data in commands if cmd == 0xE4 and data == 1]
+    for wake in wakes:
+        after = [(ms, cmd, data) for ms, cmd, data in commands if ms > wake]
+        passive = next((ms for ms, cmd, data in after if cmd == 0xE1 and data == 0), None)
+        if passive is None:
+            assert end_ms - wake <= settle_ms(duty, starts, wake, end_ms) + 2 * STEP_MS  # ended while settling
+            continue
+        settle = settle_ms(duty, starts, wake, passive)
+        assert settle <= passive - wake < settle + 2 * STEP_MS, (wake, passive, settle)
+        first_read = next((ms for ms, cmd, data in after if cmd == 0xE2), end_ms)
+        assert first_read - passive >= duty.pms.MIN_CMD_INTERVAL * 1000
+    return wakes
+
+
+def main():
+    minutes = [float(a) for a in sys.argv[1:5]] or [10, 5, 10, 15]
+    profile = list(zip(("ground", "ascent", "descent", "landed"), minutes))
+    total_s = sum(minutes) * 60
+    print("profile:", ", ".join("{} {:g} min".format(p, m) for p, m in profile))
+
+    results = {}
+    for name, duty_cycled in (("always on (active)", False), ("duty cycled", True)):
+        uart, fan_ms, samples, first_ms, starts, commands, duty, end_ms = simulate(profile, duty_cycled)
+        results[name] = uart.bytes_rx + uart.bytes_tx
+        print("{:20s} fan on {:5.1f}% of the time, UART {:6d} B rx {:4d} B tx, samples {}".format(
+            name, fan_ms / 10 / total_s, uart.bytes_rx, uart.bytes_tx,
+            ", ".join("{} {}".format(p, n) for p, n in samples.items())))
+        if duty:
+            wakes = check_timing(commands, duty, starts, end_ms)
+            periods = [b - a for a, b in zip(wakes, wakes[1:])]
+            print("  {} wake-ups, wake-to-wake {} s, settle {} s (ascent {} s) checked".format(
+                len(wakes), sorted(set(p // 1000 for p in periods)), SETTLE_MS // 1000,
+                ASCENT_SETTLE_MS // 1000))
+            print("  first sample after the phase started: {}".format(", ".join(
+                "{} {:.1f} s".format(p, first_ms[p] / 1000) if p in first_ms else "{} none".format(p)
+                for p, _ in profile)))
+            if "ascent" in first_ms:
+                assert first_ms["ascent"] < ASCENT_SETTLE_MS + 2000, first_ms
+            duty.report()
+    saved = results["always on (active)"] - results["duty cycled"]
+    print("UART bytes saved: {} ({:.0%})".format(saved, saved / results["always on (active)"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+""" bench_pressurering.py - Timer-driven BME280 ring: achieved rate, dropped ticks, lost samples
+
+Runs PressureRing on the host Timer (a thread on the wall clock) against
+FakeBME280, with a consumer task catching up every `consumer_ms` like the
+AltDetection firmware's pressure task. As on the device, scheduled
+callbacks queue up (8 deep) and run on the main thread between its
+instructions, here every millisecond. Every second the main thread blocks
+for `stall_ms` without running them, like a long SD write or radio send.
+Reports per rate the achieved sample rate, ticks dropped, samples the
+consumer lost, the longest gap between samples and whether the consumer
+saw every sample in order.
+
+    python host/bench_pressurering.py [seconds] [consumer_ms] [stall_ms]
+"""
+
+import collections
+import sys
+import threading
+import time
+
+import upy  # noqa: F401
+import machine
+import micropython
+from fakes import FakeBME280
+
+from bme280 import BME280, BMP280_I2CADDR
+from pressurering import PressureRing
+
+
+class Scheduler:
+    """ micropython.schedule() with the device's queue: run by the main thread. """
+
+    def __init__(self, depth=8):
+        self.depth = depth
+        self.queue = collections.deque()
+        self.lock = threading.Lock()
+
+    def schedule(self, func, arg):
+        with self.lock:
+            if len(self.queue) >= self.depth:
+                raise RuntimeError("schedule queue full")
+            self.queue.append((func, arg))
+
+    def run_pending(self):
+        while self.queue:
+            with self.lock:
+                func, arg = self.queue.popleft()
+            func(arg)
+
+    def sleep(self, seconds):
+        """ Sleep, running callbacks as they come (every ms). """
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            self.run_pending()
+            time.sleep(0.001)
+
+
+def run(rate_hz, seconds, consumer_ms, stall_ms):
+    sched = Scheduler()
+    saved = micropython.schedule
+    micropython.schedule = sched.schedule
+    i2c = machine.I2C(0)
+    i2c.attach(BMP280_I2CADDR, FakeBME280(pressure=lambda t: 101325 - 10 * t))
+    bmp = BME280(i2c=i2c, address=BMP280_I2CADDR)
+    ring = PressureRing(bmp, rate_hz=rate_hz, size=128)
+    seen = []
+    cursor = 0
+    ring.start()
+    start = time.perf_counter()
+    next_stall = start + 1
+    try:
+        while time.perf_counter() - start < seconds:
+            for seq, stamp, raw_temp, raw_press in ring.iterate(cursor):
+                seen.append((seq, stamp))
+                cursor = seq + 1
+            now = time.perf_counter()
+            if stall_ms and now >= next_stall:
+                time.sleep(stall_ms / 1000)
+                next_stall += 1
+            sched.sleep(consumer_ms / 1000)
+        ring.stop()
+        sched.run_pending()
+        for seq, stamp, raw_temp, raw_press in ring.iterate(cursor):
+            seen.append((seq, stamp))
+        elapsed = time.perf_counter() - start
+    finally:
+        ring.stop()
+        micropython.schedule = saved
+    in_order = [seq for seq, _ in seen] == list(range(ring.count - len(seen), ring.count))
+    gaps = [time.ticks_diff(b[1], a[1]) for a, b in zip(seen, seen[1:])]
+    print("{:3d} Hz: achieved {:6.2f} Hz ({:6.2f} Hz over the ring), {:5d} ticks, {:3d} dropped, "
+          "{:3d} lost, max gap {:5.1f} ms, consumer saw {} samples{}".format(
+              rate_hz, ring.count / elapsed, ring.rate, ring.ticks, ring.dropped, ring.lost,
+              max(gaps) / 1000 if gaps else float("nan"), len(seen),
+              " in order" if in_order else " OUT OF ORDER"))
+    return ring, in_order
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    consumer_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+    stall_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+    print("{} s per rate, consumer every {} ms, {} ms stall per second".format(
+        seconds, consumer_ms, stall_ms))
+    for rate_hz in (25, 50, 100):
+        ring, in_order = run(rate_hz, seconds, consumer_ms, stall_ms)
+        assert in_order and ring.errors == 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+""" bench_rfm69_alloc.py - buffer allocations and SPI transactions per packet in the RFM69 driver
+
+Real RFM69 driver on FakeRFM69 with DIO0 wired, so no polling and the counts
+are exact. The driver module's `bytearray` is replaced by a counting
+subclass, so every buffer the driver creates, concatenates or slices during
+send(), receive() and receive_into() is counted (the fake and the host SPI
+are not). SPI transactions are the chip-select frames seen by the fake.
+Give the path of another rfm69.py to compare, e.g. the previous
+revision from git.
+
+    python host/bench_rfm69_alloc.py [packets] [path/to/rfm69.py]
+"""
+
+import importlib.util
+import sys
+
+import upy  # noqa: F401
+import machine
+from fakes import FakeRFM69
+
+PAYLOAD = bytes(range(58))
+
+
+class Counter:
+    buffers = 0
+
+
+class CountingBytearray(bytearray):
+    def __new__(cls, *args):
+        Counter.buffers += 1
+        return bytearray.__new__(cls, *args)
+
+    # results are CountingBytearray too, so __new__ counts them once
+    def __add__(self, other):
+        return CountingBytearray(bytearray(self) + other)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CountingBytearray(bytearray.__getitem__(self, index))
+        return bytearray.__getitem__(self, index)
+
+
+def load_driver(path=None):
+    if path is None:
+        import rfm69
+        module = rfm69
+    else:
+        spec = importlib.util.spec_from_file_location("rfm69_compare", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    module.bytearray = CountingBytearray
+    return module
+
+
+def make_radio(module):
+    machine.SPI.emulate_timing = False
+    spi = machine.SPI(0, baudrate=50000)
+    fake = spi.attach(FakeRFM69())
+    rfm = module.RFM69(spi=spi, nss=fake.nss, reset=machine.Pin(3), dio0=fake.dio0)
+    rfm.xmit_timeout = 0.2
+    return rfm, spi, fake
+
+
+def measure(name, packets, fake, action):
+    Counter.buffers = 0
+    fake.transactions = 0
+    for _ in range(packets):
+        action()
+    print("{:22s} {:6.1f} buffers/packet  {:5.1f} SPI transactions/packet".format(
+        name, Counter.buffers / packets, fake.transactions / packets))
+
+
+def main():
+    packets = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    module = load_driver(sys.argv[2] if len(sys.argv) > 2 else None)
+    print("driver:", module.__file__)
+    rfm, spi, fake = make_radio(module)
+
+    def send():
+        assert rfm.send(PAYLOAD)
+
+    def receive():
+        fake.deliver(b"\xff\xff\x00\x00" + PAYLOAD)
+        assert rfm.receive(timeout=0.2) == PAYLOAD
+
+    buf = bytearray(60)
+
+    def receive_into():
+        fake.deliver(b"\xff\xff\x00\x00" + PAYLOAD)
+        assert rfm.receive_into(buf, timeout=0.2) == len(PAYLOAD)
+
+    measure("send()", packets, fake, send)
+    measure("receive()", packets, fake, receive)
+    if hasattr(rfm, "receive_into"):
+        measure("receive_into()", packets, fake, receive_into)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+""" bench_rfm69_irq.py - caller time and SPI traffic per packet, SPI polling versus DIO0 interrupt
+
+Real RFM69 driver on FakeRFM69 (250 kbps on air, SPI at the firmware's
+50 kHz unless given). For each way of sending, reports per packet the time
+spent inside driver calls (i.e. the time the sampling loop is blocked),
+the number of SPI transactions and how often RegIrqFlags2 was read to find
+PacketSent. That count does not depend on host timing: with DIO0 it is 0,
+the interrupt replaces the polling. For send_async() it reports how often
+another task ran while packets were on air instead of the driver time.
+
+The blocking send() also reports the CPU time it used per packet and what
+that leaves of the packet's time for interrupts and the other core: with
+DIO0 the driver sleeps in machine.idle() (WFI on the RP2040, here until the
+next pin IRQ or 1 ms) between tests of the flag, shown against the same
+wait spinning on the flag.
+
+Last, on_dio0 is set while micropython.schedule() reports a full queue:
+the calls are counted as dropped and the sends go on.
+
+    python host/bench_rfm69_irq.py [packets] [spi_baudrate]
+"""
+
+import sys
+import time
+
+import upy  # noqa: F401
+import machine
+import uasyncio as asyncio
+from fakes import FakeRFM69
+
+import rfm69
+from rfm69 import RFM69
+
+PAYLOAD = bytes(range(58))
+SPI_BAUDRATE = 50000
+
+
+def make_radio(with_dio0):
+    spi = machine.SPI(0, baudrate=SPI_BAUDRATE)
+    fake = spi.attach(FakeRFM69())
+    rfm = RFM69(spi=spi, nss=fake.nss, reset=machine.Pin(3), dio0=fake.dio0 if with_dio0 else None)
+    spi.transfers = fake.flag_reads = 0
+    return rfm, spi, fake
+
+
+def show(name, packets, driver_s, spi, fake, extra=""):
+    print("{:34s} {:7.2f} ms/packet in driver  {:5.1f} SPI transfers/packet {:5.1f} flag reads/packet{}".format(
+        name, driver_s * 1000 / packets, spi.transfers / packets, fake.flag_reads / packets, extra))
+
+
+def blocking(name, with_dio0, packets, spin=False):
+    rfm, spi, fake = make_radio(with_dio0)
+    if spin:
+        rfm._wait = None  # the DIO0 wait before it slept in machine.idle()
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    for _ in range(packets):
+        assert rfm.send(PAYLOAD)
+    cpu = time.thread_time() - cpu_start
+    if with_dio0:
+        assert fake.flag_reads == 0, fake.flag_reads
+    elapsed = time.perf_counter() - start
+    show(name, packets, elapsed, spi, fake, "  {:6.2f} ms CPU/packet, {:3.0%} free".format(
+        cpu * 1000 / packets, 1 - cpu / elapsed))
+
+
+def polled(name, with_dio0, packets):
+    """ send_start() then send_done() from a loop that does other work meanwhile. """
+    rfm, spi, fake = make_radio(with_dio0)
+    in_driver = 0.0
+    for _ in range(packets):
+        start = time.perf_counter()
+        rfm.send_start(PAYLOAD)
+        in_driver += time.perf_counter() - start
+        while True:
+            time.sleep(0.0002)  # the rest of the sampling loop
+            start = time.perf_counter()
+            done = rfm.send_done()
+            in_driver += time.perf_counter() - start
+            if done is not None:
+                assert done
+                break
+    show(name, packets, in_driver, spi, fake)
+
+
+def concurrent(name, with_dio0, packets):
+    """ send_async() while another task counts loop iterations. """
+    rfm, spi, fake = make_radio(with_dio0)
+    state = {"ticks": 0, "run": True}
+
+    async def worker():
+        while state["run"]:
+            state["ticks"] += 1
+            await asyncio.sleep_ms(0)
+
+    async def sender():
+        for _ in range(packets):
+            assert await rfm.send_async(PAYLOAD)
+        state["run"] = False
+
+    async def main():
+        task = asyncio.create_task(worker())
+        start = time.perf_counter()
+        await sender()
+        elapsed = time.perf_counter() - start
+        await task
+        return elapsed
+
+    elapsed = asyncio.run(main())
+    print("{:34s} {:7.2f} ms/packet wall time     {:5.1f} SPI transfers/packet {:5.1f} flag reads/packet"
+          " {:6.0f} other-task runs/packet".format(
+              name, elapsed * 1000 / packets, spi.transfers / packets, fake.flag_reads / packets,
+              state["ticks"] / packets))
+    if with_dio0:
+        assert fake.flag_reads == 0, fake.flag_reads
+
+
+def schedule_full(packets):
+    """ on_dio0 set while the schedule queue is full: the IRQ must not raise. """
+    rfm, spi, fake = make_radio(True)
+    calls = []
+    rfm.on_dio0 = calls.append
+
+    def full(func, arg):
+        raise RuntimeError("schedule queue full")
+    saved = rfm69.schedule
+    rfm69.schedule = full
+    try:
+        for _ in range(packets):
+            assert rfm.send(PAYLOAD)
+    finally:
+        rfm69.schedule = saved
+    assert not calls and rfm.dio0_dropped == packets, (len(calls), rfm.dio0_dropped)
+    print("schedule queue full: {} on_dio0 calls dropped, {} packets sent".format(
+        rfm.dio0_dropped, len(fake.sent)))
+
+
+def main():
+    global SPI_BAUDRATE
+    packets = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    if len(sys.argv) > 2:
+        SPI_BAUDRATE = int(sys.argv[2])
+    print("SPI at {} Hz".format(SPI_BAUDRATE))
+    blocking("send(), SPI polling", False, packets)
+    blocking("send(), DIO0 spinning", True, packets, spin=True)
+    blocking("send(), DIO0 idle", True, packets)
+    polled("send_start/send_done, SPI polling", False, packets)
+    polled("send_start/send_done, DIO0", True, packets)
+    concurrent("send_async, SPI polling", False, packets)
+    concurrent("send_async, DIO0", True, packets)
+    schedule_full(min(packets, 10))
+
+
+if __name__ == "__main__":
+    main()
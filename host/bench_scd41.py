@@ -0,0 +1,112 @@
+""" bench_scd41.py - SCD41 cost per loop iteration, read_measurement() versus read_if_ready()
+
+Runs a 4 Hz loop (the SD firmware sleeps 0.25 s per iteration) against
+FakeSCD41 in periodic mode on a simulated clock: the driver's sleeps advance
+the clock instead of waiting, so the time spent in the driver per iteration
+is exact. Reports that time, the I2C transactions, the logged rows without
+CO2 and the age of the CO2 value in the rows.
+
+With a NACK rate the bus fails at random, and for 3 s from a third of the
+run it fails on every transfer; each failure hangs the bus for stall_ms.
+The run then checks the worst stall of an iteration against its bound: one
+transfer for read_if_ready(), the time budget plus one attempt for the
+blocking read_measurement().
+
+    python host/bench_scd41.py [seconds] [loop_period_ms] [nack_rate] [stall_ms]
+"""
+
+import sys
+import time
+
+import upy  # noqa: F401
+import machine
+from fakes import FakeSCD41, NackingI2CDevice
+
+from scd4x_micro import SCD4x, COMMAND_MS
+
+
+class SimClock:
+    def __init__(self):
+        self.ms = 0.0
+
+    def seconds(self):
+        return self.ms / 1000
+
+    def ticks_ms(self):
+        return int(self.ms) & (upy.TICKS_PERIOD - 1)
+
+    def ticks_us(self):
+        return int(self.ms * 1000) & (upy.TICKS_PERIOD - 1)
+
+    def sleep_ms(self, ms):
+        self.ms += ms
+
+    def sleep(self, s):
+        self.ms += s * 1000
+
+
+def run(name, seconds, period_ms, use_ready, nack_rate=0.0, stall_ms=0):
+    clock = SimClock()
+    saved = time.ticks_ms, time.ticks_us, time.sleep_ms, time.sleep
+    time.ticks_ms, time.ticks_us, time.sleep_ms, time.sleep = (clock.ticks_ms, clock.ticks_us,
+                                                              clock.sleep_ms, clock.sleep)
+    try:
+        i2c = machine.I2C(1, freq=100000)
+        fake = FakeSCD41(co2=lambda t: 400 + int(t), clock=clock.seconds)
+        if nack_rate:
+            burst = seconds / 3
+            fake = NackingI2CDevice(fake, rate=nack_rate, bursts=[(burst, burst + 3)],
+                                    stall_ms=stall_ms, sleep_ms=clock.sleep_ms, clock=clock.seconds)
+        i2c.attach(0x62, fake)
+        scd = SCD4x(i2c)
+        scd.start_periodic_measurement()
+        scd.reset_stats()
+        i2c.transactions = 0
+        iterations = empty = 0
+        spent = []
+        ages = []
+        end = seconds * 1000
+        while clock.ms < end:
+            before = clock.ms
+            if use_ready:
+                scd.read_if_ready()
+                co2 = scd.last[0] if scd.last else None
+            else:
+                co2 = scd.read_measurement()[0]
+            spent.append(clock.ms - before)
+            iterations += 1
+            if co2 is None:
+                empty += 1
+            else:
+                ages.append(clock.seconds() - (co2 - 400))  # the fake's co2 is its time in s
+            clock.ms += period_ms  # the rest of the loop
+    finally:
+        time.ticks_ms, time.ticks_us, time.sleep_ms, time.sleep = saved
+    spent.sort()
+    print("{:16s} {:4d} iterations, in driver mean {:6.1f} ms max {:5.0f} ms, "
+          "{:5.1f} I2C transactions/s, {:3d} rows without CO2, CO2 age max {:.1f} s".format(
+              name, iterations, sum(spent) / iterations, spent[-1], i2c.transactions / seconds,
+              empty, max(ages) if ages else float("nan")))
+    if nack_rate:
+        print("  {} NACKs, ".format(fake.nacks), end="")
+        scd.report()
+        # One attempt: the write with its stall, the 1 ms wait, the read with its stall
+        attempt_ms = 2 * stall_ms + COMMAND_MS
+        bound = stall_ms if use_ready else scd.budget_ms + attempt_ms
+        assert spent[-1] <= bound, (spent[-1], bound)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    period_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 250
+    nack_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    stall_ms = float(sys.argv[4]) if len(sys.argv) > 4 else 5
+    print("{} s, loop every {} ms plus the driver".format(seconds, period_ms))
+    if nack_rate:
+        print("NACK rate {}, bus hangs {} ms per failure".format(nack_rate, stall_ms))
+    run("read_measurement", seconds, period_ms, use_ready=False, nack_rate=nack_rate, stall_ms=stall_ms)
+    run("read_if_ready", seconds, period_ms, use_ready=True, nack_rate=nack_rate, stall_ms=stall_ms)
+
+
+if __name__ == "__main__":
+    main()
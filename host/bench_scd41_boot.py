@@ -0,0 +1,88 @@
+""" bench_scd41_boot.py - boot-to-first-CO2-sample time of the SCD41 bring-up
+
+Replays the firmware start on a simulated clock: the other devices take
+`setup_ms` to set up (radio, SD card, BME280, PMS5003), then the loop polls
+the SCD41 every 250 ms until the first CO2 value. FakeSCD41 models the
+command execution times, including a sensor still measuring from before a
+reset of the MCU alone. Compared:
+
+  sequential   initialize_sensor() then the other setup, as before
+  fast         begin(), the other setup, finish()
+  fast + test  the same with the 10 s self-test
+
+Give the path of another scd4x_micro.py to run its initialize_sensor() and
+start_periodic_measurement() as the sequential flow, e.g. the previous
+revision from git.
+
+    python host/bench_scd41_boot.py [setup_ms] [path/to/scd4x_micro.py]
+"""
+
+import contextlib
+import importlib.util
+import io
+import os
+import sys
+import time
+
+import upy  # noqa: F401
+import machine
+from bench_scd41 import SimClock
+from fakes import FakeSCD41
+
+import scd4x_micro
+
+
+def load_driver(path):
+    spec = importlib.util.spec_from_file_location("scd4x_compare", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def boot(module, flow, setup_ms, measuring):
+    clock = SimClock()
+    saved = time.ticks_ms, time.ticks_us, time.sleep_ms, time.sleep
+    time.ticks_ms, time.ticks_us, time.sleep_ms, time.sleep = (clock.ticks_ms, clock.ticks_us,
+                                                              clock.sleep_ms, clock.sleep)
+    try:
+        i2c = machine.I2C(1, freq=100000)
+        fake = i2c.attach(0x62, FakeSCD41(clock=clock.seconds, measuring=measuring))
+        scd = module.SCD4x(i2c)
+        if flow == "sequential":
+            with contextlib.redirect_stdout(io.StringIO()):
+                scd.initialize_sensor()
+            clock.ms += setup_ms
+            scd.start_periodic_measurement()
+        else:
+            scd.begin()
+            clock.ms += setup_ms
+            scd.finish(self_test=flow == "fast + test")
+        setup_done = clock.ms
+        while scd.read_if_ready() is None and clock.ms < 120000:
+            clock.ms += 250
+        first = clock.ms if scd.last else None
+    finally:
+        time.ticks_ms, time.ticks_us, time.sleep_ms, time.sleep = saved
+    return setup_done, first, fake.nacked
+
+
+def main():
+    setup_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 500
+    # (label, driver module, flow)
+    flows = [("current", scd4x_micro, "sequential"), ("current", scd4x_micro, "fast"),
+             ("current", scd4x_micro, "fast + test")]
+    if len(sys.argv) > 2:
+        flows.insert(0, ("baseline", load_driver(sys.argv[2]), "sequential"))
+    print("other setup takes {:.0f} ms".format(setup_ms))
+    for measuring, case in ((False, "sensor idle (power-up)"), (True, "sensor measuring (MCU reset)")):
+        print(case)
+        for label, module, flow in flows:
+            setup_done, first, nacked = boot(module, flow, setup_ms, measuring)
+            label = "{} ({})".format(label, os.path.basename(module.__file__))
+            print("  {:30s} {:12s} setup done {:6.0f} ms, first CO2 sample {}, {} commands NACKed".format(
+                label, flow, setup_done,
+                "{:6.0f} ms".format(first) if first is not None else "never", nacked))
+
+
+if __name__ == "__main__":
+    main()
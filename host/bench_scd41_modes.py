@@ -0,0 +1,106 @@
+""" bench_scd41_modes.py - SCD41 mode policy: supply current, sample gaps and poll cost
+
+Runs SCD4xModePolicy against FakeSCD41 on a simulated clock, polled every
+250 ms like the firmware's CO2 task. For each sampling budget it reports
+the mode picked, the average sensor current (datasheet figures applied to
+what the fake sensor is doing), the longest gap between samples and the
+longest poll() call. A last run changes the budget in flight to check that
+mode switches never block. Always-periodic measurement is the baseline.
+
+    python host/bench_scd41_modes.py [minutes]
+"""
+
+import sys
+import time
+
+import upy  # noqa: F401
+import machine
+from bench_scd41 import SimClock
+from fakes import FakeSCD41
+
+from scd4x_micro import SCD4x
+from scd4xmode import (SCD4xModePolicy, IDLE_MA, LOW_POWER_MA, PERIODIC_MA, average_ma,
+                       pick_mode)
+
+STEP_MS = 250
+MODE_NAMES = ("idle", "periodic", "low power", "single shot")
+
+
+def sensor_ma(fake):
+    now = fake._now()
+    if fake.interval == 5.0:
+        return PERIODIC_MA
+    if fake.interval == 30.0:
+        return LOW_POWER_MA
+    if fake.single_shot_at is not None and now < fake.single_shot_at:
+        return PERIODIC_MA  # measuring, as in periodic mode
+    return IDLE_MA
+
+
+def run(schedule, single_shot=True):
+    """ schedule: [(minutes, interval_ms or None for plain periodic)] """
+    clock = SimClock()
+    saved = time.ticks_ms, time.ticks_us, time.sleep_ms, time.sleep
+    time.ticks_ms, time.ticks_us, time.sleep_ms, time.sleep = (clock.ticks_ms, clock.ticks_us,
+                                                              clock.sleep_ms, clock.sleep)
+    try:
+        i2c = machine.I2C(1, freq=100000)
+        fake = i2c.attach(0x62, FakeSCD41(clock=clock.seconds))
+        scd = SCD4x(i2c)
+        scd.begin()
+        scd.finish()
+        policy = SCD4xModePolicy(scd, interval_ms=schedule[0][1] or 5000, single_shot=single_shot)
+        charge = 0.0
+        max_poll = 0.0
+        gaps = []  # (gap ms, budget ms)
+        last = clock.ms
+        start = clock.ms
+        for minutes, interval_ms in schedule:
+            if interval_ms is not None:
+                policy.set_interval(interval_ms)
+            last = clock.ms  # gaps count from the budget change
+            end = clock.ms + minutes * 60000
+            while clock.ms < end:
+                before = clock.ms
+                sample = policy.poll() if interval_ms is not None else scd.read_if_ready()
+                max_poll = max(max_poll, clock.ms - before)
+                if sample is not None:
+                    gaps.append((clock.ms - last, interval_ms or 5000))
+                    last = clock.ms
+                charge += sensor_ma(fake) * STEP_MS / 1000
+                clock.ms += STEP_MS
+        elapsed_s = (clock.ms - start) / 1000
+    finally:
+        time.ticks_ms, time.ticks_us, time.sleep_ms, time.sleep = saved
+    return policy, charge / elapsed_s, gaps, max_poll
+
+
+def main():
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    print("{} min per budget, polled every {} ms".format(minutes, STEP_MS))
+    _, base_ma, _, _ = run([(minutes, None)])
+    print("{:28s} {:5.2f} mA".format("always periodic", base_ma))
+    for single_shot in (True, False):
+        print("single shots {}".format("allowed" if single_shot else "not allowed"))
+        for interval_ms in (5000, 15000, 30000, 60000, 300000):
+            policy, ma, gaps, max_poll = run([(minutes, interval_ms)], single_shot)
+            mode = pick_mode(interval_ms, single_shot)
+            worst = max(gap for gap, _ in gaps[1:]) if len(gaps) > 1 else float("nan")
+            print("  budget {:4d} s -> {:12s} {:5.2f} mA (model {:5.2f}), {:3d} samples, "
+                  "max gap {:5.1f} s, max poll {:.0f} ms".format(
+                      interval_ms // 1000, MODE_NAMES[mode], ma, average_ma(mode, interval_ms),
+                      len(gaps), worst / 1000, max_poll))
+            assert worst <= interval_ms + 2 * STEP_MS + 1000, (interval_ms, worst)
+
+    flight = [(minutes / 3, 300000), (minutes / 3, 5000), (minutes / 3, 30000), (minutes / 3, 300000)]
+    policy, ma, gaps, max_poll = run(flight)
+    print("in flight {}: {:5.2f} mA, {} switches, {} single shots ({} lost), max poll {:.0f} ms".format(
+        " -> ".join("{} s".format(i // 1000) for _, i in flight), ma, policy.switches,
+        policy.shots, policy.lost, max_poll))
+    # a budget change takes effect within the stop time plus one sample of the new mode
+    late = [(gap, budget) for gap, budget in gaps[1:] if gap > budget + 500 + 5000 + 2 * STEP_MS]
+    print("  gaps over budget after a switch: {}".format(late or "none"))
+
+
+if __name__ == "__main__":
+    main()
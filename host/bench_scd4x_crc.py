@@ -0,0 +1,110 @@
+""" bench_scd4x_crc.py - SCD4x CRC-8 checking: cost per read and corrupted values let through
+
+Checks the driver's CRC table against the bitwise CRC of fakes.py for every
+16-bit word, and times the in-place check of a 9-byte measurement against
+the bitwise version. Then reads FakeSCD41 through a bus that flips one bit
+in `flip` of the reads (simulated clock, 4 Hz loop) and counts measurements
+that differ from what the sensor sent. Settings written with a CRC must read
+back unchanged. Give the path of another scd4x_micro.py to compare.
+
+    python host/bench_scd4x_crc.py [seconds] [flip] [path/to/scd4x_micro.py]
+"""
+
+import importlib.util
+import sys
+import time
+
+import upy  # noqa: F401
+import machine
+from bench_scd41 import SimClock
+from fakes import FakeSCD41, NackingI2CDevice, sensirion_crc, sensirion_words
+
+import scd4x_micro
+
+CO2, TEMPERATURE, HUMIDITY = 612, 21.5, 40.0
+
+
+def load_driver(path=None):
+    if path is None:
+        return scd4x_micro
+    spec = importlib.util.spec_from_file_location("scd4x_compare", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def check_table():
+    for word in range(65536):
+        msb, lsb = word >> 8, word & 0xFF
+        assert scd4x_micro.crc8(msb, lsb) == sensirion_crc(bytes((msb, lsb))), hex(word)
+
+
+def time_check(reads=20000):
+    scd = scd4x_micro.SCD4x(machine.I2C(3))
+    data = bytearray(sensirion_words(CO2, 0x6666, 0x6666))
+    start = time.perf_counter()
+    for _ in range(reads):
+        scd._verify(data)
+    table_us = (time.perf_counter() - start) / reads * 1e6
+    start = time.perf_counter()
+    for _ in range(reads):
+        for i in range(0, 9, 3):
+            assert sensirion_crc(data[i:i + 2]) == data[i + 2]
+    bitwise_us = (time.perf_counter() - start) / reads * 1e6
+    print("CRC check of a measurement: table {:.2f} us, bitwise {:.2f} us (CPython)".format(
+        table_us, bitwise_us))
+
+
+def run(module, seconds, flip):
+    clock = SimClock()
+    saved = time.ticks_ms, time.ticks_us, time.sleep_ms, time.sleep
+    time.ticks_ms, time.ticks_us, time.sleep_ms, time.sleep = (clock.ticks_ms, clock.ticks_us,
+                                                              clock.sleep_ms, clock.sleep)
+    try:
+        i2c = machine.I2C(1, freq=100000)
+        sensor = FakeSCD41(co2=lambda t: CO2, temperature=lambda t: TEMPERATURE,
+                           humidity=lambda t: HUMIDITY, clock=clock.seconds)
+        bus = i2c.attach(0x62, NackingI2CDevice(sensor, flip=flip, clock=clock.seconds))
+        scd = module.SCD4x(i2c)
+        scd.start_periodic_measurement()
+        good = corrupted = 0
+        # What the driver decodes from the words the fake sends
+        expected = (CO2, -45 + 175 * int((TEMPERATURE + 45) * 65536 / 175) / 65536.0,
+                    100 * int(HUMIDITY * 65536 / 100) / 65536.0)
+        while clock.ms < seconds * 1000:
+            new = scd.read_if_ready()
+            if new is not None:
+                if tuple(new) == expected:
+                    good += 1
+                else:
+                    corrupted += 1
+            clock.ms += 250
+
+        bus.flip = 0
+        scd.stop_periodic_measurement()  # settings are only accepted while idle
+        scd.set_altitude(1234)
+        scd.set_temperature_offset(2.0)
+        settings = (scd.get_altitude(), round(scd.get_temperature_offset() or 0, 1))
+    finally:
+        time.ticks_ms, time.ticks_us, time.sleep_ms, time.sleep = saved
+    print("{}: {} measurements, {} corrupted ones accepted, {} reads with a bit flipped, "
+          "{} words rejected".format(module.__file__, good + corrupted, corrupted, bus.flips,
+                                     getattr(scd, "rejected_words", "-")))
+    print("  settings read back {} ({} writes NACKed for a bad CRC)".format(settings, sensor.bad_writes))
+    return corrupted, settings
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 600
+    flip = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    check_table()
+    print("CRC table matches the bitwise CRC for all 65536 words")
+    time_check()
+    if len(sys.argv) > 3:
+        run(load_driver(sys.argv[3]), seconds, flip)
+    corrupted, settings = run(scd4x_micro, seconds, flip)
+    assert corrupted == 0 and settings == (1234, 2.0), (corrupted, settings)
+
+
+if __name__ == "__main__":
+    main()
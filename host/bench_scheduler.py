@@ -0,0 +1,89 @@
+""" bench_scheduler.py - achieved rate and jitter of the multi-rate scheduler on the host
+
+Runs the real BME280/SCD4x/PMS5003/RFM69 drivers against the fake devices in
+fakes.py with the same task layout as main_with_transmision_SDcard_AltDetection.py.
+
+    python host/bench_scheduler.py [seconds] [pressure_period_ms]
+"""
+
+import os
+import sys
+import tempfile
+
+import upy  # noqa: F401
+import machine
+from fakes import FakeBME280, FakeSCD41, FakePMS5003, FakeRFM69
+
+from bme280 import BME280, BMP280_I2CADDR, BME280_STANDBY_20, BME280_COMPENSATION_INT32
+from pms5003 import PMS5003
+from rfm69 import RFM69
+from scd4x_micro import SCD4x
+from scheduler import Scheduler
+
+
+def build(pressure_period_ms=40):
+    i2c0 = machine.I2C(0)
+    i2c0.attach(BMP280_I2CADDR, FakeBME280(pressure=lambda t: 101325 - 10 * t))
+    bmp = BME280(i2c=i2c0, address=BMP280_I2CADDR, compensation=BME280_COMPENSATION_INT32)
+    bmp.set_normal_mode(standby=BME280_STANDBY_20)
+
+    i2c1 = machine.I2C(1, freq=100000)
+    i2c1.attach(0x62, FakeSCD41())
+    scd = SCD4x(i2c1)
+    scd.start_periodic_measurement()
+
+    uart = machine.UART(0, baudrate=9600)
+    fake_pms = uart.attach(FakePMS5003())
+    pin_reset = machine.Pin(18)
+    fake_pms.reset_pin(pin_reset)
+    pms = PMS5003(uart=uart, pin_enable=machine.Pin(19), pin_reset=pin_reset, mode="active")
+
+    spi = machine.SPI(0, baudrate=50000)
+    fake_rfm = spi.attach(FakeRFM69())
+    rfm = RFM69(spi=spi, nss=fake_rfm.nss, reset=machine.Pin(3))
+
+    log = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False).name
+    state = {"msg": "", "counter": 1, "p": 0.0}
+
+    def read_pressure():
+        state["t"], state["p"], _ = bmp.raw_values
+
+    def read_pm():
+        if pms.data_available():
+            state["pm"] = pms.read().pm_ug_per_m3(2.5)
+
+    def read_co2():
+        if scd.read_if_ready():
+            state["co2"] = scd.last[0]
+
+    def log_sample():
+        state["msg"] = "{};{:.2f};{};{}".format(state["counter"], state["p"], state.get("pm"), state.get("co2"))
+        state["counter"] += 1
+        with open(log, "a") as f:
+            f.write(state["msg"] + "\n")
+
+    def send_radio():
+        if state["msg"]:
+            rfm.send(bytes(state["msg"], "utf-8"))
+
+    sched = Scheduler()
+    sched.every("pressure", pressure_period_ms, read_pressure)
+    sched.every("pm", 1000, read_pm)
+    sched.every("co2", 250, read_co2)
+    sched.every("sd", 500, log_sample)
+    sched.every("radio", 1000, send_radio)
+    return sched, log
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    period = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    sched, log = build(period)
+    sched.run(int(seconds * 1000))
+    print("target pressure rate {:.1f} Hz, {:.0f} s run".format(1000 / period, seconds))
+    sched.report()
+    os.remove(log)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+""" bench_sdlogger.py - lines/s and worst-case flush latency of SDLogger on a fake SD card
+
+Compares, on the same file-backed FakeBlockDevice:
+  * per-line append: what `with open(f, "a")` per sample costs on FAT - read
+    the tail sector, rewrite it (CMD24) and rewrite the directory entry (CMD24)
+  * SDLogger straight on the block device (whole sectors through CMD25)
+and also runs SDLogger in file mode on the Linux filesystem.
+
+    python host/bench_sdlogger.py [lines]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import upy  # noqa: F401
+from fakes import FakeBlockDevice
+from sdlogger import SDLogger
+
+LINE = "1234;123.45;1013.25;152.30;21.50;5;8;9;612;22.40;45.10"
+DIR_BLOCK = 100
+DATA_BLOCK = 2048
+
+
+def per_line_append(dev, lines):
+    sector = bytearray(512)
+    record = (LINE + "\n").encode()
+    pos = 0
+    worst = 0
+    for _ in range(lines):
+        start = time.ticks_us()
+        block, offset = divmod(pos, 512)
+        dev.readblocks(DATA_BLOCK + block, sector)
+        take = min(len(record), 512 - offset)
+        sector[offset:offset + take] = record[:take]
+        dev.writeblocks(DATA_BLOCK + block, sector)
+        if take < len(record):
+            sector[:] = bytes(512)
+            sector[:len(record) - take] = record[take:]
+            dev.writeblocks(DATA_BLOCK + block + 1, sector)
+        dev.writeblocks(DIR_BLOCK, sector)  # directory entry: new file size
+        pos += len(record)
+        worst = max(worst, time.ticks_diff(time.ticks_us(), start))
+    return worst
+
+
+def run(name, lines, func):
+    start = time.perf_counter()
+    worst_us = func()
+    elapsed = time.perf_counter() - start
+    print("{:28s} {:9.0f} lines/s   worst write/flush {:7.2f} ms".format(
+        name, lines / elapsed, worst_us / 1000))
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    tmp = tempfile.mkdtemp()
+
+    dev = FakeBlockDevice(os.path.join(tmp, "card_a.img"))
+    run("per-line append (CMD24)", lines, lambda: per_line_append(dev, lines))
+    print("    commands:", dev.commands)
+    dev.close()
+
+    dev = FakeBlockDevice(os.path.join(tmp, "card_b.img"))
+
+    def raw():
+        log = SDLogger(blockdev=dev, start_block=DATA_BLOCK, sectors=8, flush_ms=1000)
+        for _ in range(lines):
+            log.write(LINE)
+            log.poll()
+        log.close()
+        return log.max_flush_us
+    run("SDLogger blockdev (CMD25)", lines, raw)
+    print("    commands:", dev.commands)
+    dev.close()
+
+    def file_mode():
+        log = SDLogger(os.path.join(tmp, "log.csv"), sectors=8, flush_ms=1000, sync_ms=5000)
+        for _ in range(lines):
+            log.write(LINE)
+            log.poll()
+        log.close()
+        return log.max_flush_us
+    run("SDLogger file (host fs)", lines, file_mode)
+
+    for name in os.listdir(tmp):
+        os.remove(os.path.join(tmp, name))
+    os.rmdir(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+""" bench_telemetry.py - samples/s over the RFM69 link: ASCII lines versus binary frames
+
+Sends with the real RFM69 driver against FakeRFM69 (250 kbps, SPI at the
+firmware's 50 kHz) and reports bytes per sample, air time and the achieved
+samples per second for one ASCII line per packet, one binary record per
+packet and full binary frames. First checks that out-of-range values are
+packed as the end of their field's range instead of raising.
+
+    python host/bench_telemetry.py [seconds_per_case]
+"""
+
+import sys
+import time
+
+import upy  # noqa: F401
+import machine
+from fakes import FakeRFM69
+
+from rfm69 import RFM69
+from telemetry import MAX_RECORDS, RECORD_SIZE, Frame, decode, pack_record, unpack_record
+
+SAMPLE = (1234.5, 1013.25, 152.3, 21.5, 5, 8, 9, 612, 22.4, 45.1)
+
+
+def ascii_line(counter):
+    return bytes("{};{:.2f};{:.2f};{:.2f};{:.2f};{};{};{};{};{:.2f};{:.2f}".format(counter, *SAMPLE), "utf-8")
+
+
+# (out of range sample, what unpack_record() gives back)
+OUT_OF_RANGE = (
+    ((1234.5, 2000.0, 5000.0, 400.0, 70000, -3, 8, 99999, -400.0, 150.0),
+     (1234.5, 1310.7, 3276.7, 327.67, 65534, 0, 8, 65534, -327.67, 127.0)),
+    ((1234.5, -1.0, -5000.0, -400.0, None, None, None, None, None, -10.0),
+     (1234.5, 0.0, -3276.7, -327.67, None, None, None, None, None, 0.0)),
+)
+
+
+def check_out_of_range():
+    buf = bytearray(RECORD_SIZE)
+    for sample, expected in OUT_OF_RANGE:
+        pack_record(buf, 0, *sample)
+        got = unpack_record(buf)
+        assert all(g == e if e is None or g is None else abs(g - e) < 1e-6
+                   for g, e in zip(got, expected)), (sample, got)
+    print("out-of-range values packed as the ends of their fields")
+
+
+def run_case(name, rfm, fake, seconds, per_packet, payload):
+    fake.airtime = 0.0
+    sent = samples = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        data = payload()
+        if len(data) > 60:
+            print("{:26s} payload of {} bytes exceeds the 60-byte send limit".format(name, len(data)))
+            return
+        rfm.send(data)
+        sent += 1
+        samples += per_packet
+    elapsed = time.perf_counter() - start
+    print("{:26s} {:3d} B/packet {:5.1f} B/sample {:7.1f} samples/s  air {:5.2f} ms/sample".format(
+        name, len(data), len(data) / per_packet, samples / elapsed, fake.airtime * 1000 / samples))
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    check_out_of_range()
+    spi = machine.SPI(0, baudrate=50000)
+    fake = spi.attach(FakeRFM69())
+    rfm = RFM69(spi=spi, nss=fake.nss, reset=machine.Pin(3))
+
+    one = Frame(max_records=1)
+    one.add(*SAMPLE)
+    full = Frame()
+    while full.add(*SAMPLE):
+        pass
+    assert abs(decode(bytes(full.payload()))[0][1] - SAMPLE[1]) <= 0.02
+
+    run_case("ASCII line", rfm, fake, seconds, 1, lambda: ascii_line(123456))
+    run_case("binary, 1 record", rfm, fake, seconds, 1, one.payload)
+    run_case("binary, {} records".format(MAX_RECORDS), rfm, fake, seconds, MAX_RECORDS, full.payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+""" bench_txbatch.py - effective samples/s and air time utilisation of BatchSender
+
+Feeds samples at a fixed rate into BatchSender (real RFM69 driver on
+FakeRFM69) and compares with one send per sample.
+
+    python host/bench_txbatch.py [seconds] [sample_rate_hz ...]
+"""
+
+import sys
+import time
+
+import upy  # noqa: F401
+import machine
+from fakes import FakeRFM69
+
+from rfm69 import RFM69
+from txbatch import BatchSender
+
+SAMPLE = (1234.5, 1013.25, 152.3, 21.5, 5, 8, 9, 612, 22.4, 45.1)
+
+
+def run(rfm, rate_hz, seconds, max_records, max_delay_ms):
+    batch = BatchSender(rfm, max_delay_ms=max_delay_ms, max_records=max_records)
+    period = 1 / rate_hz
+    offered = 0
+    start = time.perf_counter()
+    due = start
+    while time.perf_counter() - start < seconds:
+        now = time.perf_counter()
+        if now >= due:
+            batch.add(now - start, *SAMPLE[1:])
+            offered += 1
+            due += period
+            if due < now:  # the radio made us miss sample slots
+                due = now + period
+        batch.poll()
+    batch.flush()
+    print("{:5.0f} Hz  {:d}/packet  offered {:6.1f}/s  sent {:6.1f} samples/s  "
+          "{:4d} packets  air {:6.2%}  in send() {:5.1%}".format(
+              rate_hz, max_records, offered / seconds, batch.samples_per_s, batch.packets,
+              batch.airtime_utilisation, batch.send_us / (batch.elapsed_ms * 1000)))
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    rates = [float(r) for r in sys.argv[2:]] or [2, 10, 50, 200]
+    spi = machine.SPI(0, baudrate=50000)
+    fake = spi.attach(FakeRFM69())
+    rfm = RFM69(spi=spi, nss=fake.nss, reset=machine.Pin(3))
+    for rate in rates:
+        run(rfm, rate, seconds, 1, 0)
+        run(rfm, rate, seconds, 3, 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+""" bench_txqueue.py - sampling-task jitter with blocking send() versus TxQueue
+
+Real RFM69 driver on FakeRFM69 with DIO0. A 25 Hz sampling task produces a
+small high-priority frame every sample and a full bulk frame every third
+sample. With blocking send() the task waits for each packet; with TxQueue it
+only copies the packet and the queue drains it from its own task. Reports
+per mode the time spent handing packets over, how late the sampling task
+ran, and the queue statistics. Last, a radio that raises once (a mode
+change timeout in send_start) must fail that packet only: the packets
+queued after it still go out.
+
+    python host/bench_txqueue.py [seconds] [spi_baudrate]
+"""
+
+import sys
+import time
+
+import upy  # noqa: F401
+import machine
+import uasyncio as asyncio
+from fakes import FakeRFM69
+
+from rfm69 import RFM69
+from txqueue import PRIO_BULK, PRIO_HIGH, TxQueue
+
+PERIOD_MS = 40
+HIGH = bytes(range(20))
+BULK = bytes(range(58))
+SPI_BAUDRATE = 50000
+
+
+def make_radio():
+    spi = machine.SPI(0, baudrate=SPI_BAUDRATE)
+    fake = spi.attach(FakeRFM69())
+    rfm = RFM69(spi=spi, nss=fake.nss, reset=machine.Pin(3), dio0=fake.dio0)
+    return rfm, fake
+
+
+async def sampler(seconds, hand_over):
+    """ Fixed-rate task; returns (samples, max late ms, max hand-over ms, total hand-over ms). """
+    samples = 0
+    max_late = max_call = total_call = 0.0
+    due = time.perf_counter()
+    end = due + seconds
+    while due < end:
+        due += PERIOD_MS / 1000
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        max_late = max(max_late, (time.perf_counter() - due) * 1000)
+        start = time.perf_counter()
+        await hand_over(HIGH, PRIO_HIGH)
+        if samples % 3 == 2:
+            await hand_over(BULK, PRIO_BULK)
+        call = (time.perf_counter() - start) * 1000
+        max_call = max(max_call, call)
+        total_call += call
+        samples += 1
+    return samples, max_late, max_call, total_call
+
+
+def show(name, result, fake):
+    samples, max_late, max_call, total_call = result
+    print("{:18s} {:4d} samples, hand-over mean {:6.2f} ms max {:6.2f} ms, "
+          "task late max {:6.1f} ms, {} packets on air".format(
+              name, samples, total_call / samples, max_call, max_late, len(fake.sent)))
+
+
+def blocking(seconds):
+    rfm, fake = make_radio()
+
+    async def hand_over(data, priority):
+        assert await rfm.send_async(data)
+
+    show("send_async()", asyncio.run(sampler(seconds, hand_over)), fake)
+
+
+def queued(seconds):
+    rfm, fake = make_radio()
+    txq = TxQueue(rfm, slots=8)
+
+    async def hand_over(data, priority):
+        txq.put(data, priority)
+
+    async def main():
+        task = asyncio.create_task(txq.run())
+        result = await sampler(seconds, hand_over)
+        while len(txq):
+            await asyncio.sleep_ms(10)
+        await asyncio.sleep_ms(50)
+        task.cancel()
+        return result
+
+    show("TxQueue", asyncio.run(main()), fake)
+    txq.report()
+    print("txq high water {} packets".format(txq.high_water))
+
+
+def radio_error(method, driver):
+    """ The radio raises once in `method` (send_start or send_done); the queue is
+        driven by "run" (uasyncio) or "poll" (a plain loop, as on core 1). """
+    rfm, fake = make_radio()
+    txq = TxQueue(rfm, slots=8)
+    original = getattr(rfm, method)
+    raised = []
+
+    def failing(*args):
+        if not raised:
+            raised.append(args)
+            raise RuntimeError("Change mode timeout!")
+        return original(*args)
+    setattr(rfm, method, failing)
+
+    async def main():
+        task = asyncio.create_task(txq.run())
+        for i in range(4):
+            txq.put(bytes((i,)) * 20)
+        while len(txq):
+            await asyncio.sleep_ms(10)
+        await asyncio.sleep_ms(50)
+        task.cancel()
+
+    if driver == "run":
+        asyncio.run(main())
+    else:
+        for i in range(4):
+            txq.put(bytes((i,)) * 20)
+        assert txq.flush(), "queue not empty"
+    assert txq.errors == 1 and txq.failed[PRIO_BULK] == 1, (txq.errors, txq.failed)
+    assert not txq._busy and len(txq) == 0, (txq._busy, len(txq))
+    sent = len(fake.sent) - (method == "send_done")  # that packet went out, its PacketSent was lost
+    assert txq.sent[PRIO_BULK] == 3 and sent == 3, (txq.sent, len(fake.sent))
+    print("radio error in {} under {}(): 1 packet failed, the next {} sent ({})".format(
+        method, driver, txq.sent[PRIO_BULK], txq.last_error))
+
+
+def main():
+    global SPI_BAUDRATE
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    if len(sys.argv) > 2:
+        SPI_BAUDRATE = int(sys.argv[2])
+    print("{} ms sampling period, SPI at {} Hz".format(PERIOD_MS, SPI_BAUDRATE))
+    blocking(seconds)
+    queued(seconds)
+    radio_error("send_start", "run")
+    radio_error("send_start", "poll")
+    radio_error("send_done", "poll")
+
+
+if __name__ == "__main__":
+    main()
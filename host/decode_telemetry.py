@@ -0,0 +1,38 @@
+""" decode_telemetry.py - turn received binary telemetry frames back into CSV rows
+
+Reads one frame per line as hex (what a ground station prints with
+`ubinascii.hexlify(packet)`), from a file or stdin, and prints rows in the
+column order of the SD card log.
+
+    python host/decode_telemetry.py frames.txt > flight.csv
+"""
+
+import binascii
+import sys
+
+import upy  # noqa: F401
+from telemetry import FIELDS, decode
+
+
+def format_row(record):
+    return ";".join(" " if value is None else "{:g}".format(value) for value in record)
+
+
+def main():
+    source = open(sys.argv[1]) if len(sys.argv) > 1 else sys.stdin
+    print(";".join(FIELDS))
+    for lineno, line in enumerate(source, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records = decode(binascii.unhexlify(line))
+        except (ValueError, binascii.Error) as ex:
+            print("line {}: {}".format(lineno, ex), file=sys.stderr)
+            continue
+        for record in records:
+            print(format_row(record))
+
+
+if __name__ == "__main__":
+    main()
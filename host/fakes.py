@@ -0,0 +1,547 @@
+""" fakes.py - register-level fake sensors and radio for the host stand-in of `machine`
+
+Each fake plugs into the matching bus of host/machine.py:
+
+    i2c = machine.I2C(0)
+    i2c.attach(0x77, FakeBME280(pressure=lambda t: 101325 - 12 * t))
+    bmp = BME280(i2c=i2c, address=0x77)
+
+All time-dependent behaviour uses `clock()` (seconds, float), which defaults
+to the wall clock and can be replaced by a simulated one.
+"""
+
+import random
+import struct
+import threading
+import time
+
+import machine
+
+
+def sensirion_crc(data):
+    crc = 0xFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+def sensirion_words(*words):
+    out = bytearray()
+    for word in words:
+        pair = struct.pack(">H", word & 0xFFFF)
+        out += pair
+        out.append(sensirion_crc(pair))
+    return bytes(out)
+
+
+# ---------------------------------------------------------------------------
+# BME280
+# ---------------------------------------------------------------------------
+
+# Calibration example from the Bosch BMP280 datasheet (section 3.12)
+BME280_CALIB = dict(T1=27504, T2=26435, T3=-1000,
+                    P1=36477, P2=-10685, P3=3024, P4=2855, P5=140, P6=-7,
+                    P7=15500, P8=-14600, P9=6000,
+                    H1=75, H2=362, H3=0, H4=313, H5=50, H6=30)
+
+
+def bme280_t_fine(c, raw_temp):
+    var1 = (((raw_temp >> 3) - (c["T1"] << 1)) * c["T2"]) >> 11
+    var2 = (((((raw_temp >> 4) - c["T1"]) * ((raw_temp >> 4) - c["T1"])) >> 12) * c["T3"]) >> 14
+    return var1 + var2
+
+
+def bme280_pressure(c, t_fine, raw_press):
+    """ Bosch 64-bit integer compensation, result in Pa * 256. """
+    var1 = t_fine - 128000
+    var2 = var1 * var1 * c["P6"]
+    var2 = var2 + ((var1 * c["P5"]) << 17)
+    var2 = var2 + (c["P4"] << 35)
+    var1 = (((var1 * var1 * c["P3"]) >> 8) + ((var1 * c["P2"]) << 12))
+    var1 = (((1 << 47) + var1) * c["P1"]) >> 33
+    if var1 == 0:
+        return 0
+    p = 1048576 - raw_press
+    p = (((p << 31) - var2) * 3125) // var1
+    var1 = (c["P9"] * (p >> 13) * (p >> 13)) >> 25
+    var2 = (c["P8"] * p) >> 19
+    return ((p + var1 + var2) >> 8) + (c["P7"] << 4)
+
+
+def _bisect(func, target, lo, hi, increasing):
+    while lo < hi:
+        mid = (lo + hi) // 2
+        value = func(mid)
+        if (value < target) == increasing:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class FakeBME280:
+    """ I2C device model. `pressure(t)` gives Pa and `temperature(t)` degC at time t.
+
+    With measure_s a forced conversion takes that long: until then the data
+    registers keep the previous sample and `early_reads` counts reads of them. """
+
+    def __init__(self, pressure=lambda t: 101325.0, temperature=lambda t: 20.0,
+                 clock=time.perf_counter, measure_s=0.0):
+        c = self.calib = BME280_CALIB
+        self.pressure = pressure
+        self.temperature = temperature
+        self.clock = clock
+        self.t0 = clock()
+        self.measure_s = measure_s
+        self.conversions = 0
+        self.early_reads = 0
+        self._due = None
+        self.regs = bytearray(256)
+        self.regs[0x88:0x88 + 26] = struct.pack(
+            "<HhhHhhhhhhhhBB", c["T1"], c["T2"], c["T3"], c["P1"], c["P2"], c["P3"], c["P4"],
+            c["P5"], c["P6"], c["P7"], c["P8"], c["P9"], 0, c["H1"])
+        self.regs[0xE1:0xE8] = struct.pack(
+            "<hBbBbb", c["H2"], c["H3"], c["H4"] >> 4, (c["H4"] & 0xF) | ((c["H5"] & 0xF) << 4),
+            c["H5"] >> 4, c["H6"])
+        self.regs[0xD0] = 0x60
+        self.regs[0xFD:0xFF] = struct.pack(">H", 0x6000)
+
+    def _convert(self):
+        self.conversions += 1
+        t = self.clock() - self.t0
+        c = self.calib
+        target_t = int(self.temperature(t) * 100)
+        raw_temp = _bisect(lambda r: (bme280_t_fine(c, r) * 5 + 128) >> 8, target_t, 0, 1 << 20, True)
+        t_fine = bme280_t_fine(c, raw_temp)
+        target_p = int(self.pressure(t) * 256)
+        raw_press = _bisect(lambda r: bme280_pressure(c, t_fine, r), target_p, 0, 1 << 20, False)
+        self.regs[0xF7:0xFA] = (raw_press << 4).to_bytes(3, "big")
+        self.regs[0xFA:0xFD] = (raw_temp << 4).to_bytes(3, "big")
+
+    def write_mem(self, reg, buf):
+        self.regs[reg:reg + len(buf)] = buf
+        if reg == 0xF4 and buf[-1] & 0b11 in (0b01, 0b10):
+            if self.measure_s:
+                self._due = self.clock() + self.measure_s
+            else:
+                self._convert()  # forced mode conversion
+
+    def read_mem(self, reg, nbytes):
+        if self._due is not None and self.clock() >= self._due - 1e-6:  # to the us
+            self._due = None
+            self._convert()
+        if reg == 0xF7 and self._due is not None:
+            self.early_reads += 1
+        if reg == 0xF7 and self.regs[0xF4] & 0b11 == 0b11:
+            self._convert()  # normal mode: registers always hold the latest sample
+        return self.regs[reg:reg + nbytes]
+
+
+# ---------------------------------------------------------------------------
+# SCD41
+# ---------------------------------------------------------------------------
+
+class FakeSCD41:
+    """ I2C device model of the SCD41 command set used by scd4x_micro.
+
+    Like the sensor it NACKs commands while busy with a long one (stop,
+    reinit, factory reset, self-test, whose result is read back once it is
+    done) and, in periodic mode, everything but reading out and stopping.
+    measuring=True starts it in periodic mode, as after a reset of the MCU
+    alone. """
+
+    # Execution times (s) of the commands that keep the sensor busy
+    BUSY_S = {0x3F86: 0.5, 0x3646: 0.02, 0x3632: 1.2, 0x3639: 10.0}
+    # Accepted during periodic measurement
+    PERIODIC_COMMANDS = (0xEC05, 0xE4B8, 0x3F86, 0xE000)
+    # Settings read back by the get commands, written by the set commands
+    DEFAULT_SETTINGS = {0x2318: int(4.0 * 374.49142857), 0x2322: 0, 0x2313: 0}
+
+    def __init__(self, co2=lambda t: 420, temperature=lambda t: 22.0,
+                 humidity=lambda t: 45.0, clock=time.perf_counter, measuring=False):
+        self.co2 = co2
+        self.temperature = temperature
+        self.humidity = humidity
+        self.clock = clock
+        self.t0 = clock()
+        self.interval = 5.0 if measuring else None  # seconds between periodic measurements
+        self.started = 0.0
+        self.busy_until = 0.0
+        self.nacked = 0      # commands refused while busy or measuring
+        self.consumed = 0     # index of the last measurement read out
+        self.single_shot_at = None
+        self.rht_only = False
+        self.response = None
+        self.commands = []
+        self.settings = dict(self.DEFAULT_SETTINGS)
+        self.bad_writes = 0  # arguments sent without a valid CRC
+
+    def _now(self):
+        return self.clock() - self.t0
+
+    def _available(self):
+        """ Index of the newest finished measurement (0 = none yet). """
+        now = self._now()
+        if self.interval is not None:
+            return int((now - self.started) // self.interval)
+        if self.single_shot_at is not None and now >= self.single_shot_at:
+            return self.consumed + 1
+        return self.consumed
+
+    def _sample(self):
+        t = self._now()
+        return sensirion_words(0 if self.rht_only else int(self.co2(t)),
+                               int((self.temperature(t) + 45) * 65536 / 175),
+                               int(self.humidity(t) * 65536 / 100))
+
+    def _busy(self):
+        if self._now() < self.busy_until:
+            self.nacked += 1
+            raise OSError(5)
+
+    def write(self, buf):
+        cmd = (buf[0] << 8) | buf[1]
+        self.commands.append(cmd)
+        self._busy()
+        self.response = None
+        if self.interval is not None and cmd not in self.PERIODIC_COMMANDS:
+            self.nacked += 1
+            raise OSError(5)
+        if cmd in self.BUSY_S:
+            self.busy_until = self._now() + self.BUSY_S[cmd]
+        if len(buf) > 2:
+            if len(buf) != 5 or sensirion_crc(buf[2:4]) != buf[4]:
+                self.bad_writes += 1
+                raise OSError(5)  # the sensor NACKs an argument with a wrong CRC
+            setting = {0x241D: 0x2318, 0x2427: 0x2322, 0x2416: 0x2313}.get(cmd)
+            if setting is not None:
+                self.settings[setting] = (buf[2] << 8) | buf[3]
+        if cmd == 0x21B1:
+            self.interval, self.started, self.consumed = 5.0, self._now(), 0
+        elif cmd == 0x21AC:
+            self.interval, self.started, self.consumed = 30.0, self._now(), 0
+        elif cmd == 0x3F86:
+            self.interval = None
+        elif cmd == 0x219D:
+            self.single_shot_at, self.rht_only = self._now() + 5.0, False
+        elif cmd == 0x2196:
+            self.single_shot_at, self.rht_only = self._now() + 0.05, True
+        elif cmd == 0xEC05:
+            if self._available() > self.consumed:
+                self.consumed = self._available()
+                self.response = self._sample()
+                self.single_shot_at, self.rht_only = None, False
+        elif cmd == 0xE4B8:
+            self.response = sensirion_words(0x0006 if self._available() > self.consumed else 0x8000)
+        elif cmd == 0x3682:
+            self.response = sensirion_words(0xBEEF, 0x1234, 0x3B07)
+        elif cmd == 0x3639:
+            self.response = sensirion_words(0)
+        elif cmd == 0x3632:
+            self.settings.update(self.DEFAULT_SETTINGS)
+        elif cmd in self.settings:
+            self.response = sensirion_words(self.settings[cmd])
+
+    def read(self, nbytes):
+        self._busy()
+        if self.response is None:
+            raise OSError(5)  # no (new) data: the sensor NACKs the read header
+        return self.response[:nbytes]
+
+
+class NackingI2CDevice:
+    """ Wraps an I2C fake and makes transfers fail with OSError, like a NACK
+        or a bus error: at random with probability `rate`, and always while
+        clock() is inside one of the (start, end) `bursts`. Each failure first
+        calls sleep_ms(stall_ms), the time the bus hangs before giving up.
+        With probability `flip` a read returns one bit flipped instead. """
+
+    def __init__(self, device, rate=0.0, bursts=(), stall_ms=0, sleep_ms=None,
+                 clock=time.perf_counter, seed=1, flip=0.0):
+        self.device = device
+        self.rate = rate
+        self.bursts = bursts
+        self.stall_ms = stall_ms
+        self.sleep_ms = sleep_ms or (lambda ms: time.sleep(ms / 1000))
+        self.clock = clock
+        self.t0 = clock()
+        self.rng = random.Random(seed)
+        self.flip = flip
+        self.nacks = 0
+        self.flips = 0
+
+    def _fault(self):
+        t = self.clock() - self.t0
+        if self.rng.random() < self.rate or any(start <= t < end for start, end in self.bursts):
+            self.nacks += 1
+            if self.stall_ms:
+                self.sleep_ms(self.stall_ms)
+            raise OSError(5)  # EIO: the device did not acknowledge
+
+    def write(self, buf):
+        self._fault()
+        self.device.write(buf)
+
+    def read(self, nbytes):
+        self._fault()
+        data = self.device.read(nbytes)
+        if self.flip and self.rng.random() < self.flip:
+            data = bytearray(data)
+            data[self.rng.randrange(len(data))] ^= 1 << self.rng.randrange(8)
+            self.flips += 1
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
+
+
+# ---------------------------------------------------------------------------
+# PMS5003
+# ---------------------------------------------------------------------------
+
+def pms5003_frame(values):
+    """ Build a 32-byte data frame from 13 data words (12 values + reserved). """
+    body = b"\x42\x4d\x00\x1c" + struct.pack(">13H", *values)
+    return body + struct.pack(">H", sum(body))
+
+
+def pms5003_cmd_response(cmd, data):
+    body = b"\x42\x4d\x00\x04" + bytes((cmd, data))
+    return body + struct.pack(">H", sum(body))
+
+
+class FakePMS5003:
+    """ UART device model: streams frames in active mode, answers commands in passive mode. """
+
+    def __init__(self, interval=1.0, startup=0.5, clock=time.perf_counter, values=None):
+        self.interval = interval
+        self.startup = startup
+        self.clock = clock
+        self.values = values or (lambda n: (5 + n % 3, 8 + n % 5, 9 + n % 7, 5, 8, 9,
+                                            900, 300, 60, 10, 2, 1, 0))
+        self.uart = None
+        self.active = True
+        self.running = True
+        self.frames = 0
+        self.pending = bytearray()
+        self.next_frame = clock() + startup
+
+    def reset_pin(self, pin):
+        """ Connect a machine.Pin as the RESET line; high after low restarts the sensor. """
+        pin.listener = self._on_reset
+
+    def _on_reset(self, level):
+        if level:
+            self.restart(self.startup)
+        else:
+            self.running = False
+
+    def restart(self, delay):
+        self.active = True
+        self.running = True
+        self.next_frame = self.clock() + delay
+
+    def _frame(self):
+        self.frames += 1
+        return pms5003_frame(self.values(self.frames))
+
+    def poll(self):
+        now = self.clock()
+        if self.running and self.active:
+            while now >= self.next_frame:
+                self.pending += self._frame()
+                self.next_frame += self.interval
+        out = bytes(self.pending)
+        self.pending = bytearray()
+        return out
+
+    def receive(self, buf):
+        if len(buf) != 7 or buf[:2] != b"\x42\x4d":
+            return
+        cmd, data = buf[2], buf[4]
+        if cmd == 0xE1:
+            self.active = bool(data)
+            self.next_frame = self.clock() + self.interval
+            self.pending += pms5003_cmd_response(cmd, data)
+        elif cmd == 0xE2 and self.running:
+            self.pending += self._frame()
+        elif cmd == 0xE4:
+            if data:
+                self.restart(self.startup)
+            else:
+                self.running = False
+                self.pending += pms5003_cmd_response(cmd, data)
+
+
+# ---------------------------------------------------------------------------
+# RFM69
+# ---------------------------------------------------------------------------
+
+class FakeRFM69:
+    """ SPI device model of the SX1231 registers used by rfm69.py.
+
+        Packets take their on-air time to send. `nss` must be used as the chip
+        select pin so the model can frame SPI transactions; `dio0` follows the
+        PacketSent/PayloadReady flags according to the DIO mapping. """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.regs = bytearray(0x80)
+        self.regs[0x10] = 0x24          # version
+        self.regs[0x03:0x05] = b"\x1a\x0b"  # 4.8 kbps reset value
+        self.regs[0x27] = 0x80          # ModeReady
+        self.nss = machine.Pin("nss", machine.Pin.OUT, value=1)
+        self.nss.listener = self._on_nss
+        self.dio0 = machine.Pin("dio0", machine.Pin.IN)
+        self.fifo = bytearray()
+        self.rx_queue = []
+        self.sent = []
+        self.airtime = 0.0
+        self.transactions = 0  # nss-framed SPI transactions
+        self.flag_reads = 0    # reads of RegIrqFlags2 (PacketSent, PayloadReady)
+        self._addr = None
+        self._write = False
+        self._tx_done_at = None
+        self._timer = None
+
+    @property
+    def mode(self):
+        return (self.regs[0x01] >> 2) & 0b111
+
+    @property
+    def bitrate(self):
+        return 32000000 / ((self.regs[0x03] << 8) | self.regs[0x04])
+
+    def _on_nss(self, level):
+        if not level:
+            self.transactions += 1
+        self._addr = None
+
+    def _packet_sent(self):
+        return self._tx_done_at is not None and self.clock() >= self._tx_done_at
+
+    def _irq_flags2(self):
+        flags = 0
+        if self._packet_sent():
+            flags |= 0x08
+        if self.mode == 4 and self.fifo:
+            flags |= 0x04
+        return flags
+
+    def _update_dio0(self):
+        mapping = self.regs[0x25] >> 6
+        level = ((self.mode == 3 and mapping == 0 and self._packet_sent())
+                 or (self.mode == 4 and mapping == 1 and bool(self.fifo)))
+        self.dio0.drive(level)
+
+    def _set_mode(self, mode):
+        if mode == 3 and self.fifo:
+            length = self.fifo[0]
+            self.sent.append(bytes(self.fifo[1:1 + length]))
+            self.fifo = bytearray()
+            preamble = (self.regs[0x2C] << 8) | self.regs[0x2D]
+            sync = ((self.regs[0x2E] >> 3) & 0b111) + 1
+            airtime = (preamble + sync + 1 + length + 2) * 8 / self.bitrate
+            self.airtime += airtime
+            self._tx_done_at = self.clock() + airtime
+            self._timer = threading.Timer(airtime, self._update_dio0)
+            self._timer.daemon = True
+            self._timer.start()
+        elif mode != 3:
+            self._tx_done_at = None
+            if mode == 4 and not self.fifo and self.rx_queue:
+                self.fifo = bytearray(self.rx_queue.pop(0))
+
+    def deliver(self, packet):
+        """ Queue a received packet (length byte included by the model). """
+        self.rx_queue.append(bytes((len(packet),)) + bytes(packet))
+        if self.mode == 4 and not self.fifo:
+            self.fifo = bytearray(self.rx_queue.pop(0))
+            self._update_dio0()
+
+    def _reg_write(self, addr, value):
+        if addr == 0x00:
+            self.fifo.append(value)
+            return
+        self.regs[addr] = value
+        if addr == 0x01:
+            self._set_mode((value >> 2) & 0b111)
+            self._update_dio0()
+        elif addr == 0x25:
+            self._update_dio0()
+
+    def _reg_read(self, addr):
+        if addr == 0x00:
+            if not self.fifo:
+                return 0
+            value = self.fifo.pop(0)
+            if not self.fifo:
+                self._update_dio0()
+            return value
+        if addr == 0x28:
+            self.flag_reads += 1
+            return self._irq_flags2()
+        return self.regs[addr]
+
+    def transfer(self, out):
+        resp = bytearray(len(out))
+        for i, byte in enumerate(out):
+            if self._addr is None:
+                self._addr = byte & 0x7F
+                self._write = bool(byte & 0x80)
+                continue
+            if self._write:
+                self._reg_write(self._addr, byte)
+            else:
+                resp[i] = self._reg_read(self._addr)
+            if self._addr != 0x00:
+                self._addr = (self._addr + 1) & 0x7F
+        return bytes(resp)
+
+
+# ---------------------------------------------------------------------------
+# SD card
+# ---------------------------------------------------------------------------
+
+class FakeBlockDevice:
+    """ File-backed block device with the SDCard readblocks/writeblocks/ioctl API.
+
+        Each command costs `cmd_us` plus `block_us` per 512-byte block of
+        busy-wait, like the blocking SPI transfers of sdcard.SDCard; a
+        single-block write (CMD24) also pays the card programming time
+        `program_us`, which a multi-block write (CMD25) pays only once. """
+
+    def __init__(self, path, blocks=65536, cmd_us=300, block_us=110, program_us=800):
+        self.blocks = blocks
+        self.cmd_us = cmd_us
+        self.block_us = block_us
+        self.program_us = program_us
+        self.file = open(path, "w+b")
+        self.file.truncate(blocks * 512)
+        self.commands = {17: 0, 18: 0, 24: 0, 25: 0}
+
+    def readblocks(self, block_num, buf):
+        nblocks = len(buf) // 512
+        self.commands[17 if nblocks == 1 else 18] += 1
+        time.sleep_us(self.cmd_us + nblocks * self.block_us)
+        self.file.seek(block_num * 512)
+        buf[:] = self.file.read(len(buf))
+
+    def writeblocks(self, block_num, buf):
+        nblocks, err = divmod(len(buf), 512)
+        assert nblocks and not err, "Buffer length is invalid"
+        self.commands[24 if nblocks == 1 else 25] += 1
+        time.sleep_us(self.cmd_us + nblocks * self.block_us + self.program_us)
+        self.file.seek(block_num * 512)
+        self.file.write(buf)
+
+    def ioctl(self, op, arg):
+        if op == 4:
+            return self.blocks
+        if op == 5:
+            return 512
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,291 @@
+""" CPython stand-in for the MicroPython `machine` module.
+
+Buses forward to fake device models (see fakes.py) attached with `attach()`.
+SPI and UART optionally spend the wall-clock time the real bus would take,
+so timing benchmarks see realistic transfer costs.
+"""
+
+import sys
+import threading
+import time
+
+import upy  # noqa: F401  (time.ticks_* / sleep_us)
+
+# Device models raise "interrupts" from threads; switch often so an IRQ is
+# not held off for the default 5 ms by a thread spinning on a flag.
+sys.setswitchinterval(0.00005)
+
+
+def freq(hz=None):
+    return 125000000
+
+
+# Set by every pin IRQ; idle() sleeps until it or the next 1 ms tick, like
+# WFI on the RP2040 (an interrupt pending since the last idle() wakes it at once).
+_interrupt = threading.Event()
+
+
+def idle():
+    _interrupt.wait(0.001)
+    _interrupt.clear()
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self._value = 0 if value is None else int(bool(value))
+        self._handler = None
+        self._trigger = 0
+        self.listener = None  # fake device hook, called with the new level
+
+    def init(self, mode=-1, pull=-1, value=None):
+        self.mode = mode
+        if value is not None:
+            self.value(value)
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._set(int(bool(v)))
+
+    __call__ = value
+
+    def on(self):
+        self._set(1)
+
+    def off(self):
+        self._set(0)
+
+    high = on
+    low = off
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self._handler = handler
+        self._trigger = trigger
+
+    def drive(self, v):
+        """ Set the level from the device side (an input pin), firing the IRQ on an edge. """
+        self._set(int(bool(v)))
+
+    def _set(self, v):
+        old = self._value
+        self._value = v
+        if self.listener is not None and old != v:
+            self.listener(v)
+        if self._handler is not None and old != v:
+            if (v and self._trigger & Pin.IRQ_RISING) or (not v and self._trigger & Pin.IRQ_FALLING):
+                self._handler(self)
+                _interrupt.set()
+
+
+_i2c_buses = {}
+
+
+class I2C:
+    def __init__(self, id=0, scl=None, sda=None, freq=400000):
+        self.id = id
+        self.freq = freq
+        self.transactions = 0
+        self._devices = _i2c_buses.setdefault(id, {})
+
+    def attach(self, addr, device):
+        self._devices[addr] = device
+        return device
+
+    def scan(self):
+        return sorted(self._devices)
+
+    def _device(self, addr):
+        self.transactions += 1
+        try:
+            return self._devices[addr]
+        except KeyError:
+            raise OSError(19)  # ENODEV
+
+    def writeto(self, addr, buf, stop=True):
+        self._device(addr).write(bytes(buf))
+        return len(buf)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return bytes(self._device(addr).read(nbytes))
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self._device(addr).read(len(buf))
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self._device(addr).write_mem(memaddr, bytes(buf))
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        return bytes(self._device(addr).read_mem(memaddr, nbytes))
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        buf[:] = self._device(addr).read_mem(memaddr, len(buf))
+
+
+class SPI:
+    MSB = 0
+    LSB = 1
+    emulate_timing = True
+
+    def __init__(self, id=0, baudrate=1000000, polarity=0, phase=0, bits=8,
+                 firstbit=MSB, sck=None, mosi=None, miso=None):
+        self.id = id
+        self.baudrate = baudrate
+        self.device = None
+        self.transfers = 0
+        self.bytes = 0
+
+    def init(self, baudrate=None, polarity=0, phase=0, **kwargs):
+        if baudrate:
+            self.baudrate = baudrate
+
+    def attach(self, device):
+        self.device = device
+        return device
+
+    def _transfer(self, out):
+        self.transfers += 1
+        self.bytes += len(out)
+        if self.emulate_timing:
+            time.sleep_us(len(out) * 8000000 // self.baudrate)
+        if self.device is None:
+            return bytes(len(out))
+        return self.device.transfer(out)
+
+    def write(self, buf):
+        self._transfer(bytes(buf))
+
+    def read(self, nbytes, write=0x00):
+        return self._transfer(bytes((write,)) * nbytes)
+
+    def readinto(self, buf, write=0x00):
+        buf[:] = self._transfer(bytes((write,)) * len(buf))
+
+    def write_readinto(self, write_buf, read_buf):
+        read_buf[:] = self._transfer(bytes(write_buf))
+
+
+class UART:
+    emulate_timing = False
+
+    def __init__(self, id=0, baudrate=9600, tx=None, rx=None, rxbuf=256, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+        self.rxbuf = rxbuf
+        self.device = None
+        self.overflows = 0  # bytes dropped because the receive buffer was full
+        self.bytes_rx = 0
+        self.bytes_tx = 0
+        self._buf = bytearray()
+
+    def attach(self, device):
+        self.device = device
+        device.uart = self
+        return device
+
+    def _poll(self):
+        if self.device is None:
+            return
+        data = self.device.poll()
+        if data:
+            self.bytes_rx += len(data)
+            room = self.rxbuf - len(self._buf)
+            if len(data) > room:
+                self.overflows += len(data) - room
+                data = data[:room]
+            self._buf.extend(data)
+
+    def any(self):
+        self._poll()
+        return len(self._buf)
+
+    def read(self, nbytes=None):
+        self._poll()
+        if not self._buf:
+            return None
+        if nbytes is None:
+            nbytes = len(self._buf)
+        data = bytes(self._buf[:nbytes])
+        del self._buf[:nbytes]
+        return data
+
+    def readinto(self, buf, nbytes=None):
+        self._poll()
+        if not self._buf:
+            return None
+        n = len(buf) if nbytes is None else nbytes
+        n = min(n, len(self._buf))
+        buf[:n] = self._buf[:n]
+        del self._buf[:n]
+        return n
+
+    def write(self, buf):
+        self.bytes_tx += len(buf)
+        if self.emulate_timing:
+            time.sleep_us(len(buf) * 10000000 // self.baudrate)
+        if self.device is not None:
+            self.device.receive(bytes(buf))
+        return len(buf)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self._thread = None
+        self._stop = threading.Event()
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, freq=None, period=None, callback=None):
+        self.deinit()
+        period_s = 1.0 / freq if freq else period / 1000
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(mode, period_s, callback, self._stop),
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self, mode, period_s, callback, stop):
+        due = time.perf_counter() + period_s
+        while not stop.is_set():
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if stop.is_set():
+                break
+            callback(self)
+            if mode == Timer.ONE_SHOT:
+                break
+            due += period_s
+
+    def deinit(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+
+class ADC:
+    def __init__(self, pin):
+        self.pin = pin
+
+    def read_u16(self):
+        return 0
@@ -0,0 +1,23 @@
+""" CPython stand-in for the `micropython` module. """
+
+import threading
+
+_lock = threading.RLock()
+
+
+def const(value):
+    return value
+
+
+def schedule(func, arg):
+    """ Run `func(arg)` as soon as possible, serialised like the MicroPython scheduler. """
+    with _lock:
+        func(arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def mem_info(*args):
+    pass
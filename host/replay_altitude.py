@@ -0,0 +1,146 @@
+""" replay_altitude.py - run altfilter.AltitudeFilter over recorded flights to tune it
+
+Reads SD card logs (log_*.csv: `;`-separated with time_sec and pressure_hpa
+columns) and feeds every row to the filter, as fast as it goes. Prints the
+phase changes with time, filtered altitude and speed, the noise of the
+filtered altitude on the pad and the filter throughput. Without a file it
+replays a simulated flight (pad, 2 s boost, coast, 8 m/s parachute descent,
+landing) and also prints how late apogee and landing were detected, then
+a climb too slow to count as a launch (1.5 m/s to 300 m, like a balloon
+drifting up) to check the height above the pad still reaches the
+firmware's 200 m buzzer mark.
+
+Filter settings are given as name=value, e.g. alpha=0.05 landed_ms=8000;
+rate_hz=2 simulates the 2 Hz of the SD log instead of the 50 Hz ring:
+
+    python host/replay_altitude.py [log_*.csv ...] [name=value ...]
+"""
+
+import csv
+import math
+import random
+import sys
+import time
+
+import upy  # noqa: F401
+from altfilter import AltitudeFilter, PHASE_NAMES, SEA_LEVEL_PA
+
+TICKS_MASK = upy.TICKS_PERIOD - 1
+
+
+def altitude_to_pa(altitude_m, sea_level_pa=SEA_LEVEL_PA):
+    return sea_level_pa * (1 - altitude_m / 44330) ** (1 / 0.1903)
+
+
+def simulated_flight(rate_hz=50, ground_m=100.0, noise_pa=1.3, seed=1, pad_s=20.0, landed_s=30.0):
+    """ (time s, pressure Pa) rows and the true apogee and touchdown times. """
+    rng = random.Random(seed)
+    dt = 1 / rate_hz
+    t, h, v = 0.0, ground_m, 0.0
+    rows = []
+    apogee_s = touchdown_s = None
+    while True:
+        if t < pad_s:
+            a = 0.0                              # on the pad
+        elif t < pad_s + 2:
+            a = 100.0                            # boost
+        elif v > 0:
+            a = -9.81 - 0.0005 * v * v           # coast with drag
+        else:
+            if apogee_s is None:
+                apogee_s = t
+            a = 0.0
+            v = max(v - 9.81 * dt, -8.0) if t < apogee_s + 2 else -8.0  # parachute
+        v += a * dt
+        h += v * dt
+        if h <= ground_m and t > pad_s + 2:
+            h, v = ground_m, 0.0
+            if touchdown_s is None:
+                touchdown_s = t
+        rows.append((t, altitude_to_pa(h) + rng.gauss(0, noise_pa)))
+        t += dt
+        if touchdown_s is not None and t > touchdown_s + landed_s:
+            return rows, apogee_s, touchdown_s
+
+
+def slow_climb(rate_hz=50, ground_m=100.0, speed=1.5, height_m=300.0, noise_pa=1.3, seed=2):
+    """ (time s, pressure Pa) rows: 30 s on the ground, then a steady climb. """
+    rng = random.Random(seed)
+    rows = []
+    t = 0.0
+    while True:
+        h = ground_m + max(0.0, t - 30) * speed
+        rows.append((t, altitude_to_pa(h) + rng.gauss(0, noise_pa)))
+        if h >= ground_m + height_m:
+            return rows
+        t += 1 / rate_hz
+
+
+def read_log(path):
+    rows = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f, delimiter=";"):
+            try:
+                rows.append((float(row["time_sec"]), float(row["pressure_hpa"]) * 100))
+            except (KeyError, TypeError, ValueError):
+                continue  # short or damaged line
+    return rows
+
+
+def replay(name, rows, settings):
+    alt = AltitudeFilter(**settings)
+    changes = []
+    pad = []
+    phase = alt.phase
+    start = time.perf_counter()
+    for t, pa in rows:
+        new = alt.update_pressure(round(pa), int(t * 1e6) & TICKS_MASK)
+        if new != phase:
+            changes.append((t, new, alt.altitude_mm, alt.speed_mm_s))
+            phase = new
+        if new == 0 and alt.samples > 50 and abs(alt.speed_mm_s) < alt.launch_speed:
+            pad.append(alt.altitude_mm)
+    rate = len(rows) / (time.perf_counter() - start)
+    print("{}: {} samples over {:.0f} s, {:.0f} samples/s replayed".format(
+        name, len(rows), rows[-1][0] - rows[0][0] if rows else 0, rate))
+    if pad:
+        mean = sum(pad) / len(pad)
+        print("  pad: filtered altitude noise {:.2f} m rms".format(
+            math.sqrt(sum((x - mean) ** 2 for x in pad) / len(pad)) / 1000))
+    for t, phase, altitude_mm, speed in changes:
+        print("  {:8.2f} s  {:8s} altitude {:8.1f} m  speed {:7.1f} m/s".format(
+            t, PHASE_NAMES[phase], altitude_mm / 1000, speed / 1000))
+    if alt.apogee_mm is not None:
+        print("  apogee {:.1f} m above the pad".format((alt.apogee_mm - alt.ground_mm) / 1000))
+    return {phase: t for t, phase, _, _ in changes}
+
+
+def main():
+    files = [arg for arg in sys.argv[1:] if "=" not in arg]
+    settings = {}
+    for arg in sys.argv[1:]:
+        if "=" in arg:
+            key, value = arg.split("=", 1)
+            settings[key] = float(value)
+    if files:
+        for path in files:
+            replay(path, read_log(path), settings)
+        return
+    rows, apogee_s, touchdown_s = simulated_flight(rate_hz=settings.pop("rate_hz", 50))
+    seen = replay("simulated flight", rows, settings)
+    print("  true apogee {:.2f} s, detected {:+.2f} s later; touchdown {:.2f} s, landed {:+.2f} s later".format(
+        apogee_s, seen.get(2, float("nan")) - apogee_s, touchdown_s,
+        seen.get(4, float("nan")) - touchdown_s))
+
+    alt = AltitudeFilter(**settings)
+    highest = 0
+    for t, pa in slow_climb():
+        alt.update_pressure(round(pa), int(t * 1e6) & TICKS_MASK)
+        highest = max(highest, alt.agl_mm)
+    print("slow climb to 300 m at 1.5 m/s: phase {}, at most {:.1f} m above the pad".format(
+        PHASE_NAMES[alt.phase], highest / 1000))
+    assert highest > 200000, highest
+
+
+if __name__ == "__main__":
+    main()
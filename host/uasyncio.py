@@ -0,0 +1,86 @@
+""" CPython stand-in for `uasyncio`: asyncio plus the MicroPython extras. """
+
+from asyncio import *  # noqa: F401,F403
+import asyncio as _asyncio
+import threading as _threading
+
+
+def sleep_ms(ms):
+    return _asyncio.sleep(ms / 1000)
+
+
+def wait_for_ms(aw, timeout):
+    return _asyncio.wait_for(aw, timeout / 1000)
+
+
+class ThreadSafeFlag:
+    """ Flag that may be set from another thread (the host's stand-in for an IRQ). """
+
+    def __init__(self):
+        self._lock = _threading.Lock()
+        self._state = False
+        self._loop = None
+        self._event = None
+
+    def set(self):
+        with self._lock:
+            self._state = True
+            loop, event = self._loop, self._event
+        if event is not None:
+            loop.call_soon_threadsafe(event.set)
+
+    def clear(self):
+        with self._lock:
+            self._state = False
+            if self._event is not None:
+                self._event.clear()
+
+    async def wait(self):
+        with self._lock:
+            if self._event is None or self._loop is not _asyncio.get_running_loop():
+                self._loop = _asyncio.get_running_loop()
+                self._event = _asyncio.Event()
+            if self._state:
+                self._state = False
+                self._event.clear()
+                return
+        await self._event.wait()
+        self.clear()
+
+
+class Stream:
+    """ MicroPython's uasyncio.Stream over a host machine.UART (polled every ms). """
+
+    def __init__(self, s, e={}):
+        self.s = s
+        self.e = e
+
+    async def read(self, n=-1):
+        while True:
+            data = self.s.read(None if n < 0 else n)
+            if data:
+                return data
+            await _asyncio.sleep(0.001)
+
+    async def readinto(self, buf):
+        while True:
+            n = self.s.readinto(buf)
+            if n:
+                return n
+            await _asyncio.sleep(0.001)
+
+    async def readexactly(self, n):
+        data = b""
+        while len(data) < n:
+            data += await self.read(n - len(data))
+        return data
+
+    def write(self, buf):
+        self.s.write(buf)
+
+    async def drain(self):
+        pass
+
+
+StreamReader = Stream
+StreamWriter = Stream
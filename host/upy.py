@@ -0,0 +1,64 @@
+""" upy.py - run the firmware modules from Active/lib under CPython
+
+Import this first from any host-side script. It adds Active/lib to sys.path,
+aliases the MicroPython `u*` modules to their CPython counterparts and adds
+the MicroPython-only functions (`ticks_ms`, `sleep_us`, ...) to `time`.
+The `machine`, `micropython`, `uasyncio` and `ustruct` stand-ins live next to
+this file.
+"""
+
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+for _path in (os.path.join(ROOT, "Active", "lib"), os.path.join(ROOT, "Active"), HERE):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+# MicroPython tick counters wrap at 2**30
+TICKS_PERIOD = 1 << 30
+_TICKS_MAX = TICKS_PERIOD - 1
+_TICKS_HALF = TICKS_PERIOD // 2
+_T0 = time.perf_counter_ns()
+
+
+def ticks_us():
+    return ((time.perf_counter_ns() - _T0) // 1000) & _TICKS_MAX
+
+
+def ticks_ms():
+    return ((time.perf_counter_ns() - _T0) // 1000000) & _TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(end, start):
+    return ((end - start + _TICKS_HALF) & _TICKS_MAX) - _TICKS_HALF
+
+
+def sleep_ms(ms):
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    # time.sleep() is too coarse for short waits, spin for the tail
+    end = time.perf_counter_ns() + us * 1000
+    if us > 2000:
+        time.sleep((us - 1000) / 1000000)
+    while time.perf_counter_ns() < end:
+        pass
+
+
+for _name, _func in (("ticks_us", ticks_us), ("ticks_ms", ticks_ms),
+                     ("ticks_add", ticks_add), ("ticks_diff", ticks_diff),
+                     ("sleep_ms", sleep_ms), ("sleep_us", sleep_us)):
+    if not hasattr(time, _name):
+        setattr(time, _name, _func)
+
+sys.modules.setdefault("utime", time)
+sys.modules.setdefault("uos", os)
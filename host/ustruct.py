@@ -0,0 +1,7 @@
+""" CPython stand-in for `ustruct`: like MicroPython, unpack() ignores trailing bytes. """
+
+from struct import calcsize, error, pack, pack_into, unpack_from  # noqa: F401
+
+
+def unpack(fmt, buf):
+    return unpack_from(fmt, buf)